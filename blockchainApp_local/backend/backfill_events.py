@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Parallel historical backfill for the blockchain event indexer
+
+Splits [from_block, to_block] into ranges and fetches their logs
+concurrently with a bounded pool of workers. Ranges the RPC rejects with
+"too many results" are split in half and retried. Events are written
+through the indexer's bulk upsert path. Completed ranges are recorded in
+``indexer_backfill_ranges``, so an interrupted backfill resumes with only
+the blocks not yet covered.
+
+    python backfill_events.py --from-block 5000000 --workers 8 --range-size 5000
+    python backfill_events.py --status
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+from config import INDEXER_START_BLOCK, INDEXER_BATCH_SIZE, INDEXER_FLUSH_INTERVAL_SECONDS, INDEXER_CONFIRMATIONS
+
+RANGES_COLLECTION = "indexer_backfill_ranges"
+TOO_MANY_RESULTS_MARKERS = (
+    "too many results", "more than", "limit exceeded", "response size", "query timeout", "block range"
+)
+
+Range = Tuple[int, int]
+
+
+def is_too_many_results(error: Exception) -> bool:
+    """True if the RPC rejected eth_getLogs because the range is too large"""
+    message = str(error).lower()
+    return "-32005" in message or any(marker in message for marker in TOO_MANY_RESULTS_MARKERS)
+
+
+def uncovered_ranges(from_block: int, to_block: int, done: List[Range]) -> List[Range]:
+    """Subtract completed ranges from [from_block, to_block]"""
+    gaps = []
+    cursor = from_block
+    for start, end in sorted(done):
+        if end < cursor:
+            continue
+        if start > to_block:
+            break
+        if start > cursor:
+            gaps.append((cursor, start - 1))
+        cursor = max(cursor, end + 1)
+    if cursor <= to_block:
+        gaps.append((cursor, to_block))
+    return gaps
+
+
+def split_ranges(gaps: List[Range], range_size: int) -> List[Range]:
+    """Cut gaps into ranges of at most ``range_size`` blocks"""
+    ranges = []
+    for start, end in gaps:
+        for chunk_start in range(start, end + 1, range_size):
+            ranges.append((chunk_start, min(chunk_start + range_size - 1, end)))
+    return ranges
+
+
+class Backfill:
+    """Runs one backfill with a bounded worker pool"""
+
+    def __init__(self, db, indexer, workers: int, range_size: int, max_retries: int = 5):
+        self.db = db
+        self.indexer = indexer
+        self.workers = max(1, workers)
+        self.range_size = max(1, range_size)
+        self.max_retries = max_retries
+        self.queue: "asyncio.Queue[Range]" = asyncio.Queue()
+        self.flush_lock = asyncio.Lock()
+        self.unflushed: List[Tuple[int, int, int]] = []
+        self.blocks_done = 0
+        self.events = 0
+        self.splits = 0
+        self.failed: Optional[BaseException] = None
+
+    async def done_ranges(self) -> List[Range]:
+        cursor = self.db[RANGES_COLLECTION].find({"indexer": self.indexer.name}, {"from_block": 1, "to_block": 1})
+        return [(r["from_block"], r["to_block"]) async for r in cursor]
+
+    async def flush(self) -> None:
+        """Write queued events, then record the ranges they came from"""
+        async with self.flush_lock:
+            ranges, self.unflushed = self.unflushed, []
+            await self.indexer.writer.flush(self.db)
+            if ranges:
+                now = datetime.utcnow()
+                await self.db[RANGES_COLLECTION].insert_many([
+                    {"indexer": self.indexer.name, "from_block": start, "to_block": end, "events": events, "completed_at": now}
+                    for start, end, events in ranges
+                ])
+
+    async def fetch_range(self, start: int, end: int) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                logs = await self.indexer.fetch_logs(start, end)
+                break
+            except Exception as e:
+                if is_too_many_results(e) and end > start:
+                    # Adaptive split: both halves go back on the queue
+                    middle = (start + end) // 2
+                    self.splits += 1
+                    self.queue.put_nowait((start, middle))
+                    self.queue.put_nowait((middle + 1, end))
+                    return
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+        count = await self.indexer.process_logs(logs)
+        self.unflushed.append((start, end, count))
+        self.blocks_done += end - start + 1
+        self.events += count
+        if self.indexer.writer.should_flush():
+            await self.flush()
+
+    async def worker(self) -> None:
+        while True:
+            start, end = await self.queue.get()
+            try:
+                if self.failed is None:
+                    await self.fetch_range(start, end)
+            except Exception as e:
+                self.failed = e
+                print(f"❌ Blocks {start}-{end} failed: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self, from_block: int, to_block: int) -> bool:
+        gaps = uncovered_ranges(from_block, to_block, await self.done_ranges())
+        ranges = split_ranges(gaps, self.range_size)
+        total_blocks = sum(end - start + 1 for start, end in gaps)
+        print(f"📦 {total_blocks} blocks to backfill in {len(ranges)} ranges "
+              f"({to_block - from_block + 1 - total_blocks} already done), {self.workers} workers")
+        for block_range in ranges:
+            self.queue.put_nowait(block_range)
+
+        started = time.perf_counter()
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        try:
+            await self.queue.join()
+            # Persist whatever finished, even after a failure, so a rerun resumes
+            await self.flush()
+        finally:
+            for task in workers:
+                task.cancel()
+
+        elapsed = time.perf_counter() - started
+        rate = self.blocks_done / elapsed if elapsed else 0.0
+        print(f"⏱️  {self.blocks_done} blocks, {self.events} events in {elapsed:.1f}s "
+              f"({rate:.0f} blocks/s, {self.splits} range splits)")
+        print(f"📝 Writer: {self.indexer.writer.stats()}")
+        return self.failed is None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-block", type=int, default=INDEXER_START_BLOCK if INDEXER_START_BLOCK is not None else 0,
+                        help="first block, usually the contract deploy block (default: INDEXER_START_BLOCK or 0)")
+    parser.add_argument("--to-block", type=int, default=None, help="last block (default: head minus INDEXER_CONFIRMATIONS)")
+    parser.add_argument("--range-size", type=int, default=5000, help="initial blocks per eth_getLogs range")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent eth_getLogs requests")
+    parser.add_argument("--batch-size", type=int, default=INDEXER_BATCH_SIZE)
+    parser.add_argument("--status", action="store_true", help="show backfill coverage and exit")
+    parser.add_argument("--reset", action="store_true", help="forget completed ranges before starting")
+    args = parser.parse_args()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from config import MONGODB_URL, DATABASE_NAME
+    import blockchain_events
+    from blockchain_events import BulkEventWriter, EventIndexer, close_rpc_session, get_rpc_session
+
+    if blockchain_events.get_w3() is None or not blockchain_events.indexed_contracts():
+        print("❌ Blockchain not configured (ETHEREUM_RPC_URL and CONTRACT_ADDRESS are required)")
+        sys.exit(1)
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    indexer = EventIndexer(writer=BulkEventWriter(args.batch_size, INDEXER_FLUSH_INTERVAL_SECONDS))
+    await db[RANGES_COLLECTION].create_index([("indexer", ASCENDING), ("from_block", ASCENDING)], name="indexer_from_block")
+
+    print("=== EVENT INDEXER BACKFILL ===")
+    try:
+        await get_rpc_session()
+        if args.to_block is not None:
+            to_block = args.to_block
+        else:
+            to_block = await blockchain_events.get_w3().eth.block_number - INDEXER_CONFIRMATIONS
+        backfill = Backfill(db, indexer, args.workers, args.range_size)
+
+        if args.reset:
+            result = await db[RANGES_COLLECTION].delete_many({"indexer": indexer.name})
+            print(f"🧹 Forgot {result.deleted_count} completed ranges")
+        if args.status:
+            gaps = uncovered_ranges(args.from_block, to_block, await backfill.done_ranges())
+            missing = sum(end - start + 1 for start, end in gaps)
+            print(f"📊 Blocks {args.from_block}-{to_block}: {missing} not backfilled in {len(gaps)} gaps")
+            for start, end in gaps[:20]:
+                print(f"   {start}-{end}")
+            return
+
+        ok = await backfill.run(args.from_block, to_block)
+
+        # Hand over to the live indexer if it has never run
+        if ok and await indexer.load_checkpoint(db) is None:
+            await indexer.save_checkpoint(db, to_block)
+            print(f"✅ Live indexer checkpoint set to block {to_block}")
+        print("✅ Backfill complete" if ok else "❌ Backfill incomplete, rerun to resume")
+        if not ok:
+            sys.exit(1)
+    finally:
+        await close_rpc_session()
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: course catalog payload size and latency, full vs summary view
+
+Runs against the seeded MongoDB catalog (init_db.py / add_*_courses.py) and
+compares the list query with full module bodies against the summary
+projection used by GET /api/courses, plus the single-module lookup used by
+GET /api/courses/{id}/modules/{order}.
+
+    python benchmark_course_payload.py --iterations 50
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from bson import json_util
+from pymongo import MongoClient
+
+from config import MONGODB_URL, DATABASE_NAME
+
+# Keep in sync with routes.courses.COURSE_SUMMARY_PROJECTION
+SUMMARY_PROJECTION = {
+    "modules.content": 0,
+    "modules.description": 0,
+    "modules.content_url": 0,
+    "modules.video_url": 0,
+    "modules.image_urls": 0
+}
+
+
+def timed(fn, iterations):
+    """Run fn repeatedly and return (last result, latencies in ms)"""
+    latencies = []
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, latencies
+
+
+def describe(label, payload, latencies):
+    size = len(json.dumps(payload, default=json_util.default).encode())
+    ordered = sorted(latencies)
+    print(f"{label}:")
+    print(f"   payload: {size / 1024:.1f} KiB")
+    print(f"   p50: {statistics.median(ordered):.2f} ms   p99: {ordered[int(0.99 * (len(ordered) - 1))]:.2f} ms")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    client = MongoClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    query = {"is_published": True}
+
+    print("=== COURSE CATALOG PAYLOAD BENCHMARK ===")
+    print(f"📚 Published courses: {db.courses.count_documents(query)}\n")
+
+    full, full_latencies = timed(lambda: list(db.courses.find(query).limit(args.limit)), args.iterations)
+    summary, summary_latencies = timed(
+        lambda: list(db.courses.find(query, SUMMARY_PROJECTION).limit(args.limit)), args.iterations
+    )
+
+    full_size = describe("📦 Full catalog (view=full)", full, full_latencies)
+    summary_size = describe("📄 Summary catalog (view=summary)", summary, summary_latencies)
+    if summary_size:
+        print(f"\n✅ Summary payload is {full_size / summary_size:.1f}x smaller")
+
+    sample = next((c for c in full if c.get("modules")), None)
+    if sample:
+        order = sample["modules"][0].get("order", 0)
+        module, module_latencies = timed(
+            lambda: db.courses.find_one(
+                {"_id": sample["_id"], "modules.order": order},
+                {"title": 1, "modules": {"$elemMatch": {"order": order}}}
+            ),
+            args.iterations
+        )
+        print()
+        describe(f"🔎 Single module ({sample['title']} #{order})", module, module_latencies)
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
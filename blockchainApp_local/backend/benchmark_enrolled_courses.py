@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/courses/enrolled with a student enrolled in many courses
+
+Seeds a scratch database (<DATABASE_NAME>_bench, dropped afterwards) with
+courses carrying realistic module bodies and a student enrolled in all of
+them, using a mix of string and ObjectId course_id values. It then times
+the old per-enrollment find_one loop against the batched $in query used by
+routes.courses.get_enrolled_courses.
+
+    python benchmark_enrolled_courses.py --courses 150 --iterations 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import MONGODB_URL, DATABASE_NAME
+from routes.courses import COURSE_SUMMARY_PROJECTION, to_object_id
+
+STUDENT_ID = "bench_student"
+
+
+async def seed(db, course_count):
+    """Create courses and enrollments for the benchmark student"""
+    module_body = "Lorem ipsum dolor sit amet. " * 200
+    courses = [
+        {
+            "title": f"Benchmark Course {i}",
+            "description": "Benchmark course",
+            "category": "Benchmark",
+            "is_published": True,
+            "price": 0.01,
+            "modules": [
+                {"title": f"Module {m}", "order": m, "description": "Module", "content": module_body, "duration_minutes": 20}
+                for m in range(1, 9)
+            ]
+        }
+        for i in range(course_count)
+    ]
+    result = await db.courses.insert_many(courses)
+
+    enrollments = [
+        {
+            "student_id": STUDENT_ID,
+            # Alternate storage formats like the real data does
+            "course_id": str(course_id) if i % 2 else course_id,
+            "enrolled_at": datetime.utcnow(),
+            "status": "active",
+            "progress_percentage": 0.0,
+            "completed_modules": []
+        }
+        for i, course_id in enumerate(result.inserted_ids)
+    ]
+    await db.enrollments.insert_many(enrollments)
+    await db.enrollments.create_index("student_id")
+
+
+async def per_enrollment(db):
+    """Previous implementation: one find_one per enrollment"""
+    results = []
+    async for enrollment in db.enrollments.find({"student_id": STUDENT_ID}):
+        course_id = enrollment["course_id"]
+        course = await db.courses.find_one({"_id": ObjectId(course_id) if isinstance(course_id, str) else course_id})
+        if course:
+            enrollment["course"] = course
+            results.append(enrollment)
+    return results
+
+
+async def batched(db):
+    """Current implementation: one $in query with an id -> course map"""
+    enrollments = await db.enrollments.find({"student_id": STUDENT_ID}).to_list(None)
+    course_ids = {oid for oid in (to_object_id(e.get("course_id")) for e in enrollments) if oid is not None}
+    courses_by_id = {}
+    async for course in db.courses.find({"_id": {"$in": list(course_ids)}}, COURSE_SUMMARY_PROJECTION):
+        courses_by_id[str(course["_id"])] = course
+    results = []
+    for enrollment in enrollments:
+        course = courses_by_id.get(str(enrollment["course_id"]))
+        if course:
+            enrollment["course"] = course
+            results.append(enrollment)
+    return results
+
+
+async def measure(label, fn, db, iterations):
+    latencies = []
+    count = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        count = len(await fn(db))
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"{label}: {count} enrollments, p50 {statistics.median(latencies):.1f} ms, max {max(latencies):.1f} ms")
+    return statistics.median(latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=150)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    bench_db_name = f"{DATABASE_NAME}_bench"
+    db = client[bench_db_name]
+
+    print("=== ENROLLED COURSES BENCHMARK ===")
+    try:
+        await client.drop_database(bench_db_name)
+        await seed(db, args.courses)
+        print(f"🌱 Seeded {args.courses} courses and enrollments in {bench_db_name}\n")
+
+        old = await measure("🐢 Per-enrollment find_one", per_enrollment, db, args.iterations)
+        new = await measure("🚀 Batched $in query     ", batched, db, args.iterations)
+        print(f"\n✅ Speedup: {old / new:.1f}x")
+    finally:
+        await client.drop_database(bench_db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
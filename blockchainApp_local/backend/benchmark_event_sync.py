@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: block timestamp lookups during donation event sync
+
+Starts a fake JSON-RPC node (fake_chain.py) with thousands of
+DonationReceived logs and resolves the block timestamp of every log two
+ways, range by range like the indexer does:
+
+  * per-event eth_getBlockByNumber, as the old listener did
+  * blockchain_events.block_timestamps: LRU plus one batched request per range
+
+    python benchmark_event_sync.py --blocks 1000 --events-per-block 5 --chunk 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from web3 import Web3
+
+from fake_chain import FAKE_CONTRACT_ADDRESS, FakeChain, serve
+
+
+async def fetch_ranges(w3, chain, chunk):
+    """Logs grouped by indexer range"""
+    ranges = []
+    for start in range(1, chain.head + 1, chunk):
+        end = min(start + chunk - 1, chain.head)
+        ranges.append(await w3.eth.get_logs({
+            "address": Web3.to_checksum_address(chain.address),
+            "fromBlock": start,
+            "toBlock": end
+        }))
+    return ranges
+
+
+async def per_event(w3, ranges):
+    """Previous implementation: one get_block per log"""
+    timestamps = {}
+    for logs in ranges:
+        for log in logs:
+            block = await w3.eth.get_block(log["blockNumber"])
+            timestamps[(log["transactionHash"], log["logIndex"])] = block["timestamp"]
+    return timestamps
+
+
+async def cached_batched(cache, ranges):
+    """Current implementation: LRU + one batch request per range"""
+    timestamps = {}
+    for logs in ranges:
+        by_block = await cache.get_many(log["blockNumber"] for log in logs)
+        for log in logs:
+            timestamps[(log["transactionHash"], log["logIndex"])] = by_block[log["blockNumber"]]
+    return timestamps
+
+
+async def measure(label, chain, coro):
+    chain.reset_counters()
+    start = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed * 1000:8.1f} ms, {chain.http_requests:5d} HTTP requests, "
+          f"{chain.calls.get('eth_getBlockByNumber', 0):5d} header lookups")
+    return elapsed, result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=1000)
+    parser.add_argument("--events-per-block", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=200, help="blocks per eth_getLogs range")
+    parser.add_argument("--port", type=int, default=8547)
+    args = parser.parse_args()
+
+    # Point the indexer module at the fake node before it reads its config
+    os.environ["ETHEREUM_RPC_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["CONTRACT_ADDRESS"] = FAKE_CONTRACT_ADDRESS
+    import blockchain_events
+    from blockchain_events import BlockTimestampCache, close_rpc_session, get_rpc_session
+
+    chain = FakeChain()
+    chain.mine(args.blocks, args.events_per_block)
+    runner = await serve(chain, port=args.port)
+    w3 = blockchain_events.get_w3()
+
+    print("=== EVENT SYNC TIMESTAMP BENCHMARK ===")
+    print(f"⛓️  {chain.head} blocks, {chain.donation_count} DonationReceived logs, {args.chunk}-block ranges\n")
+    try:
+        ranges = await fetch_ranges(w3, chain, args.chunk)
+        old, old_result = await measure("🐢 Per-event get_block   ", chain, per_event(w3, ranges))
+
+        # Route the provider through the pooled session for the new path
+        await get_rpc_session()
+        new, new_result = await measure("🚀 LRU + batched headers ", chain, cached_batched(BlockTimestampCache(), ranges))
+        assert old_result == new_result, "timestamp mismatch"
+        print(f"\n✅ Speedup: {old / new:.1f}x")
+    finally:
+        await close_rpc_session()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
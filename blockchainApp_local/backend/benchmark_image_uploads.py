@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop stall and throughput of image upload processing
+
+Generates a batch of large photos and runs the upload processing step
+(optimize + thumbnail) for all of them, like upload_multiple_images, two
+ways while a ticker coroutine measures how late the event loop wakes it:
+
+  * inline PIL calls on the event loop, one file after another (old handlers)
+  * image_pipeline: worker processes, all files submitted concurrently
+
+    python benchmark_image_uploads.py --files 10 --width 3000 --height 2000 --workers 4
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from image_pipeline import ImagePipeline, create_thumbnail, optimize_image
+
+TICK_SECONDS = 0.005
+
+
+class StallMonitor:
+    """Sleeps in short ticks and records how late each wake-up was"""
+
+    def __init__(self):
+        self.delays = []
+        self._task = None
+
+    async def _tick(self):
+        while True:
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            self.delays.append(max(0.0, time.perf_counter() - expected))
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._tick())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+    def report(self):
+        delays = sorted(self.delays) or [0.0]
+        p99 = delays[min(len(delays) - 1, int(len(delays) * 0.99))]
+        return delays[-1] * 1000, p99 * 1000
+
+
+def make_photo(path, width, height, seed):
+    """A noisy gradient JPEG, roughly as hard to compress as a photo"""
+    noise = Image.effect_noise((width, height), 40 + seed % 20).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    Image.blend(noise, gradient, 0.5).save(path, "JPEG", quality=95)
+
+
+def fresh_copies(sources, workdir, label):
+    target = workdir / label
+    target.mkdir()
+    copies = []
+    for source in sources:
+        copy = target / source.name
+        shutil.copyfile(source, copy)
+        copies.append((copy, target / f"thumb_{source.name}"))
+    return copies
+
+
+async def inline(jobs):
+    for image_path, thumbnail_path in jobs:
+        optimize_image(image_path)
+        create_thumbnail(image_path, thumbnail_path)
+        await asyncio.sleep(0)  # the old handler awaited file.read() between files
+
+
+async def pooled(pipeline, jobs):
+    await asyncio.gather(*(pipeline.optimize(image_path, thumbnail_path) for image_path, thumbnail_path in jobs))
+
+
+async def measure(label, coro, files):
+    with StallMonitor() as monitor:
+        await asyncio.sleep(TICK_SECONDS * 2)
+        start = time.perf_counter()
+        await coro
+        elapsed = time.perf_counter() - start
+    max_stall, p99_stall = monitor.report()
+    print(f"{label}: {elapsed * 1000:8.0f} ms, {files / elapsed:5.2f} images/s, "
+          f"max loop stall {max_stall:7.1f} ms, p99 {p99_stall:7.1f} ms")
+    return elapsed, max_stall
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        sources = []
+        for i in range(args.files):
+            path = workdir / f"photo_{i}.jpg"
+            make_photo(path, args.width, args.height, i)
+            sources.append(path)
+
+        print("=== IMAGE UPLOAD PIPELINE BENCHMARK ===")
+        print(f"🖼️  {args.files} photos of {args.width}x{args.height}, {args.workers} worker processes\n")
+
+        pipeline = ImagePipeline(workers=args.workers, max_pending=max(args.files, 1))
+        try:
+            # Start every worker process outside the measurement
+            (workdir / "warmup").mkdir()
+            warmup = []
+            for i in range(args.workers):
+                path = workdir / "warmup" / f"small_{i}.jpg"
+                make_photo(path, 64, 64, i)
+                warmup.append((path, workdir / "warmup" / f"thumb_{i}.jpg"))
+            await pooled(pipeline, warmup)
+
+            old, old_stall = await measure("🐢 Inline on the event loop ", inline(fresh_copies(sources, workdir, "inline")), args.files)
+            new, new_stall = await measure("🚀 Worker process pipeline  ", pooled(pipeline, fresh_copies(sources, workdir, "pooled")), args.files)
+        finally:
+            pipeline.shutdown()
+
+    print(f"\n✅ Throughput {old / new:.1f}x, worst event-loop stall {old_stall:.0f} ms -> {new_stall:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency of GET /api/courses while a login storm is running
+
+Measures p50/p95/p99 of catalog reads first on an idle server and then while
+many concurrent logins are hashing passwords. Run it against a build before
+and after the bcrypt executor change to compare how much the event loop
+stalls:
+
+    python benchmark_login_storm.py --base-url http://localhost:8000 --logins 200
+
+All requests come from one client address, so start the server with
+RATE_LIMIT_ENABLED=False; otherwise the auth_login and catalog_read
+policies answer most of them with 429. Latencies are reported for 2xx
+responses only, with every status code counted.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure_catalog(base_url, stop_event, samples, max_samples):
+    """Issue catalog reads back to back and record (status, latency in ms)"""
+    session = requests.Session()
+    while not stop_event.is_set() and len(samples) < max_samples:
+        start = time.perf_counter()
+        response = session.get(f"{base_url}/api/courses", timeout=30)
+        samples.append((response.status_code, (time.perf_counter() - start) * 1000))
+
+
+def login_once(base_url, email, password):
+    """Perform one login and return the HTTP status"""
+    response = requests.post(
+        f"{base_url}/api/auth/login",
+        json={"email": email, "password": password},
+        timeout=60
+    )
+    return response.status_code
+
+
+def run_phase(base_url, samples_wanted, storm=None):
+    """Collect catalog samples, optionally while a login storm runs"""
+    samples = []
+    stop_event = threading.Event()
+    reader = threading.Thread(
+        target=measure_catalog, args=(base_url, stop_event, samples, samples_wanted)
+    )
+
+    statuses = []
+    reader.start()
+    if storm:
+        with ThreadPoolExecutor(max_workers=storm["concurrency"]) as pool:
+            futures = [
+                pool.submit(login_once, base_url, storm["email"], storm["password"])
+                for _ in range(storm["logins"])
+            ]
+            statuses = [f.result() for f in futures]
+        stop_event.set()
+    reader.join()
+    return samples, statuses
+
+
+def print_statuses(statuses):
+    for status_code in sorted(set(statuses)):
+        print(f"   HTTP {status_code}: {statuses.count(status_code)}")
+    if 429 in statuses:
+        print("   ⚠️  Rate limited - restart the server with RATE_LIMIT_ENABLED=False")
+
+
+def report(label, results):
+    samples = [ms for status_code, ms in results if 200 <= status_code < 300]
+    print(f"{label}:")
+    print(f"   requests: {len(results)} ({len(samples)} successful, latencies below)")
+    print_statuses([status_code for status_code, _ in results])
+    print(f"   p50: {percentile(samples, 50):.1f} ms")
+    print(f"   p95: {percentile(samples, 95):.1f} ms")
+    print(f"   p99: {percentile(samples, 99):.1f} ms")
+    print(f"   max: {max(samples) if samples else 0:.1f} ms")
+    print(f"   mean: {statistics.mean(samples) if samples else 0:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="student@edtech.com")
+    parser.add_argument("--password", default="student123")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    print("=== LOGIN STORM BENCHMARK ===")
+    print(f"🌐 Target: {args.base_url}")
+
+    idle_samples, _ = run_phase(args.base_url, args.samples)
+    report("\n📊 GET /api/courses (idle)", idle_samples)
+
+    storm = {
+        "email": args.email,
+        "password": args.password,
+        "logins": args.logins,
+        "concurrency": args.concurrency
+    }
+    storm_started = time.perf_counter()
+    storm_samples, statuses = run_phase(args.base_url, 10 ** 9, storm)
+    storm_elapsed = time.perf_counter() - storm_started
+    report(f"\n🔥 GET /api/courses during {args.logins} logins", storm_samples)
+
+    print("\n🔐 Login storm:")
+    print(f"   duration: {storm_elapsed:.2f} s ({args.logins / storm_elapsed:.1f} logins/s)")
+    print_statuses(statuses)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: repeated image uploads with and without the content-addressed store
+
+Uploads a batch in which only a few images are distinct (as when the same
+course thumbnails are uploaded again and again), two ways:
+
+  * per-upload files: every upload optimized and thumbnailed (old handlers)
+  * media_store: known content gets another reference, no PIL work
+
+and reports time, pipeline jobs and bytes on disk. The store's refcounts
+live in a scratch database (<DATABASE_NAME>_bench, dropped afterwards).
+
+    python benchmark_media_dedup.py --uploads 40 --distinct 4
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmark_image_uploads import make_photo
+from config import MONGODB_URL, DATABASE_NAME, RENDITION_WIDTHS, RENDITION_FORMATS
+from image_pipeline import image_pipeline as pipeline
+from media_store import MediaStore
+
+MAX_SIZE = 10 * 1024 * 1024
+
+
+async def chunks_of(path: Path):
+    yield path.read_bytes()
+
+
+def disk_usage(root: Path) -> int:
+    return sum(p.stat().st_size for p in root.rglob("*") if p.is_file())
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=4)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    bench_db_name = f"{DATABASE_NAME}_bench"
+    db = client[bench_db_name]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        sources = []
+        for i in range(args.distinct):
+            path = workdir / f"photo_{i}.jpg"
+            make_photo(path, args.width, args.height, i)
+            sources.append(path)
+        uploads = [sources[i % args.distinct] for i in range(args.uploads)]
+
+        print("=== MEDIA DEDUPLICATION BENCHMARK ===")
+        print(f"🖼️  {args.uploads} uploads of {args.distinct} distinct {args.width}x{args.height} photos\n")
+        try:
+            await client.drop_database(bench_db_name)
+
+            # Start the worker processes outside the measurement
+            make_photo(workdir / "warmup.jpg", 64, 64, 0)
+            await pipeline.optimize(workdir / "warmup.jpg", workdir / "warmup_thumb.jpg")
+            warm_jobs = pipeline.completed
+
+            legacy_dir = workdir / "legacy"
+            legacy_dir.mkdir()
+            start = time.perf_counter()
+            for i, source in enumerate(uploads):
+                target = legacy_dir / f"{i}.jpg"
+                shutil.copyfile(source, target)
+                await pipeline.optimize(target, legacy_dir / f"thumb_{i}.jpg")
+            old = time.perf_counter() - start
+            old_jobs = pipeline.completed - warm_jobs
+            print(f"🐢 Per-upload files: {old * 1000:8.0f} ms, {old_jobs:3d} pipeline jobs, "
+                  f"{disk_usage(legacy_dir) / 1024:8.0f} KB on disk")
+
+            # Renditions off: they are background work the legacy path never did
+            store = MediaStore(workdir / "objects", RENDITION_WIDTHS, RENDITION_FORMATS, eager_renditions=False)
+            start = time.perf_counter()
+            for source in uploads:
+                await store.store(db, chunks_of(source), MAX_SIZE, "benchmark")
+            new = time.perf_counter() - start
+            new_jobs = pipeline.completed - old_jobs - warm_jobs
+            print(f"🚀 Media store     : {new * 1000:8.0f} ms, {new_jobs:3d} pipeline jobs, "
+                  f"{disk_usage(store.root) / 1024:8.0f} KB on disk")
+            print(f"   {store.stats()}")
+
+            print(f"\n✅ {old / new:.1f}x faster, {old_jobs - new_jobs} PIL jobs skipped")
+        finally:
+            pipeline.shutdown()
+            await client.drop_database(bench_db_name)
+            client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark: "owned" badges for a catalog page of on-chain courses
+
+Starts a fake JSON-RPC node (fake_chain.py) where one wallet bought some
+of the courses, then answers hasPurchased for every course on the page:
+
+  * one eth_call per course, as has_purchased_course would without an index
+  * purchase_verifier, cold: one Multicall3 aggregate3 eth_call
+  * purchase_verifier, warm: served from the cache
+  * purchase_verifier without Multicall3 on the chain: one JSON-RPC batch
+
+The purchases collection of a scratch database (<DATABASE_NAME>_bench,
+dropped afterwards) is left empty so every course goes to the chain.
+
+    python benchmark_purchase_checks.py --courses 50
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from fake_chain import FAKE_CONTRACT_ADDRESS, FAKE_MULTICALL_ADDRESS, FakeChain, serve
+
+BUYER = "0x" + "b1" * 20
+
+
+async def measure(label, chain, coro):
+    chain.reset_counters()
+    start = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed * 1000:8.1f} ms, {chain.http_requests:3d} HTTP requests, "
+          f"{chain.calls.get('eth_call', 0):3d} eth_calls")
+    return elapsed, result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--owned-every", type=int, default=3, help="the wallet bought every Nth course")
+    parser.add_argument("--port", type=int, default=8548)
+    args = parser.parse_args()
+
+    # Point the blockchain modules at the fake node before they read their config
+    os.environ["ETHEREUM_RPC_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["CONTRACT_ADDRESS"] = FAKE_CONTRACT_ADDRESS
+    os.environ["MULTICALL3_ADDRESS"] = FAKE_MULTICALL_ADDRESS
+    from config import MONGODB_URL, DATABASE_NAME
+    import blockchain_events
+    from blockchain_events import close_rpc_session, get_rpc_session
+    from purchase_verifier import PurchaseVerifier, encode_has_purchased, decode_bool
+    from web3 import Web3
+
+    chain = FakeChain()
+    course_ids = list(range(1, args.courses + 1))
+    for course_id in course_ids[::args.owned_every]:
+        chain.emit("CoursePurchased", buyer=BUYER, courseId=course_id, amount=10**16)
+    chain.mine(1)
+    runner = await serve(chain, port=args.port)
+    client = AsyncIOMotorClient(MONGODB_URL)
+    bench_db_name = f"{DATABASE_NAME}_bench"
+    db = client[bench_db_name]
+    w3 = blockchain_events.get_w3()
+
+    async def per_course():
+        owned = {}
+        for course_id in course_ids:
+            data = await w3.eth.call({
+                "to": Web3.to_checksum_address(FAKE_CONTRACT_ADDRESS),
+                "data": encode_has_purchased(course_id, BUYER)
+            })
+            owned[course_id] = decode_bool(bytes(data))
+        return owned
+
+    print("=== PURCHASE VERIFICATION BENCHMARK ===")
+    print(f"📚 {args.courses} courses, wallet owns {len(chain.purchases)}\n")
+    try:
+        await client.drop_database(bench_db_name)
+        old, expected = await measure("🐢 eth_call per course      ", chain, per_course())
+
+        await get_rpc_session()
+        verifier = PurchaseVerifier(FAKE_CONTRACT_ADDRESS, FAKE_MULTICALL_ADDRESS)
+        cold, result = await measure("🚀 Verifier, Multicall3     ", chain, verifier.verify_many(db, BUYER, course_ids))
+        assert result == expected, "multicall result mismatch"
+        warm, result = await measure("⚡ Verifier, cached         ", chain, verifier.verify_many(db, BUYER, course_ids))
+        assert result == expected, "cached result mismatch"
+
+        chain.multicall_address = None
+        fallback_verifier = PurchaseVerifier(FAKE_CONTRACT_ADDRESS, FAKE_MULTICALL_ADDRESS)
+        _, result = await measure("🔁 Verifier, no Multicall3  ", chain, fallback_verifier.verify_many(db, BUYER, course_ids))
+        assert result == expected, "fallback result mismatch"
+        fallback_verifier.clear()
+        _, result = await measure("🔁 ...after detecting it    ", chain, fallback_verifier.verify_many(db, BUYER, course_ids))
+        assert result == expected, "fallback result mismatch"
+
+        print(f"\n✅ Multicall speedup: {old / cold:.1f}x cold, {old / warm:.0f}x cached")
+    finally:
+        await client.drop_database(bench_db_name)
+        client.close()
+        await close_rpc_session()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
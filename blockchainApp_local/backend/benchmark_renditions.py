@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes sent per client with responsive renditions
+
+Generates photos, optimizes them as an upload would and builds their
+renditions in the image pipeline, then compares what each kind of client
+downloads: the optimized original (old serve endpoint) against the
+rendition chosen by choose_rendition for its Accept header and width.
+
+    python benchmark_renditions.py --files 5 --width 3000 --height 2000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_image_uploads import make_photo
+from config import RENDITION_WIDTHS, RENDITION_FORMATS
+from image_pipeline import image_pipeline, supported_rendition_formats
+from media_store import choose_rendition
+
+CLIENTS = [
+    ("📱 Phone, AVIF    ", "image/avif,image/webp,image/*,*/*;q=0.8", 360),
+    ("📱 Phone, WebP    ", "image/webp,*/*", 360),
+    ("💻 Laptop, WebP   ", "image/webp,*/*", 1280),
+    ("🖥️  Desktop, JPEG  ", "*/*", 1920),
+]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    args = parser.parse_args()
+
+    formats = supported_rendition_formats(RENDITION_FORMATS)
+    print("=== RESPONSIVE RENDITIONS BENCHMARK ===")
+    print(f"🖼️  {args.files} photos of {args.width}x{args.height}, widths {RENDITION_WIDTHS}, formats {formats}\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        manifests = []
+        try:
+            for i in range(args.files):
+                path = workdir / f"photo_{i}.jpg"
+                make_photo(path, args.width, args.height, i)
+                await image_pipeline.optimize(path, workdir / f"thumb_{i}.jpg")
+
+            start = time.perf_counter()
+            for i in range(args.files):
+                manifests.append(await image_pipeline.renditions(workdir / f"photo_{i}.jpg", f"photo_{i}", RENDITION_WIDTHS, formats))
+            elapsed = time.perf_counter() - start
+        finally:
+            image_pipeline.shutdown()
+
+        variants = sum(len(m) for m in manifests)
+        print(f"⚙️  {variants} renditions in {elapsed * 1000:.0f} ms ({elapsed * 1000 / args.files:.0f} ms per image, background)\n")
+
+        original = sum((workdir / f"photo_{i}.jpg").stat().st_size for i in range(args.files))
+        for label, accept, width in CLIENTS:
+            chosen = [choose_rendition(m, accept, width) for m in manifests]
+            sent = sum(entry["size"] for entry in chosen)
+            print(f"{label}: {original / 1024:8.0f} KB -> {sent / 1024:8.0f} KB "
+                  f"({chosen[0]['format']} {chosen[0]['width']}px, {original / sent:4.1f}x less)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: application import and startup time under different RPC health
+
+Runs ``import main`` and the FastAPI lifespan startup in a fresh
+interpreter for each RPC scenario and reports:
+
+  * import time of main (and whether web3 was imported along with it)
+  * startup time until the app is ready to serve
+  * time until the background RPC probe finished, and its outcome
+
+Scenarios: a healthy fake node (fake_chain.py), an RPC endpoint that
+accepts connections but never answers, and a refused connection. Startup
+must not depend on any of them. MongoDB is whatever MONGODB_URL points
+at; with it down, startup is bounded by MONGODB_SERVER_SELECTION_TIMEOUT_MS.
+
+    python benchmark_startup.py --probe-timeout 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from fake_chain import FAKE_CONTRACT_ADDRESS, FakeChain, serve
+
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+import_seconds = time.perf_counter() - started
+web3_imported = "web3" in sys.modules
+
+async def run():
+    started = time.perf_counter()
+    async with main.lifespan(main.app):
+        startup_seconds = time.perf_counter() - started
+        while main.chain_status["checked_at"] is None and time.perf_counter() - started < 60:
+            await asyncio.sleep(0.01)
+        probe_seconds = time.perf_counter() - started
+    print("RESULT " + json.dumps({
+        "import": import_seconds,
+        "web3_at_import": web3_imported,
+        "startup": startup_seconds,
+        "probe": probe_seconds,
+        "connected": main.chain_status["connected"],
+    }))
+
+asyncio.run(run())
+"""
+
+
+async def hanging_rpc(port):
+    """Accepts connections and never answers"""
+    async def handler(reader, writer):
+        await reader.read()  # until the client gives up
+        writer.close()
+    return await asyncio.start_server(handler, "127.0.0.1", port)
+
+
+async def measure(label, rpc_url, probe_timeout):
+    env = dict(
+        os.environ,
+        ETHEREUM_RPC_URL=rpc_url,
+        CONTRACT_ADDRESS=FAKE_CONTRACT_ADDRESS,
+        ETHEREUM_CONNECT_TIMEOUT_SECONDS=str(probe_timeout),
+        INDEXER_ENABLED="False"
+    )
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", CHILD, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    output, _ = await process.communicate()
+    lines = output.decode(errors="replace").splitlines()
+    result_line = next((line for line in lines if line.startswith("RESULT ")), None)
+    if result_line is None:
+        print(f"❌ {label}: child failed\n" + "\n".join(lines[-20:]))
+        return None
+    result = json.loads(result_line[len("RESULT "):])
+    print(f"{label}: import {result['import'] * 1000:7.0f} ms "
+          f"(web3 {'loaded' if result['web3_at_import'] else 'deferred'}), "
+          f"startup {result['startup'] * 1000:7.0f} ms, "
+          f"RPC probe done at {result['probe'] * 1000:7.0f} ms ({'connected' if result['connected'] else 'unreachable'})")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--probe-timeout", type=float, default=2.0, help="ETHEREUM_CONNECT_TIMEOUT_SECONDS for the run")
+    parser.add_argument("--port", type=int, default=8549, help="first of three local ports")
+    args = parser.parse_args()
+
+    chain = FakeChain()
+    runner = await serve(chain, port=args.port)
+    hanging = await hanging_rpc(args.port + 1)
+
+    print("=== STARTUP BENCHMARK ===")
+    try:
+        results = [
+            await measure("✅ Healthy RPC   ", f"http://127.0.0.1:{args.port}", args.probe_timeout),
+            await measure("🐌 Hanging RPC   ", f"http://127.0.0.1:{args.port + 1}", args.probe_timeout),
+            await measure("🚫 Refused RPC   ", f"http://127.0.0.1:{args.port + 2}", args.probe_timeout),
+        ]
+    finally:
+        hanging.close()
+        await runner.cleanup()
+
+    if all(results):
+        spread = max(r["startup"] for r in results) - min(r["startup"] for r in results)
+        print(f"\n📊 Startup spread across RPC scenarios: {spread * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: on-demand image transforms through transform_cache
+
+Fires bursts of concurrent requests for variants of one photo, as a page
+of thumbnails would right after an image is published:
+
+  * cold burst: every request for the same variant at once (one transform)
+  * warm burst: the same requests again (served from the disk cache)
+  * uncoalesced: one transform per request, as without single-flight
+
+The cache lives in a temporary directory.
+
+    python benchmark_transform_cache.py --requests 20 --width 640 --format webp
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_image_uploads import make_photo
+from image_pipeline import image_pipeline
+from transform_cache import TransformCache
+
+
+async def measure(label, coro, requests):
+    jobs = image_pipeline.completed
+    start = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed * 1000:8.1f} ms for {requests} requests, {image_pipeline.completed - jobs:3d} transforms")
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--format", default="webp")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        source = workdir / "photo.jpg"
+        make_photo(source, 2048, 1365, 0)
+        cache = TransformCache(workdir / "cache", 64 * 1024 * 1024)
+
+        async def fetch(source_id, width, fmt):
+            # Released right away, as a served response would
+            path = await cache.get(source, source_id, width, None, fmt)
+            cache.release(path)
+            return path
+
+        def burst(source_id):
+            return asyncio.gather(*(fetch(source_id, args.width, args.format) for _ in range(args.requests)))
+
+        print("=== TRANSFORM CACHE BENCHMARK ===")
+        print(f"🖼️  {args.requests} concurrent requests for {args.format} at {args.width}px\n")
+        try:
+            # Start the worker processes outside the measurement
+            await fetch("warmup", 32, "jpeg")
+
+            cold = await measure("🧊 Cold, coalesced   ", burst("photo"), args.requests)
+            warm = await measure("⚡ Warm, cached      ", burst("photo"), args.requests)
+            uncoalesced = await measure("🐢 One per request   ", asyncio.gather(*(
+                fetch(f"photo-{i}", args.width, args.format) for i in range(args.requests)
+            )), args.requests)
+        finally:
+            image_pipeline.shutdown()
+
+        print(f"\n📊 {cache.stats()}")
+        print(f"✅ Coalescing {uncoalesced / cold:.1f}x faster than a transform per request; "
+              f"cached burst {cold / warm:.0f}x faster than cold")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
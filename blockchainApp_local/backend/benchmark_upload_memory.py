@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak Python memory of saving an upload to disk
+
+Feeds uploads of increasing size through the two ways the media handlers
+have saved them, measuring the tracemalloc peak of each:
+
+  * buffered: ``await file.read()``, write it out, read it back to hash it
+  * streamed: upload_stream.stream_to_temp, hashing chunk by chunk
+
+Also checks that an oversized stream is cut off at the limit and leaves no
+partial file behind. Image optimisation is not included; it runs in worker
+processes either way.
+
+    python benchmark_upload_memory.py --sizes 1 4 10
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+
+from upload_stream import iter_upload_file, stream_to_temp
+
+MB = 1024 * 1024
+
+
+def make_upload(source: Path) -> UploadFile:
+    return UploadFile(file=open(source, "rb"), filename=source.name)
+
+
+async def buffered(file: UploadFile, target: Path):
+    with open(target, "wb") as buffer:
+        content = await file.read()
+        buffer.write(content)
+    with open(target, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+async def streamed(file: UploadFile, target: Path):
+    upload = await stream_to_temp(iter_upload_file(file), target.parent, 64 * MB)
+    os.replace(upload.path, target)
+    return upload.sha256
+
+
+async def measure(label, source: Path, target: Path, save):
+    file = make_upload(source)
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        digest = await save(file, target)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        await file.close()
+    print(f"{label}: peak {peak / MB:8.2f} MB, {elapsed * 1000:7.1f} ms")
+    return digest, peak
+
+
+async def check_limit(workdir: Path, limit: int):
+    async def endless():
+        while True:
+            yield b"\0" * (64 * 1024)
+
+    try:
+        await stream_to_temp(endless(), workdir, limit)
+    except HTTPException as e:
+        leftovers = list(workdir.glob("*.part"))
+        assert e.status_code == 413, e.status_code
+        assert not leftovers, leftovers
+        print(f"✅ Endless stream rejected with 413 after {limit // MB} MB, no partial file left")
+        return
+    raise AssertionError("oversized stream was accepted")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 4, 10], help="upload sizes in MB")
+    args = parser.parse_args()
+
+    print("=== UPLOAD MEMORY BENCHMARK ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for size in args.sizes:
+            source = workdir / f"upload_{size}mb.bin"
+            source.write_bytes(os.urandom(size * MB))
+            print(f"\n📦 {size} MB upload")
+            old_digest, old_peak = await measure("🐢 Buffered read", source, workdir / "buffered.bin", buffered)
+            new_digest, new_peak = await measure("🚀 Streamed     ", source, workdir / "streamed.bin", streamed)
+            assert old_digest == new_digest, "hash mismatch"
+            print(f"   same SHA-256, {old_peak / max(new_peak, 1):.0f}x less peak memory")
+        print()
+        await check_limit(workdir, 2 * MB)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
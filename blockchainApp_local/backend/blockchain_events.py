@@ -1,19 +1,58 @@
+"""
+Asyncio indexer syncing EdTechDonation and HardwareCourses events into MongoDB
+
+The indexer pulls ``eth_getLogs`` in bounded block ranges, writes events
+through the app's Motor client and checkpoints the last processed block in
+the ``indexer_checkpoints`` collection, so a restart resumes where the
+previous run stopped instead of skipping to the chain head. Decoding and
+per-event routing live in contract_events.
+
+Importing this module does no network I/O and does not import web3 (over
+a second on its own). ``start_indexer`` builds the client in a worker
+thread and probes the RPC with a timeout in the background, so startup
+time does not depend on the RPC being fast, or reachable at all.
+"""
+import asyncio
 import os
-import time
+import socket
 import threading
-from web3 import Web3
-from dotenv import load_dotenv
-from pymongo import MongoClient
-import json
-from typing import Any, Dict, Optional
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional, Tuple
 
-load_dotenv()
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-# Load config
-ETHEREUM_RPC_URL = os.getenv("ETHEREUM_RPC_URL", "https://sepolia.infura.io/v3/your-infura-project-id")
-CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")  # Set this in your .env
-MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-DATABASE_NAME = os.getenv("DATABASE_NAME", "edtech_hardware")
+from config import (
+    ETHEREUM_RPC_URL,
+    CONTRACT_ADDRESS,
+    HARDWARE_COURSES_ADDRESS,
+    ETHEREUM_RPC_TIMEOUT_SECONDS,
+    ETHEREUM_CONNECT_TIMEOUT_SECONDS,
+    ETHEREUM_RPC_POOL_SIZE,
+    ETHEREUM_RPC_BATCH_SIZE,
+    INDEXER_ENABLED,
+    INDEXER_CHUNK_BLOCKS,
+    INDEXER_POLL_SECONDS,
+    INDEXER_START_BLOCK,
+    INDEXER_BATCH_SIZE,
+    INDEXER_FLUSH_INTERVAL_SECONDS,
+    INDEXER_CONFIRMATIONS,
+    INDEXER_REORG_WINDOW,
+    INDEXER_LEASE_SECONDS,
+    BLOCK_TIMESTAMP_CACHE_SIZE
+)
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+    from web3 import AsyncWeb3
+
+CHECKPOINTS_COLLECTION = "indexer_checkpoints"
+# One lease document per indexer, naming the worker allowed to run it
+LEASES_COLLECTION = "indexer_leases"
+# Checkpoint of the earlier DonationReceived-only indexer
+LEGACY_CHECKPOINT = "EdTechDonation"
 
 # Check if we have valid configuration
 def is_valid_config():
@@ -24,118 +63,658 @@ def is_valid_config():
         return False
     return True
 
-# Only initialize blockchain connection if config is valid
-w3: Optional[Web3] = None
-contract = None
 
-if is_valid_config():
-    try:
-        w3 = Web3(Web3.HTTPProvider(ETHEREUM_RPC_URL))
-        if w3.is_connected():
-            print(f"[BlockchainEvents] ✅ Connected to Ethereum node")
-        else:
-            print(f"[BlockchainEvents] ❌ Failed to connect to Ethereum node")
-            w3 = None
-    except Exception as e:
-        print(f"[BlockchainEvents] ❌ Blockchain connection error: {e}")
-        w3 = None
-else:
-    print(f"[BlockchainEvents] ⚠️  Blockchain not configured - using placeholder values")
-    print(f"[BlockchainEvents] 💡 Update ETHEREUM_RPC_URL and CONTRACT_ADDRESS in .env file")
-
-# Load ABI safely
-try:
-    abi_path = os.path.join(os.path.dirname(__file__), '../smart-contracts/artifacts/contracts/EdTechDonation.sol/EdTechDonation.json')
-    with open(abi_path, 'r') as f:
-        contract_artifact = json.load(f)
-        CONTRACT_ABI = contract_artifact['abi']
-except FileNotFoundError:
-    print("[BlockchainEvents] Warning: Contract ABI file not found")
-    CONTRACT_ABI = []  # Empty ABI as fallback
-
-# Initialize another w3 instance to ensure we have a clean connection
-if w3 is None and is_valid_config():
-    try:
-        w3 = Web3(Web3.HTTPProvider(ETHEREUM_RPC_URL))
-    except Exception:
-        w3 = None
+_w3: Optional["AsyncWeb3"] = None
+_w3_lock = threading.Lock()
+_indexed_contracts: Optional[Dict[str, str]] = None
 
-# Initialize contract safely
-contract = None
-if CONTRACT_ABI and CONTRACT_ADDRESS and Web3.is_address(CONTRACT_ADDRESS) and w3 and w3.is_connected():
-    try:
-        contract = w3.eth.contract(address=Web3.to_checksum_address(CONTRACT_ADDRESS), abi=CONTRACT_ABI)
-        print(f"[BlockchainEvents] ✅ Contract initialized at {CONTRACT_ADDRESS}")
-    except Exception as e:
-        print(f"[BlockchainEvents] ❌ Error initializing contract: {e}")
-else:
-    print(f"[BlockchainEvents] ⚠️  Contract not initialized - missing ABI or invalid address")
-
-mongo = MongoClient(MONGODB_URL)
-db = mongo[DATABASE_NAME]
-donations_col = db['donations']
-
-# Listen for DonationReceived events
-def listen_donation_events():
-    """Listen for blockchain donation events and sync to database"""
-    if not contract or not w3 or not w3.is_connected():
-        print("[BlockchainEvents] Contract or Web3 not initialized, skipping event listener")
-        return
-        
-    print("[BlockchainEvents] Listening for DonationReceived events...")
-    
+# Result of the last RPC probe, served by /health without touching the RPC
+chain_status: Dict[str, Any] = {
+    "configured": is_valid_config(),
+    "connected": None,
+    "chain_id": None,
+    "latency_ms": None,
+    "checked_at": None,
+    "error": None
+}
+
+
+def get_w3() -> Optional["AsyncWeb3"]:
+    """Web3 client for ETHEREUM_RPC_URL, built on first use (None if not configured)"""
+    global _w3
+    if _w3 is None and is_valid_config():
+        with _w3_lock:
+            if _w3 is None:
+                from aiohttp import ClientTimeout
+                from web3 import AsyncHTTPProvider, AsyncWeb3
+                _w3 = AsyncWeb3(AsyncHTTPProvider(
+                    ETHEREUM_RPC_URL,
+                    request_kwargs={"timeout": ClientTimeout(total=ETHEREUM_RPC_TIMEOUT_SECONDS)}
+                ))
+    return _w3
+
+
+def indexed_contracts() -> Dict[str, str]:
+    """Contracts whose events are indexed: checksum address -> contract name"""
+    global _indexed_contracts
+    if _indexed_contracts is None:
+        from eth_utils import is_address, to_checksum_address
+        contracts = {}
+        for address, name in ((CONTRACT_ADDRESS, "EdTechDonation"), (HARDWARE_COURSES_ADDRESS, "HardwareCourses")):
+            if address and is_address(address):
+                contracts[to_checksum_address(address)] = name
+        _indexed_contracts = contracts
+    return _indexed_contracts
+
+
+async def init_blockchain(timeout: float = ETHEREUM_CONNECT_TIMEOUT_SECONDS) -> bool:
+    """Build the Web3 client off the event loop and probe the RPC; True if it answered"""
+    if not is_valid_config():
+        return False
+
+    w3 = await asyncio.to_thread(get_w3)
+    contracts = await asyncio.to_thread(indexed_contracts)
+    if contracts:
+        for address, name in contracts.items():
+            print(f"[BlockchainEvents] ✅ Indexing {name} at {address}")
+    else:
+        print("[BlockchainEvents] ⚠️  No contract to index - invalid contract address")
+
+    started = time.perf_counter()
     try:
-        last_block = w3.eth.block_number
+        await get_rpc_session()
+        chain_id = await asyncio.wait_for(w3.eth.chain_id, timeout)
+        chain_status.update(connected=True, chain_id=chain_id, error=None,
+                            latency_ms=round((time.perf_counter() - started) * 1000, 3))
+        print(f"[BlockchainEvents] ✅ Connected to chain {chain_id} in {chain_status['latency_ms']:.0f} ms")
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        print(f"[BlockchainEvents] Error getting block number: {e}")
-        return
-    
-    while True:
+        message = str(e) or f"no response within {timeout}s"
+        chain_status.update(connected=False, error=message, latency_ms=None)
+        print(f"[BlockchainEvents] ⚠️  RPC unreachable ({message}) - the indexer will keep retrying")
+    chain_status["checked_at"] = datetime.utcnow()
+    return bool(chain_status["connected"])
+
+
+_rpc_session: Optional["ClientSession"] = None
+# Whether the Web3 provider has been handed the current session
+_rpc_session_shared = False
+
+
+async def get_rpc_session() -> "ClientSession":
+    """Pooled keep-alive HTTP session shared by the Web3 provider and batch calls"""
+    global _rpc_session, _rpc_session_shared
+    if _rpc_session is None or _rpc_session.closed:
+        from aiohttp import ClientSession, ClientTimeout, TCPConnector
+        _rpc_session = ClientSession(
+            connector=TCPConnector(limit=ETHEREUM_RPC_POOL_SIZE),
+            timeout=ClientTimeout(total=ETHEREUM_RPC_TIMEOUT_SECONDS)
+        )
+        _rpc_session_shared = False
+    if _w3 is not None and not _rpc_session_shared:
+        await _w3.provider.cache_async_session(_rpc_session)
+        _rpc_session_shared = True
+    return _rpc_session
+
+
+async def close_rpc_session() -> None:
+    """Close the pooled session (application shutdown)"""
+    global _rpc_session, _rpc_session_shared
+    if _rpc_session is not None and not _rpc_session.closed:
+        await _rpc_session.close()
+    _rpc_session = None
+    _rpc_session_shared = False
+
+
+async def rpc_batch(calls: List[Tuple[str, List[Any]]]) -> List[Any]:
+    """Run JSON-RPC calls as batch requests; results are returned in call order.
+
+    Calls are split into batches of ETHEREUM_RPC_BATCH_SIZE sent
+    concurrently over the pooled session. Any failed call raises.
+    """
+    session = await get_rpc_session()
+
+    async def send(chunk: List[Tuple[str, List[Any]]]) -> List[Any]:
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(chunk)
+        ]
+        async with session.post(ETHEREUM_RPC_URL, json=payload) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        if not isinstance(body, list):
+            raise RuntimeError(f"JSON-RPC batch rejected: {body}")
+        by_id = {item.get("id"): item for item in body}
+        results = []
+        for i, (method, _) in enumerate(chunk):
+            item = by_id.get(i)
+            if item is None or "error" in item:
+                raise RuntimeError(f"{method} failed: {item.get('error') if item else 'missing response'}")
+            results.append(item["result"])
+        return results
+
+    size = max(1, ETHEREUM_RPC_BATCH_SIZE)
+    chunks = [calls[i:i + size] for i in range(0, len(calls), size)]
+    batches = await asyncio.gather(*(send(chunk) for chunk in chunks))
+    return [result for batch in batches for result in batch]
+
+
+class BlockTimestampCache:
+    """Bounded LRU of block number -> (timestamp, block hash).
+
+    Logs in a range usually share blocks; each block header is fetched at
+    most once, and all misses of a range go out as one batched request.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[int, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    async def get_many(self, block_numbers: Iterable[int]) -> Dict[int, int]:
+        """Return timestamps for ``block_numbers``, fetching missing headers"""
+        timestamps: Dict[int, int] = {}
+        missing = []
+        for number in sorted(set(block_numbers)):
+            entry = self._entries.get(number)
+            if entry is None:
+                missing.append(number)
+            else:
+                self._entries.move_to_end(number)
+                timestamps[number] = entry[0]
+        self.hits += len(timestamps)
+        self.misses += len(missing)
+
+        if missing:
+            self.batches += 1
+            blocks = await rpc_batch([("eth_getBlockByNumber", [hex(n), False]) for n in missing])
+            for number, block in zip(missing, blocks):
+                if block is None:
+                    raise RuntimeError(f"Block {number} not found")
+                timestamp = int(block["timestamp"], 16)
+                timestamps[number] = timestamp
+                self._entries[number] = (timestamp, block["hash"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return timestamps
+
+    def block_hash(self, number: int) -> Optional[str]:
+        """Hash of a cached block header"""
+        entry = self._entries.get(number)
+        return entry[1] if entry else None
+
+    def discard_from(self, number: int) -> None:
+        """Forget headers at or above ``number`` (they were orphaned by a reorg)"""
+        for cached in [n for n in self._entries if n >= number]:
+            del self._entries[cached]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "batches": self.batches
+        }
+
+
+block_timestamps = BlockTimestampCache(BLOCK_TIMESTAMP_CACHE_SIZE)
+
+
+class BulkEventWriter:
+    """Buffers event upserts and writes them with unordered ``bulk_write``.
+
+    Operations are grouped per collection. ``should_flush`` turns true once
+    ``batch_size`` operations are queued or ``flush_interval`` seconds have
+    passed since the oldest one; the caller flushes before advancing its
+    checkpoint, so a crash only ever replays idempotent upserts.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List[UpdateOne]] = {}
+        self._oldest: Optional[float] = None
+        self.batches = 0
+        self.operations = 0
+        self.upserted = 0
+        self.modified = 0
+        self.retried = 0
+        self.batch_seconds_total = 0.0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+
+    @property
+    def pending(self) -> int:
+        return sum(len(ops) for ops in self._pending.values())
+
+    def add(self, collection_name: str, operation: UpdateOne) -> None:
+        """Queue an operation for ``collection_name``"""
+        self._pending.setdefault(collection_name, []).append(operation)
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def should_flush(self) -> bool:
+        if not self._pending:
+            return False
+        return self.pending >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval
+
+    def clear(self) -> None:
+        """Drop queued operations (their ranges will be re-read)"""
+        self._pending = {}
+        self._oldest = None
+
+    async def _write(self, collection, operations: List[UpdateOne]) -> None:
+        started = time.perf_counter()
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            upserted, modified = result.upserted_count, result.modified_count
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            # Two concurrent upserts of the same key: the loser matches on retry
+            if not errors or any(error.get("code") != 11000 for error in errors):
+                raise
+            self.retried += len(errors)
+            retry = await collection.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+            upserted = e.details.get("nUpserted", 0) + retry.upserted_count
+            modified = e.details.get("nModified", 0) + retry.modified_count
+
+        elapsed = time.perf_counter() - started
+        self.batches += 1
+        self.operations += len(operations)
+        self.upserted += upserted
+        self.modified += modified
+        self.batch_seconds_total += elapsed
+        self.last_batch_ms = elapsed * 1000
+        self.max_batch_ms = max(self.max_batch_ms, self.last_batch_ms)
+        print(f"[BlockchainEvents] Wrote {len(operations)} {collection.name} events "
+              f"({upserted} new, {modified} updated) in {self.last_batch_ms:.1f} ms")
+
+    async def flush(self, db) -> int:
+        """Write every queued operation in batches; return the count written"""
+        pending, self._pending, self._oldest = self._pending, {}, None
+        written = 0
+        for collection_name, operations in pending.items():
+            for start in range(0, len(operations), self.batch_size):
+                batch = operations[start:start + self.batch_size]
+                await self._write(db[collection_name], batch)
+                written += len(batch)
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        """Return write counters and per-batch latency"""
+        return {
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "pending": self.pending,
+            "batches": self.batches,
+            "operations": self.operations,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "duplicate_key_retries": self.retried,
+            "last_batch_ms": round(self.last_batch_ms, 3),
+            "max_batch_ms": round(self.max_batch_ms, 3),
+            "avg_batch_ms": round(self.batch_seconds_total * 1000 / self.batches, 3) if self.batches else 0.0
+        }
+
+
+class EventIndexer:
+    """Checkpointed multi-event indexer.
+
+    Each pass reads the chain head, then walks ``(checkpoint, head - confirmations]``
+    in ``chunk_blocks`` ranges, one ``eth_getLogs`` per range covering every
+    indexed contract and event signature. Decoded events
+    are queued on a ``BulkEventWriter``; whenever it flushes, the checkpoint
+    advances to the last range whose events were written. On any error the
+    queue is dropped and the next pass resumes from the checkpoint.
+
+    Hashes of recently indexed blocks (range ends and blocks with events,
+    within ``reorg_window`` of the head) are kept with the checkpoint and
+    re-checked at the start of every pass. If the chain no longer has one
+    of them, events from the first changed block on are rolled back and
+    the range is indexed again from the new chain.
+
+    With several server processes only the holder of a lease document
+    (renewed while it runs, expiring ``lease_seconds`` after the last
+    renewal) indexes; the others poll until it lapses.
+    """
+
+    def __init__(self, name: str = "contract_events", chunk_blocks: int = 2000,
+                 poll_seconds: float = 10, start_block: Optional[int] = None,
+                 writer: Optional[BulkEventWriter] = None, confirmations: int = 0,
+                 reorg_window: int = 128, lease_seconds: int = 60):
+        self.name = name
+        self.chunk_blocks = max(1, chunk_blocks)
+        self.poll_seconds = poll_seconds
+        self.start_block = start_block
+        self.writer = writer or BulkEventWriter()
+        self.confirmations = max(0, confirmations)
+        self.reorg_window = max(1, reorg_window)
+        self.lease_seconds = max(1, lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self._lease_renewed = 0.0
+        self.last_block: Optional[int] = None
+        self.checkpoint_block: Optional[int] = None
+        self.head_block: Optional[int] = None
+        # block number -> hash of recently indexed blocks, ascending
+        self.block_hashes: "OrderedDict[int, str]" = OrderedDict()
+        self.reorgs = 0
+        self.orphaned_events = 0
+        self.last_reorg: Optional[Dict[str, Any]] = None
+        self.events_total = 0
+        self.events_by_type: Dict[str, int] = {}
+        self.blocks_total = 0
+        self.ranges_total = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_range_ms = 0.0
+        self.last_synced_at: Optional[datetime] = None
+        # (monotonic time, events, blocks) per processed range, for throughput
+        self._recent: Deque[Tuple[float, int, int]] = deque(maxlen=512)
+
+    async def load_checkpoint(self, db, name: Optional[str] = None) -> Optional[int]:
+        """Return the last fully processed block, if any"""
+        checkpoint = await db[CHECKPOINTS_COLLECTION].find_one({"_id": name or self.name})
+        if checkpoint is None:
+            return None
+        if name is None:
+            self.block_hashes = OrderedDict(sorted((n, h) for n, h in checkpoint.get("block_hashes", [])))
+        return checkpoint["last_block"]
+
+    async def save_checkpoint(self, db, block: int) -> None:
+        """Record ``block`` as fully processed"""
+        await db[CHECKPOINTS_COLLECTION].update_one(
+            {"_id": self.name},
+            {"$set": {
+                "last_block": block,
+                "block_hashes": [[n, h] for n, h in self.block_hashes.items() if n <= block],
+                "contracts": indexed_contracts(),
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        self.checkpoint_block = block
+
+    async def acquire_lease(self, db) -> bool:
+        """Take or renew the indexing lease; False while another worker holds it"""
+        now = datetime.utcnow()
+        try:
+            await db[LEASES_COLLECTION].update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease exists, is live and belongs to someone else
+            if self.is_leader:
+                print(f"[BlockchainEvents] ⚠️  Lost the indexer lease for {self.name}")
+            self.is_leader = False
+            return False
+        if not self.is_leader:
+            print(f"[BlockchainEvents] ✅ Holding the indexer lease for {self.name} ({self.owner})")
+        self.is_leader = True
+        self._lease_renewed = time.monotonic()
+        return True
+
+    async def release_lease(self, db) -> None:
+        """Give the lease up so another worker can take over at once"""
+        if self.is_leader:
+            self.is_leader = False
+            await db[LEASES_COLLECTION].delete_one({"_id": self.name, "owner": self.owner})
+
+    async def renew_lease(self, db) -> None:
+        """Renew the lease once half of it has run out; raise if it was lost"""
+        if time.monotonic() - self._lease_renewed < self.lease_seconds / 2:
+            return
+        if not await self.acquire_lease(db):
+            raise RuntimeError(f"indexer lease for {self.name} taken over by another worker")
+
+    async def flush(self, db) -> None:
+        """Write queued events, then checkpoint the last processed block"""
+        await self.writer.flush(db)
+        if self.last_block is not None and self.last_block != self.checkpoint_block:
+            await self.save_checkpoint(db, self.last_block)
+
+    async def fetch_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        """One topic-filtered eth_getLogs call over an inclusive range"""
+        from contract_events import EVENT_TOPICS
+        return await get_w3().eth.get_logs({
+            "address": list(indexed_contracts()),
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [EVENT_TOPICS]
+        })
+
+    def record_hashes(self, hashes: Dict[int, str]) -> None:
+        """Remember block hashes within the reorg window of the head"""
+        floor = (self.head_block or 0) - self.reorg_window
+        for number, block_hash in sorted(hashes.items()):
+            if number > floor:
+                self.block_hashes[number] = block_hash
+        self.block_hashes = OrderedDict(sorted((n, h) for n, h in self.block_hashes.items() if n > floor))
+
+    async def remember_range(self, to_block: int, logs: List[Dict[str, Any]]) -> None:
+        """Record hashes of a range's event blocks and of its last block"""
+        from web3 import Web3
+        hashes = {log["blockNumber"]: Web3.to_hex(log["blockHash"]) for log in logs}
+        if to_block not in hashes:
+            await block_timestamps.get_many([to_block])
+            hashes[to_block] = block_timestamps.block_hash(to_block)
+        self.record_hashes(hashes)
+
+    async def check_reorg(self, db) -> Optional[int]:
+        """Roll back if a remembered block hash changed; return the first re-indexed block"""
+        if not self.block_hashes:
+            return None
+        numbers = list(self.block_hashes)
+        blocks = await rpc_batch([("eth_getBlockByNumber", [hex(n), False]) for n in numbers])
+        changed = [
+            n for n, block in zip(numbers, blocks)
+            if block is None or block["hash"] != self.block_hashes[n]
+        ]
+        if not changed:
+            return None
+
+        # Blocks between the last unchanged hash and the first changed one
+        # may have changed too: re-index from just after the unchanged one
+        unchanged = [n for n in numbers if n < changed[0]]
+        from_block = unchanged[-1] + 1 if unchanged else changed[0]
+        if not unchanged:
+            print(f"[BlockchainEvents] ⚠️  Reorg reaches below the {self.reorg_window}-block window, "
+                  f"rolling back from block {from_block} only")
+        from contract_events import rollback_events
+        removed = await rollback_events(db, from_block)
+        orphaned = sum(removed.values())
+        rolled_back_blocks = max(0, (self.last_block or from_block) - from_block + 1)
+
+        for number in [n for n in self.block_hashes if n >= from_block]:
+            del self.block_hashes[number]
+        block_timestamps.discard_from(from_block)
+        self.last_block = from_block - 1
+        # Saved after the rollback, so a crash in between rolls back again
+        await self.save_checkpoint(db, self.last_block)
+
+        self.reorgs += 1
+        self.orphaned_events += orphaned
+        self.last_reorg = {
+            "detected_at": datetime.utcnow(),
+            "from_block": from_block,
+            "blocks": rolled_back_blocks,
+            "orphaned_events": removed
+        }
+        print(f"[BlockchainEvents] 🔀 Reorg detected: rolled back {orphaned} events from block {from_block}, re-indexing")
+        return from_block
+
+    async def process_logs(self, logs: List[Dict[str, Any]]) -> int:
+        """Decode logs and queue their upserts; return the count"""
+        from contract_events import decode_log, route_event
+        from web3 import Web3
+        contracts = indexed_contracts()
+        decoded_logs = [d for d in (decode_log(get_w3().codec, log) for log in logs) if d is not None]
+        # One batched header fetch for every block not already cached
+        timestamps = await block_timestamps.get_many(d["blockNumber"] for d in decoded_logs)
+        for decoded in decoded_logs:
+            contract_name = contracts.get(Web3.to_checksum_address(decoded["address"]), "unknown")
+            collection_name, operation = route_event(decoded, timestamps[decoded["blockNumber"]], contract_name)
+            self.writer.add(collection_name, operation)
+            self.events_by_type[decoded["event"]] = self.events_by_type.get(decoded["event"], 0) + 1
+        return len(decoded_logs)
+
+    async def sync_once(self, db) -> int:
+        """Index everything ``confirmations`` blocks below the head; return events processed"""
+        head = await get_w3().eth.block_number
+        self.head_block = head
+        safe_head = head - self.confirmations
+
+        if self.last_block is None:
+            self.last_block = self.checkpoint_block = await self.load_checkpoint(db)
+        if self.last_block is None:
+            # Continue from the donation-only indexer this one replaced
+            self.last_block = await self.load_checkpoint(db, LEGACY_CHECKPOINT)
+            if self.last_block is not None:
+                await self.save_checkpoint(db, self.last_block)
+        if self.last_block is None:
+            # No checkpoint yet: start at the configured block or the head
+            first = self.start_block if self.start_block is not None else safe_head + 1
+            self.last_block = first - 1
+            await self.save_checkpoint(db, self.last_block)
+            print(f"[BlockchainEvents] No checkpoint for {self.name}, starting at block {first}")
+
+        processed = 0
+        try:
+            await self.check_reorg(db)
+            while self.last_block < safe_head:
+                # Long catch-up passes must not outlive the lease
+                await self.renew_lease(db)
+                from_block = self.last_block + 1
+                to_block = min(from_block + self.chunk_blocks - 1, safe_head)
+                started = time.perf_counter()
+
+                logs = await self.fetch_logs(from_block, to_block)
+                count = await self.process_logs(logs)
+                if to_block > head - self.reorg_window:
+                    await self.remember_range(to_block, logs)
+                self.last_block = to_block
+                if self.writer.should_flush():
+                    await self.flush(db)
+
+                self.last_range_ms = (time.perf_counter() - started) * 1000
+                self.last_synced_at = datetime.utcnow()
+                self.ranges_total += 1
+                self.events_total += count
+                self.blocks_total += to_block - from_block + 1
+                self._recent.append((time.monotonic(), count, to_block - from_block + 1))
+                processed += count
+            await self.flush(db)
+        except Exception:
+            # Unwritten ranges are re-read from the checkpoint next pass
+            self.writer.clear()
+            self.last_block = self.checkpoint_block
+            for number in [n for n in self.block_hashes if self.last_block is None or n > self.last_block]:
+                del self.block_hashes[number]
+            raise
+        return processed
+
+    async def run(self, db) -> None:
+        """Poll forever; cancel the task to stop"""
+        from contract_events import EVENT_TOPICS
+        print(f"[BlockchainEvents] Indexing {len(EVENT_TOPICS)} event types (chunk {self.chunk_blocks} blocks)")
         try:
-            event_filter = contract.events.DonationReceived.create_filter(from_block=last_block + 1)
-            for event in event_filter.get_all_entries():
-                donor = event['args']['donor']
-                donationId = int(event['args']['donationId'])
-                amount = int(event['args']['amount'])
-                purpose = event['args']['purpose']
-                txHash = event['transactionHash'].hex()
-                blockNumber = event['blockNumber']
-                
-                # Safely get block timestamp
+            while True:
                 try:
-                    block_data = w3.eth.get_block(blockNumber)
-                    timestamp = block_data.get('timestamp', int(time.time()))
+                    if await self.acquire_lease(db):
+                        await self.sync_once(db)
+                    else:
+                        # Re-read the checkpoint the leader advanced once we take over
+                        self.last_block = None
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    print(f"[BlockchainEvents] Error getting block timestamp: {e}")
-                    timestamp = int(time.time())
-                
-                # Store donation event in database
-                donations_col.update_one(
-                    {"transaction_hash": txHash},
-                    {"$set": {
-                        "donor_address": donor,
-                        "donation_id": donationId,
-                        "amount": amount,
-                        "purpose": purpose,
-                        "transaction_hash": txHash,
-                        "block_number": blockNumber,
-                        "timestamp": timestamp,
-                        "status": "confirmed"
-                    }},
-                    upsert=True
-                )
-                print(f"[BlockchainEvents] Synced donation: {donor} donated {amount} wei for {purpose}")
-                last_block = max(last_block, blockNumber)
-        except Exception as e:
-            print(f"[BlockchainEvents] Error: {e}")
-        time.sleep(10)  # Poll every 10 seconds
-
-def start_listener():
-    """Start the blockchain event listener in a background thread"""
-    if contract and w3 and w3.is_connected():
-        t = threading.Thread(target=listen_donation_events, daemon=True)
-        t.start()
-        print("[BlockchainEvents] ✅ Event listener started")
-    else:
-        print("[BlockchainEvents] ⚠️  Event listener not started - blockchain connection not available")
-        print("[BlockchainEvents] 💡 App will work without blockchain events (using API only)")
\ No newline at end of file
+                    self.errors += 1
+                    self.last_error = str(e)
+                    print(f"[BlockchainEvents] Error: {e}")
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            try:
+                await asyncio.shield(self.release_lease(db))
+            except Exception:
+                pass
+
+    def stats(self, window_seconds: float = 60) -> Dict[str, Any]:
+        """Return lag and throughput counters"""
+        cutoff = time.monotonic() - window_seconds
+        recent = [entry for entry in self._recent if entry[0] >= cutoff]
+        lag = None
+        if self.head_block is not None and self.last_block is not None:
+            lag = max(0, self.head_block - self.confirmations - self.last_block)
+        return {
+            "enabled": is_valid_config() and bool(_indexed_contracts) and INDEXER_ENABLED,
+            "leader": self.is_leader,
+            "owner": self.owner,
+            "contracts": _indexed_contracts or {},
+            "head_block": self.head_block,
+            "last_indexed_block": self.last_block,
+            "checkpoint_block": self.checkpoint_block,
+            "lag_blocks": lag,
+            "confirmations": self.confirmations,
+            "tracked_block_hashes": len(self.block_hashes),
+            "reorgs": self.reorgs,
+            "orphaned_events": self.orphaned_events,
+            "last_reorg": self.last_reorg,
+            "events_total": self.events_total,
+            "events_by_type": dict(self.events_by_type),
+            "blocks_total": self.blocks_total,
+            "ranges_total": self.ranges_total,
+            "events_per_second": round(sum(e[1] for e in recent) / window_seconds, 3),
+            "blocks_per_second": round(sum(e[2] for e in recent) / window_seconds, 3),
+            "last_range_ms": round(self.last_range_ms, 3),
+            "last_synced_at": self.last_synced_at,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "writer": self.writer.stats(),
+            "block_timestamps": block_timestamps.stats()
+        }
+
+
+# Global indexer instance
+event_indexer = EventIndexer(
+    chunk_blocks=INDEXER_CHUNK_BLOCKS,
+    poll_seconds=INDEXER_POLL_SECONDS,
+    start_block=INDEXER_START_BLOCK,
+    writer=BulkEventWriter(INDEXER_BATCH_SIZE, INDEXER_FLUSH_INTERVAL_SECONDS),
+    confirmations=INDEXER_CONFIRMATIONS,
+    reorg_window=INDEXER_REORG_WINDOW,
+    lease_seconds=INDEXER_LEASE_SECONDS
+)
+
+
+async def _start(db) -> None:
+    await init_blockchain()
+    if not INDEXER_ENABLED:
+        print("[BlockchainEvents] ⚠️  Event indexer disabled (INDEXER_ENABLED=False)")
+        return
+    if not indexed_contracts():
+        print("[BlockchainEvents] ⚠️  Event indexer not started - no valid contract address")
+        return
+    print("[BlockchainEvents] ✅ Event indexer started")
+    await event_indexer.run(db)
+
+
+def start_indexer(db) -> Optional["asyncio.Task[None]"]:
+    """Initialise the blockchain client and run the event indexer in the background.
+
+    Returns immediately; the RPC probe and the indexer run in the returned
+    task, which the caller cancels on shutdown.
+    """
+    if not is_valid_config():
+        print("[BlockchainEvents] ⚠️  Blockchain not configured - update ETHEREUM_RPC_URL and CONTRACT_ADDRESS in .env file")
+        print("[BlockchainEvents] 💡 App will work without blockchain events (using API only)")
+        return None
+    return asyncio.create_task(_start(db))
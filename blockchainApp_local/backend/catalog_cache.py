@@ -0,0 +1,170 @@
+"""
+Materialized course catalog cache holding pre-serialized JSON responses
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import OperationFailure
+
+from config import CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL_SECONDS
+
+
+class CatalogCache:
+    """Caches serialized catalog responses until the catalog changes.
+
+    Entries are keyed by endpoint and query parameters and hold the final
+    JSON bytes, so a hit costs neither a MongoDB round trip nor
+    serialization. Any write to the catalog calls ``invalidate``, which
+    bumps a generation counter; builds that started before the bump are
+    not stored. Concurrent misses for the same key share a single build.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, bytes]]" = OrderedDict()
+        self._building: Dict[Hashable, "asyncio.Future[bytes]"] = {}
+        # Course id -> (expiry, module count)
+        self._module_counts: Dict[str, Tuple[float, int]] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.rebuilds = 0
+        self.rebuild_seconds_total = 0.0
+        self.last_rebuild_ms = 0.0
+        self.last_invalidation_reason: Optional[str] = None
+
+    async def get_or_build(self, key: Hashable, builder: Callable[[], Awaitable[Any]]) -> bytes:
+        """Return cached JSON bytes for ``key``, building them on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        pending = self._building.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self._building[key] = future
+        generation = self.generation
+        started = time.perf_counter()
+        try:
+            data = await builder()
+            body = json.dumps(jsonable_encoder(data)).encode()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved so a future without waiters doesn't warn
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._building.pop(key, None)
+
+        elapsed = time.perf_counter() - started
+        self.rebuilds += 1
+        self.rebuild_seconds_total += elapsed
+        self.last_rebuild_ms = elapsed * 1000
+
+        if generation == self.generation and self.max_entries > 0:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        future.set_result(body)
+        return body
+
+    async def module_count(self, db, course_id: ObjectId) -> Optional[int]:
+        """Number of modules in a course (None if it doesn't exist).
+
+        Cached per course with the catalog TTL and dropped with the rest of
+        the catalog, so module completion never has to fetch module bodies
+        just to count them.
+        """
+        key = str(course_id)
+        entry = self._module_counts.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                return entry[1]
+            del self._module_counts[key]
+
+        generation = self.generation
+        result = await db.courses.aggregate([
+            {"$match": {"_id": course_id}},
+            {"$project": {"count": {"$size": {"$ifNull": ["$modules", []]}}}}
+        ]).to_list(1)
+        if not result:
+            return None
+        count = result[0]["count"]
+        if generation == self.generation and len(self._module_counts) < self.max_entries * 64:
+            self._module_counts[key] = (time.monotonic() + self.ttl_seconds, count)
+        return count
+
+    def invalidate(self, reason: str = "write") -> None:
+        """Drop every cached catalog response"""
+        self.generation += 1
+        self.invalidations += 1
+        self.last_invalidation_reason = reason
+        self._entries.clear()
+        self._module_counts.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "module_counts": len(self._module_counts),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "last_invalidation_reason": self.last_invalidation_reason,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 3),
+            "avg_rebuild_ms": round(self.rebuild_seconds_total * 1000 / self.rebuilds, 3) if self.rebuilds else 0.0
+        }
+
+
+async def watch_catalog_changes(db) -> None:
+    """Invalidate the catalog cache on any change to the courses collection.
+
+    Catches writes made outside the API (seeding and enhance_* scripts).
+    Change streams need a replica set; on a standalone server the watcher
+    logs a warning and exits, leaving the TTL as the safety net.
+    """
+    while True:
+        try:
+            async with db.courses.watch() as stream:
+                print("[CatalogCache] ✅ Watching courses change stream")
+                async for change in stream:
+                    catalog_cache.invalidate(f"change_stream:{change.get('operationType', 'unknown')}")
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            print(f"[CatalogCache] ⚠️  Change stream unavailable ({e}), relying on write-through invalidation")
+            return
+        except Exception as e:
+            print(f"[CatalogCache] Change stream error: {e}, reconnecting in 5s")
+            catalog_cache.invalidate("change_stream_reconnect")
+            await asyncio.sleep(5)
+
+
+# Global catalog cache instance
+catalog_cache = CatalogCache(
+    max_entries=CATALOG_CACHE_MAX_ENTRIES,
+    ttl_seconds=CATALOG_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: parallel module completions for one enrollment
+
+Seeds a scratch database (<DATABASE_NAME>_bench, dropped afterwards) with a
+course and a single enrollment, then fires every module completion (plus
+duplicates) at routes.courses.complete_module concurrently. With the old
+read-modify-write implementation most completions were lost; the atomic
+update must end with every module recorded exactly once and 100% progress.
+
+    python check_module_completion_race.py --modules 40 --repeat 3
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import MONGODB_URL, DATABASE_NAME
+from progress_bits import full_mask
+from routes.courses import complete_module
+
+STUDENT_ID = "race_student"
+
+
+async def run(db, module_count, repeat):
+    result = await db.courses.insert_one({
+        "title": "Race Course",
+        "is_published": True,
+        "modules": [
+            {"title": f"Module {m}", "order": m, "content": "x" * 2000, "duration_minutes": 10}
+            for m in range(module_count)
+        ]
+    })
+    course_id = str(result.inserted_id)
+    await db.enrollments.insert_one({
+        "student_id": STUDENT_ID,
+        "course_id": course_id,
+        "enrolled_at": datetime.utcnow(),
+        "status": "active",
+        "progress_percentage": 0.0,
+        "completed_modules": [],
+        "completed_mask": 0
+    })
+
+    request = SimpleNamespace(app=SimpleNamespace(mongodb=db))
+    user = {"_id": STUDENT_ID}
+    module_ids = [m for m in range(module_count) for _ in range(repeat)]
+    random.shuffle(module_ids)
+
+    responses = await asyncio.gather(*(
+        complete_module(course_id, module_id, request, user) for module_id in module_ids
+    ))
+    print(f"🚀 Fired {len(responses)} concurrent completions for {module_count} modules")
+
+    enrollment = await db.enrollments.find_one({"student_id": STUDENT_ID, "course_id": course_id})
+    completed = enrollment["completed_modules"]
+    ok = True
+    if sorted(completed) != list(range(module_count)):
+        missing = set(range(module_count)) - set(completed)
+        print(f"❌ completed_modules wrong: {len(completed)} entries, missing {sorted(missing)}")
+        ok = False
+    expected_mask = full_mask(module_count)
+    if enrollment.get("completed_mask") != expected_mask:
+        print(f"❌ completed_mask is {enrollment.get('completed_mask')}, expected {expected_mask}")
+        ok = False
+    if abs(enrollment["progress_percentage"] - 100.0) > 1e-9:
+        print(f"❌ progress_percentage is {enrollment['progress_percentage']}, expected 100")
+        ok = False
+    if max(r["progress_percentage"] for r in responses) > 100.0:
+        print("❌ a response reported progress above 100%")
+        ok = False
+    if ok:
+        print(f"✅ All {module_count} modules recorded once, progress 100%")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3, help="completions fired per module")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGODB_URL)
+    bench_db_name = f"{DATABASE_NAME}_bench"
+    db = client[bench_db_name]
+
+    print("=== MODULE COMPLETION RACE CHECK ===")
+    try:
+        await client.drop_database(bench_db_name)
+        ok = await run(db, args.modules, args.repeat)
+    finally:
+        await client.drop_database(bench_db_name)
+        client.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
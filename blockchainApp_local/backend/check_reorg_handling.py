@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Reorg check: the event indexer against a fake chain that reorganizes
+
+Runs blockchain_events.EventIndexer against an in-process fake JSON-RPC
+node (fake_chain.py) and a scratch database (<DATABASE_NAME>_bench,
+dropped afterwards), then replaces the chain tip with competing branches:
+
+  * a reorg shallower than the confirmation depth, which must never reach
+    MongoDB
+  * a reorg deeper than the confirmation depth, whose orphaned donations
+    and purchases must be rolled back and replaced by the new branch
+  * a reorg while the indexer is stopped, detected from the block hashes
+    saved with the checkpoint
+
+After every step the indexed donations and purchases must match the
+canonical chain up to head - confirmations exactly.
+
+    python check_reorg_handling.py --confirmations 6 --blocks 80
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from contract_events import TOPIC_ABIS
+from fake_chain import FAKE_CONTRACT_ADDRESS, FakeChain, serve
+
+BUYER = "0x" + "b1" * 20
+
+
+def canonical(chain, event_name, up_to):
+    """(transaction_hash, log_index) of ``event_name`` logs in blocks 1..up_to"""
+    logs = set()
+    for block in chain.blocks[1:up_to + 1]:
+        for log in block["logs"]:
+            if TOPIC_ABIS[log["topics"][0]]["name"] == event_name:
+                logs.add((log["transactionHash"], int(log["logIndex"], 16)))
+    return logs
+
+
+async def indexed(collection):
+    cursor = collection.find({"log_index": {"$exists": True}}, {"transaction_hash": 1, "log_index": 1})
+    return [(doc["transaction_hash"], doc["log_index"]) async for doc in cursor]
+
+
+async def verify(label, db, chain, indexer, expected_reorgs):
+    safe_head = chain.head - indexer.confirmations
+    ok = True
+    for event_name, collection in (("DonationReceived", db.donations), ("CoursePurchased", db.purchases)):
+        expected = canonical(chain, event_name, safe_head)
+        actual = await indexed(collection)
+        if len(actual) != len(set(actual)):
+            print(f"   ❌ {collection.name}: duplicate documents")
+            ok = False
+        if set(actual) != expected:
+            print(f"   ❌ {collection.name}: {len(set(actual) - expected)} orphaned, "
+                  f"{len(expected - set(actual))} missing")
+            ok = False
+    if indexer.last_block != safe_head:
+        print(f"   ❌ indexed up to block {indexer.last_block}, expected {safe_head}")
+        ok = False
+    if indexer.reorgs != expected_reorgs:
+        print(f"   ❌ {indexer.reorgs} reorgs handled, expected {expected_reorgs}")
+        ok = False
+    donations = len(canonical(chain, "DonationReceived", safe_head))
+    print(f"{'✅' if ok else '❌'} {label}: head {chain.head}, indexed to {indexer.last_block}, "
+          f"{donations} donations, {indexer.reorgs} reorgs, {indexer.orphaned_events} orphaned events rolled back")
+    return ok
+
+
+async def run(db, chain, EventIndexer, args):
+    def new_indexer():
+        return EventIndexer(name="reorg_check", chunk_blocks=20, start_block=1,
+                            confirmations=args.confirmations, reorg_window=args.window)
+
+    chain.mine(args.blocks - 20, args.events_per_block)
+    chain.emit("CoursePurchased", buyer=BUYER, courseId=7, amount=10**16)
+    chain.mine(20, args.events_per_block)
+
+    # A donation recorded through the API, confirmed by a log near the tip
+    api_block = chain.blocks[chain.head - args.confirmations - 2]
+    api_tx = api_block["logs"][0]["transactionHash"]
+    await db.donations.insert_one({
+        "donor_id": "reorg_donor", "amount_eth": 0.001, "transaction_hash": api_tx,
+        "purpose": "api", "status": "pending", "created_at": datetime.utcnow(), "confirmed_at": None
+    })
+
+    indexer = new_indexer()
+    await indexer.sync_once(db)
+    ok = await verify("Initial sync", db, chain, indexer, 0)
+    api_doc = await db.donations.find_one({"donor_id": "reorg_donor"})
+    if api_doc.get("status") != "confirmed" or api_doc.get("block_number") != api_block["number"]:
+        print("   ❌ API donation was not merged with its log")
+        ok = False
+
+    chain.reorg(args.confirmations - 2, events_per_block=args.events_per_block)
+    await indexer.sync_once(db)
+    ok &= await verify(f"Reorg of {args.confirmations - 2} blocks (inside confirmation depth)", db, chain, indexer, 0)
+
+    depth = 25
+    chain.reorg(depth, events_per_block=args.events_per_block)
+    await indexer.sync_once(db)
+    ok &= await verify(f"Reorg of {depth} blocks (below confirmation depth)", db, chain, indexer, 1)
+    api_doc = await db.donations.find_one({"donor_id": "reorg_donor"})
+    if api_doc.get("status") != "pending" or "block_number" in api_doc:
+        print("   ❌ orphaned API donation was not reverted to pending")
+        ok = False
+    if await db.purchases.count_documents({"buyer": BUYER}):
+        print("   ❌ orphaned purchase still recorded")
+        ok = False
+
+    chain.mine(10, args.events_per_block)
+    await indexer.sync_once(db)
+    chain.reorg(15, events_per_block=args.events_per_block)
+    restarted = new_indexer()
+    await restarted.sync_once(db)
+    ok &= await verify("Reorg of 15 blocks while stopped (after restart)", db, chain, restarted, 1)
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--confirmations", type=int, default=6)
+    parser.add_argument("--window", type=int, default=64, help="reorg window in blocks")
+    parser.add_argument("--blocks", type=int, default=80)
+    parser.add_argument("--events-per-block", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8596)
+    args = parser.parse_args()
+
+    # Point the indexer module at the fake node before it reads its config
+    os.environ["ETHEREUM_RPC_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["CONTRACT_ADDRESS"] = FAKE_CONTRACT_ADDRESS
+    from config import MONGODB_URL, DATABASE_NAME
+    from blockchain_events import EventIndexer, close_rpc_session, get_rpc_session
+
+    chain = FakeChain()
+    runner = await serve(chain, port=args.port)
+    client = AsyncIOMotorClient(MONGODB_URL)
+    bench_db_name = f"{DATABASE_NAME}_bench"
+    db = client[bench_db_name]
+
+    print("=== EVENT INDEXER REORG CHECK ===")
+    ok = False
+    try:
+        await client.drop_database(bench_db_name)
+        await get_rpc_session()
+        ok = await run(db, chain, EventIndexer, args)
+    finally:
+        await client.drop_database(bench_db_name)
+        client.close()
+        await close_rpc_session()
+        await runner.cleanup()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
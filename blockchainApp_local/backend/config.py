@@ -9,6 +9,8 @@ load_dotenv()
 
 # Database Configuration
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+# Bounds how long startup (migrations) and requests wait for an unreachable MongoDB
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
 DATABASE_NAME = os.getenv("DATABASE_NAME", "edtech_hardware")
 
 # JWT Configuration
@@ -16,9 +18,77 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-this-in-produ
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Principal Cache Configuration (0 disables the cache)
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+# Password Hashing Configuration
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Image Processing Configuration (PIL worker processes)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_MAX_PENDING = int(os.getenv("IMAGE_MAX_PENDING", "32"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+MEDIA_OBJECTS_DIR = os.getenv("MEDIA_OBJECTS_DIR", "uploads/objects")
+# Responsive renditions: widths and formats; generated in the background for each
+# stored image if RENDITIONS_EAGER, otherwise on first request via the transform cache
+RENDITIONS_EAGER = os.getenv("RENDITIONS_EAGER", "False").lower() == "true"
+RENDITION_WIDTHS = [int(w) for w in os.getenv("RENDITION_WIDTHS", "320,640,1024,1600").split(",") if w.strip()]
+RENDITION_FORMATS = [f.strip().lower() for f in os.getenv("RENDITION_FORMATS", "avif,webp,jpeg").split(",") if f.strip()]
+MEDIA_TRANSFORM_CACHE_DIR = os.getenv("MEDIA_TRANSFORM_CACHE_DIR", "uploads/cache")
+MEDIA_TRANSFORM_CACHE_MAX_MB = int(os.getenv("MEDIA_TRANSFORM_CACHE_MAX_MB", "512"))
+
+# Rate Limiting Configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# memory (per process), shared_memory (all workers on one host) or mongo (all nodes)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SHM_PATH = os.getenv("RATE_LIMIT_SHM_PATH", "")
+RATE_LIMIT_SHM_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+
+# Catalog Cache Configuration
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "256"))
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+# Requires a replica set; lets offline scripts invalidate the cache too
+CATALOG_CHANGE_STREAM = os.getenv("CATALOG_CHANGE_STREAM", "False").lower() == "true"
+
 # Blockchain Configuration
 ETHEREUM_RPC_URL = os.getenv("ETHEREUM_RPC_URL", "https://sepolia.infura.io/v3/your-infura-project-id")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY", "your-private-key-for-deployment")
+CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS")
+HARDWARE_COURSES_ADDRESS = os.getenv("HARDWARE_COURSES_ADDRESS")
+ETHEREUM_RPC_TIMEOUT_SECONDS = float(os.getenv("ETHEREUM_RPC_TIMEOUT_SECONDS", "10"))
+# Startup RPC probe; runs in the background and never delays startup
+ETHEREUM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("ETHEREUM_CONNECT_TIMEOUT_SECONDS", "5"))
+ETHEREUM_RPC_POOL_SIZE = int(os.getenv("ETHEREUM_RPC_POOL_SIZE", "10"))
+# Max calls per JSON-RPC batch request (providers cap this, often at 100-1000)
+ETHEREUM_RPC_BATCH_SIZE = int(os.getenv("ETHEREUM_RPC_BATCH_SIZE", "100"))
+# Multicall3 is deployed at the same address on mainnet, Sepolia and most L2s
+MULTICALL3_ADDRESS = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+
+# On-chain purchase verification cache (positives outlive negatives; a deep
+# reorg can still undo a purchase)
+PURCHASE_CACHE_MAX_ENTRIES = int(os.getenv("PURCHASE_CACHE_MAX_ENTRIES", "100000"))
+PURCHASE_POSITIVE_TTL_SECONDS = int(os.getenv("PURCHASE_POSITIVE_TTL_SECONDS", "3600"))
+PURCHASE_NEGATIVE_TTL_SECONDS = int(os.getenv("PURCHASE_NEGATIVE_TTL_SECONDS", "30"))
+
+# Event Indexer Configuration
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "True").lower() == "true"
+INDEXER_CHUNK_BLOCKS = int(os.getenv("INDEXER_CHUNK_BLOCKS", "2000"))
+INDEXER_POLL_SECONDS = float(os.getenv("INDEXER_POLL_SECONDS", "10"))
+# Synced events are written with bulk_write once either limit is reached
+INDEXER_BATCH_SIZE = int(os.getenv("INDEXER_BATCH_SIZE", "500"))
+INDEXER_FLUSH_INTERVAL_SECONDS = float(os.getenv("INDEXER_FLUSH_INTERVAL_SECONDS", "2"))
+BLOCK_TIMESTAMP_CACHE_SIZE = int(os.getenv("BLOCK_TIMESTAMP_CACHE_SIZE", "10000"))
+# Only blocks this deep below the head are indexed, so shallow reorgs never reach MongoDB
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "12"))
+# Recent block hashes re-checked every pass to detect deeper reorgs
+INDEXER_REORG_WINDOW = int(os.getenv("INDEXER_REORG_WINDOW", "128"))
+# First block to index when no checkpoint exists (empty: start at the current head)
+INDEXER_START_BLOCK = int(os.getenv("INDEXER_START_BLOCK")) if os.getenv("INDEXER_START_BLOCK") else None
+# Only the worker holding the lease indexes; others take over once it lapses
+INDEXER_LEASE_SECONDS = int(os.getenv("INDEXER_LEASE_SECONDS", "60"))
 
 # IPFS Configuration
 IPFS_API_URL = os.getenv("IPFS_API_URL", "http://localhost:5001")
@@ -0,0 +1,239 @@
+"""
+Inline event ABIs, log decoding and MongoDB routing for indexed contract events
+
+Covers the EdTechDonation and HardwareCourses events the platform reads
+back: donations, school registration/verification, fund allocations and
+withdrawals, and course purchases. Every event maps to one idempotent
+UpdateOne upsert on its collection, so re-indexing a range is harmless.
+``rollback_events`` undoes everything written from a given block on, for
+blocks orphaned by a chain reorg.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson.decimal128 import Decimal128
+from eth_utils import event_abi_to_log_topic
+from pymongo import UpdateOne
+from web3 import Web3
+from web3._utils.events import get_event_data
+
+INT64_MAX = 2 ** 63 - 1
+
+
+def _event(name: str, *inputs: Tuple[str, str, bool]) -> Dict[str, Any]:
+    """Build an event ABI from (type, name, indexed) triples"""
+    return {
+        "anonymous": False,
+        "type": "event",
+        "name": name,
+        "inputs": [{"type": t, "name": n, "indexed": indexed} for t, n, indexed in inputs]
+    }
+
+
+EVENT_ABIS: List[Dict[str, Any]] = [
+    _event("DonationReceived", ("uint256", "donationId", True), ("address", "donor", True),
+           ("uint256", "amount", False), ("string", "purpose", False)),
+    _event("SchoolRegistered", ("uint256", "schoolId", True), ("address", "schoolWallet", True),
+           ("string", "name", False)),
+    _event("SchoolVerified", ("uint256", "schoolId", True), ("address", "verifier", True)),
+    _event("FundsAllocated", ("uint256", "allocationId", True), ("uint256", "schoolId", True),
+           ("uint256", "amount", False), ("string", "purpose", False)),
+    _event("FundsWithdrawn", ("uint256", "schoolId", True), ("uint256", "amount", False),
+           ("address", "recipient", True)),
+    # Same signature on EdTechDonation (amount) and HardwareCourses (price)
+    _event("CoursePurchased", ("address", "buyer", True), ("uint256", "courseId", True),
+           ("uint256", "amount", False)),
+]
+
+TOPIC_ABIS: Dict[str, Dict[str, Any]] = {Web3.to_hex(event_abi_to_log_topic(abi)): abi for abi in EVENT_ABIS}
+
+# topic0 filter for eth_getLogs: any of the indexed events
+EVENT_TOPICS: List[str] = list(TOPIC_ABIS)
+
+
+def wei(value: int) -> Any:
+    """Store wei amounts as int64 when they fit, Decimal128 otherwise"""
+    return value if value <= INT64_MAX else Decimal128(str(value))
+
+
+def decode_log(codec, log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Decode a raw log with the inline ABIs (None for unknown events)"""
+    if not log.get("topics"):
+        return None
+    abi = TOPIC_ABIS.get(Web3.to_hex(log["topics"][0]))
+    if abi is None:
+        return None
+    return get_event_data(codec, abi, log)
+
+
+def _log_fields(decoded: Dict[str, Any], timestamp: int, contract_name: str) -> Dict[str, Any]:
+    return {
+        "transaction_hash": Web3.to_hex(decoded["transactionHash"]),
+        "log_index": decoded["logIndex"],
+        "block_number": decoded["blockNumber"],
+        "block_hash": Web3.to_hex(decoded["blockHash"]),
+        "timestamp": timestamp,
+        "contract": contract_name
+    }
+
+
+def donation_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """DonationReceived, keyed on (transaction_hash, log_index).
+
+    A record created through the API for the same transaction has no
+    log_index yet; the first log of that transaction is merged into it.
+    """
+    args = decoded["args"]
+    fields = _log_fields(decoded, timestamp, contract_name)
+    fields.update({
+        "donor_address": args["donor"],
+        "donation_id": int(args["donationId"]),
+        "amount": wei(args["amount"]),
+        "purpose": args["purpose"],
+        "status": "confirmed"
+    })
+    return "donations", UpdateOne(
+        {"transaction_hash": fields["transaction_hash"], "log_index": {"$in": [fields["log_index"], None]}},
+        {"$set": fields},
+        upsert=True
+    )
+
+
+def school_registered_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """SchoolRegistered, keyed on the on-chain school id"""
+    args = decoded["args"]
+    return "chain_schools", UpdateOne(
+        {"school_id": int(args["schoolId"])},
+        {
+            "$set": {
+                "school_id": int(args["schoolId"]),
+                "wallet_address": args["schoolWallet"].lower(),
+                "name": args["name"],
+                "registered_tx": Web3.to_hex(decoded["transactionHash"]),
+                "registered_block": decoded["blockNumber"],
+                "registered_at": timestamp,
+                "contract": contract_name
+            },
+            # SchoolVerified may be applied first within an unordered batch
+            "$setOnInsert": {"verified": False}
+        },
+        upsert=True
+    )
+
+
+def school_verified_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """SchoolVerified, keyed on the on-chain school id"""
+    args = decoded["args"]
+    return "chain_schools", UpdateOne(
+        {"school_id": int(args["schoolId"])},
+        {"$set": {
+            "school_id": int(args["schoolId"]),
+            "verified": True,
+            "verified_by": args["verifier"].lower(),
+            "verified_block": decoded["blockNumber"],
+            "verified_at": timestamp
+        }},
+        upsert=True
+    )
+
+
+def allocation_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """FundsAllocated, keyed on the on-chain allocation id"""
+    args = decoded["args"]
+    fields = _log_fields(decoded, timestamp, contract_name)
+    fields.update({
+        "allocation_id": int(args["allocationId"]),
+        "school_id": int(args["schoolId"]),
+        "amount": wei(args["amount"]),
+        "purpose": args["purpose"]
+    })
+    return "allocations", UpdateOne({"allocation_id": fields["allocation_id"]}, {"$set": fields}, upsert=True)
+
+
+def withdrawal_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """FundsWithdrawn, keyed on (transaction_hash, log_index)"""
+    args = decoded["args"]
+    fields = _log_fields(decoded, timestamp, contract_name)
+    fields.update({
+        "school_id": int(args["schoolId"]),
+        "amount": wei(args["amount"]),
+        "recipient": args["recipient"].lower()
+    })
+    return "withdrawals", UpdateOne(
+        {"transaction_hash": fields["transaction_hash"], "log_index": fields["log_index"]},
+        {"$set": fields},
+        upsert=True
+    )
+
+
+def purchase_upsert(decoded, timestamp, contract_name) -> Tuple[str, UpdateOne]:
+    """CoursePurchased, keyed on (contract, transaction_hash, log_index).
+
+    buyer is lowercased and courseId stored as an int to match
+    routes.courses.has_purchased_course.
+    """
+    args = decoded["args"]
+    fields = _log_fields(decoded, timestamp, contract_name)
+    fields.update({
+        "buyer": args["buyer"].lower(),
+        "courseId": int(args["courseId"]),
+        "amount": wei(args["amount"])
+    })
+    return "purchases", UpdateOne(
+        {"contract": contract_name, "transaction_hash": fields["transaction_hash"], "log_index": fields["log_index"]},
+        {"$set": fields},
+        upsert=True
+    )
+
+
+EVENT_HANDLERS: Dict[str, Callable[[Dict[str, Any], int, str], Tuple[str, UpdateOne]]] = {
+    "DonationReceived": donation_upsert,
+    "SchoolRegistered": school_registered_upsert,
+    "SchoolVerified": school_verified_upsert,
+    "FundsAllocated": allocation_upsert,
+    "FundsWithdrawn": withdrawal_upsert,
+    "CoursePurchased": purchase_upsert,
+}
+
+
+def route_event(decoded: Dict[str, Any], timestamp: int, contract_name: str) -> Tuple[str, UpdateOne]:
+    """Collection name and upsert for a decoded event"""
+    return EVENT_HANDLERS[decoded["event"]](decoded, timestamp, contract_name)
+
+
+# Fields the indexer adds when it merges a log into an API-created donation
+DONATION_CHAIN_FIELDS = [
+    "log_index", "block_number", "block_hash", "timestamp", "contract", "donor_address", "donation_id", "amount"
+]
+
+
+async def rollback_events(db, from_block: int) -> Dict[str, int]:
+    """Undo indexed events in blocks >= ``from_block``; return counts per collection.
+
+    Donations recorded through the API keep their document and go back to
+    pending; everything else created by the indexer is deleted, and school
+    verifications from orphaned blocks are withdrawn.
+    """
+    orphaned = {"block_number": {"$gte": from_block}}
+    removed: Dict[str, int] = {}
+
+    reverted = await db.donations.update_many(
+        {**orphaned, "donor_id": {"$exists": True}},
+        {"$set": {"status": "pending"}, "$unset": {field: "" for field in DONATION_CHAIN_FIELDS}}
+    )
+    deleted = await db.donations.delete_many({**orphaned, "donor_id": {"$exists": False}})
+    removed["donations"] = reverted.modified_count + deleted.deleted_count
+
+    for collection_name in ("allocations", "withdrawals", "purchases"):
+        removed[collection_name] = (await db[collection_name].delete_many(orphaned)).deleted_count
+
+    registered = await db.chain_schools.delete_many({"registered_block": {"$gte": from_block}})
+    # Verified before (or without) a surviving registration: nothing left to keep
+    stubs = await db.chain_schools.delete_many({
+        "registered_block": {"$exists": False}, "verified_block": {"$gte": from_block}
+    })
+    unverified = await db.chain_schools.update_many(
+        {"verified_block": {"$gte": from_block}},
+        {"$set": {"verified": False}, "$unset": {"verified_by": "", "verified_block": "", "verified_at": ""}}
+    )
+    removed["chain_schools"] = registered.deleted_count + stubs.deleted_count + unverified.modified_count
+    return removed
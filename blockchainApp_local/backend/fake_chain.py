@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+In-process fake Ethereum JSON-RPC node for indexer benchmarks and harnesses
+
+Serves the handful of methods the event indexer uses (eth_chainId,
+eth_blockNumber, eth_getBlockByNumber, eth_getLogs), plus eth_call for
+``hasPurchased`` and an optional Multicall3 ``aggregate3``, including
+JSON-RPC batch requests, and counts HTTP requests and calls per method. Blocks
+and logs are generated in memory; no real node or contract is involved.
+Besides generated donations, any event in contract_events.EVENT_ABIS can
+be emitted into the next mined block with ``FakeChain.emit``, and
+``FakeChain.reorg`` replaces the tip with a competing branch.
+
+    python fake_chain.py --blocks 1000 --events-per-block 5 --port 8545
+"""
+
+import argparse
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from eth_abi import decode, encode
+from eth_utils import event_abi_to_log_topic, function_signature_to_4byte_selector, keccak
+
+from contract_events import EVENT_ABIS
+
+FAKE_CONTRACT_ADDRESS = "0x" + "5e" * 20
+FAKE_MULTICALL_ADDRESS = "0x" + "ca" * 20
+HAS_PURCHASED_SELECTOR = function_signature_to_4byte_selector("hasPurchased(uint256,address)")
+AGGREGATE3_SELECTOR = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+DONATION_RECEIVED_TOPIC = "0x" + keccak(text="DonationReceived(uint256,address,uint256,string)").hex()
+GENESIS_TIMESTAMP = 1_700_000_000
+BLOCK_TIME_SECONDS = 12
+
+
+def _hex32(value: int) -> str:
+    return "0x" + format(value, "064x")
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + "0" * 24 + address[2:].lower()
+
+
+class FakeChain:
+    """A linear chain of blocks, each carrying generated DonationReceived logs"""
+
+    def __init__(self, address: str = FAKE_CONTRACT_ADDRESS, max_logs_per_query: Optional[int] = None,
+                 multicall_address: Optional[str] = FAKE_MULTICALL_ADDRESS):
+        self.address = address.lower()
+        self.max_logs_per_query = max_logs_per_query
+        # None: no Multicall3 on this chain (eth_call returns empty data)
+        self.multicall_address = multicall_address.lower() if multicall_address else None
+        # (buyer, course id) pairs answered true by hasPurchased
+        self.purchases = set()
+        self.blocks: List[Dict[str, Any]] = []
+        self.donation_count = 0
+        self.fork = 0
+        self._pending_logs: List[Dict[str, Any]] = []
+        self.http_requests = 0
+        self.calls: Dict[str, int] = {}
+        self.mine(1)  # genesis
+
+    @property
+    def head(self) -> int:
+        return len(self.blocks) - 1
+
+    def _block_hash(self, number: int) -> str:
+        digest = hashlib.sha256(f"{self.fork}:{number}".encode()).hexdigest()
+        return "0x" + digest
+
+    def donation_log(self, block_number: int, block_hash: str, index: int) -> Dict[str, Any]:
+        """A DonationReceived log with deterministic donor, amount and purpose"""
+        self.donation_count += 1
+        donation_id = self.donation_count
+        donor = "0x" + format(donation_id % 50 + 1, "040x")
+        tx_hash = "0x" + hashlib.sha256(f"tx:{self.fork}:{block_number}:{index}".encode()).hexdigest()
+        return {
+            "address": self.address,
+            "blockNumber": hex(block_number),
+            "blockHash": block_hash,
+            "transactionHash": tx_hash,
+            "transactionIndex": hex(index),
+            "logIndex": hex(index),
+            "removed": False,
+            "topics": [DONATION_RECEIVED_TOPIC, _hex32(donation_id), _address_topic(donor)],
+            "data": "0x" + encode(["uint256", "string"], [donation_id * 10**15, "school supplies"]).hex()
+        }
+
+    def emit(self, event_name: str, address: Optional[str] = None, **args: Any) -> None:
+        """Queue an event log for the next mined block"""
+        abi = next(abi for abi in EVENT_ABIS if abi["name"] == event_name)
+        if event_name == "CoursePurchased":
+            self.purchases.add((args["buyer"].lower(), args["courseId"]))
+        topics = ["0x" + event_abi_to_log_topic(abi).hex()]
+        data_types, data_values = [], []
+        for item in abi["inputs"]:
+            if item["indexed"]:
+                topics.append("0x" + encode([item["type"]], [args[item["name"]]]).hex())
+            else:
+                data_types.append(item["type"])
+                data_values.append(args[item["name"]])
+        self._pending_logs.append({
+            "address": (address or self.address).lower(),
+            "topics": topics,
+            "data": "0x" + encode(data_types, data_values).hex()
+        })
+
+    def mine(self, count: int = 1, events_per_block: int = 0) -> None:
+        """Append ``count`` blocks with ``events_per_block`` donations each"""
+        for _ in range(count):
+            number = len(self.blocks)
+            block_hash = self._block_hash(number)
+            logs = [self.donation_log(number, block_hash, i) for i in range(events_per_block)]
+            for pending in self._pending_logs:
+                index = len(logs)
+                tx_hash = "0x" + hashlib.sha256(f"tx:{self.fork}:{number}:{index}".encode()).hexdigest()
+                logs.append(dict(pending, **{
+                    "blockNumber": hex(number),
+                    "blockHash": block_hash,
+                    "transactionHash": tx_hash,
+                    "transactionIndex": hex(index),
+                    "logIndex": hex(index),
+                    "removed": False
+                }))
+            self._pending_logs = []
+            self.blocks.append({
+                "number": number,
+                "hash": block_hash,
+                "parentHash": self.blocks[-1]["hash"] if self.blocks else _hex32(0),
+                "timestamp": GENESIS_TIMESTAMP + number * BLOCK_TIME_SECONDS,
+                "logs": logs
+            })
+
+    def reorg(self, depth: int, length: Optional[int] = None, events_per_block: int = 0) -> None:
+        """Replace the last ``depth`` blocks with a competing branch.
+
+        The branch has ``length`` blocks (default ``depth + 1``, so the head
+        moves forward like a real reorg); its block and transaction hashes
+        differ from the orphaned ones. Logs queued with ``emit`` land in
+        the first block of the branch.
+        """
+        depth = min(depth, self.head)
+        self.fork += 1
+        del self.blocks[len(self.blocks) - depth:]
+        self.mine(length if length is not None else depth + 1, events_per_block)
+
+    def _block_number(self, tag: Any) -> int:
+        if tag in ("latest", "safe", "finalized", "pending"):
+            return self.head
+        if tag == "earliest":
+            return 0
+        return int(tag, 16) if isinstance(tag, str) else int(tag)
+
+    def _block_json(self, block: Dict[str, Any]) -> Dict[str, Any]:
+        zero32 = _hex32(0)
+        return {
+            "number": hex(block["number"]),
+            "hash": block["hash"],
+            "parentHash": block["parentHash"],
+            "timestamp": hex(block["timestamp"]),
+            "nonce": "0x0000000000000000",
+            "sha3Uncles": zero32,
+            "logsBloom": "0x" + "00" * 256,
+            "transactionsRoot": zero32,
+            "stateRoot": zero32,
+            "receiptsRoot": zero32,
+            "miner": "0x" + "00" * 20,
+            "difficulty": "0x0",
+            "totalDifficulty": "0x0",
+            "extraData": "0x",
+            "size": "0x0",
+            "gasLimit": "0x1c9c380",
+            "gasUsed": "0x0",
+            "mixHash": zero32,
+            "transactions": [],
+            "uncles": []
+        }
+
+    def get_logs(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from_block = self._block_number(params.get("fromBlock", "latest"))
+        to_block = min(self._block_number(params.get("toBlock", "latest")), self.head)
+        addresses = params.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {a.lower() for a in addresses} if addresses else None
+        topic0 = (params.get("topics") or [None])[0]
+        topic0 = {topic0} if isinstance(topic0, str) else (set(topic0) if topic0 else None)
+
+        logs = []
+        for block in self.blocks[from_block:to_block + 1]:
+            for log in block["logs"]:
+                if addresses and log["address"] not in addresses:
+                    continue
+                if topic0 and log["topics"][0] not in topic0:
+                    continue
+                logs.append(log)
+                if self.max_logs_per_query and len(logs) > self.max_logs_per_query:
+                    raise ValueError(f"query returned more than {self.max_logs_per_query} results")
+        return logs
+
+    def _call(self, to: str, data: bytes) -> bytes:
+        if to == self.address and data[:4] == HAS_PURCHASED_SELECTOR:
+            course_id, user = decode(["uint256", "address"], data[4:])
+            return encode(["bool"], [(user.lower(), course_id) in self.purchases])
+        if to == self.multicall_address and data[:4] == AGGREGATE3_SELECTOR:
+            (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+            results = []
+            for target, _allow_failure, call_data in calls:
+                result = self._call(target.lower(), call_data)
+                results.append((bool(result), result))
+            return encode(["(bool,bytes)[]"], [results])
+        return b""
+
+    def eth_call(self, tx: Dict[str, Any]) -> str:
+        data = bytes.fromhex(tx.get("data", tx.get("input", "0x"))[2:])
+        return "0x" + self._call(tx["to"].lower(), data).hex()
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one JSON-RPC request object"""
+        method = request.get("method")
+        params = request.get("params") or []
+        self.calls[method] = self.calls.get(method, 0) + 1
+        response: Dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            if method == "eth_chainId":
+                response["result"] = hex(1337)
+            elif method == "eth_blockNumber":
+                response["result"] = hex(self.head)
+            elif method == "eth_getBlockByNumber":
+                number = self._block_number(params[0])
+                response["result"] = self._block_json(self.blocks[number]) if number <= self.head else None
+            elif method == "eth_getLogs":
+                response["result"] = self.get_logs(params[0])
+            elif method == "eth_call":
+                response["result"] = self.eth_call(params[0])
+            else:
+                response["error"] = {"code": -32601, "message": f"Method {method} not supported"}
+        except ValueError as e:
+            response["error"] = {"code": -32005, "message": str(e)}
+        return response
+
+    def reset_counters(self) -> None:
+        self.http_requests = 0
+        self.calls = {}
+
+
+async def serve(chain: FakeChain, host: str = "127.0.0.1", port: int = 8545) -> web.AppRunner:
+    """Start an aiohttp JSON-RPC server for ``chain``; call ``cleanup()`` to stop"""
+    async def handler(request: web.Request) -> web.Response:
+        chain.http_requests += 1
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([chain.handle(item) for item in body])
+        return web.json_response(chain.handle(body))
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=1000)
+    parser.add_argument("--events-per-block", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8545)
+    args = parser.parse_args()
+
+    chain = FakeChain()
+    chain.mine(args.blocks, args.events_per_block)
+    await serve(chain, port=args.port)
+    print(f"⛓️  Fake chain with {chain.head} blocks at http://127.0.0.1:{args.port} (contract {chain.address})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
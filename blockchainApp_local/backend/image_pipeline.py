@@ -0,0 +1,237 @@
+"""
+Process pool for PIL image optimisation and thumbnailing
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from PIL import Image, features
+
+from config import IMAGE_WORKERS, IMAGE_MAX_PENDING
+
+THUMBNAIL_SIZE = (300, 200)
+MAX_IMAGE_DIMENSION = 2048
+
+# Rendition formats: PIL format name, file extension, MIME type and encoder options
+RENDITION_ENCODINGS: Dict[str, Dict[str, Any]] = {
+    "avif": {"pil_format": "AVIF", "extension": "avif", "mime_type": "image/avif", "options": {"quality": 60, "speed": 8}},
+    "webp": {"pil_format": "WEBP", "extension": "webp", "mime_type": "image/webp", "options": {"quality": 80, "method": 4}},
+    "jpeg": {"pil_format": "JPEG", "extension": "jpg", "mime_type": "image/jpeg", "options": {"quality": 85, "optimize": True}},
+}
+
+
+def supported_rendition_formats(formats: Iterable[str]) -> List[str]:
+    """The requested formats this PIL build can encode, in the given order"""
+    return [f for f in formats if f in RENDITION_ENCODINGS and (f == "jpeg" or features.check(f))]
+
+
+def create_thumbnail(image_path: Path, thumbnail_path: Path,
+                     size: Tuple[int, int] = THUMBNAIL_SIZE, fmt: str = "jpeg") -> Tuple[int, int]:
+    """Create a thumbnail fitting within ``size`` (never upscaled); return its dimensions"""
+    try:
+        with Image.open(image_path) as img:
+            # Convert to RGB if necessary (for PNG with transparency)
+            if img.mode in ("RGBA", "P"):
+                img = img.convert("RGB")
+
+            # Create thumbnail
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+            encoding = RENDITION_ENCODINGS[fmt]
+            img.save(thumbnail_path, encoding["pil_format"], **encoding["options"])
+            return img.size
+    except Exception as e:
+        raise RuntimeError(f"Error creating thumbnail: {str(e)}")
+
+
+def optimize_image(image_path: Path) -> Tuple[str, int]:
+    """Optimize image size and quality in place; return SHA-256 and size of the result"""
+    try:
+        with Image.open(image_path) as img:
+            # Convert to RGB if necessary
+            if img.mode in ("RGBA", "P"):
+                img = img.convert("RGB")
+
+            # Resize if too large
+            if img.width > MAX_IMAGE_DIMENSION or img.height > MAX_IMAGE_DIMENSION:
+                img.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.Resampling.LANCZOS)
+
+            # Encode in memory so the result is hashed without reading it back
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", quality=85, optimize=True)
+
+        data = buffer.getvalue()
+        image_path.write_bytes(data)
+        return hashlib.sha256(data).hexdigest(), len(data)
+    except Exception as e:
+        raise RuntimeError(f"Error optimizing image: {str(e)}")
+
+
+def optimize_with_thumbnail(image_path: Path, thumbnail_path: Path) -> Tuple[str, int]:
+    """Both upload steps in one job, so the image is shipped to a worker once"""
+    result = optimize_image(image_path)
+    create_thumbnail(image_path, thumbnail_path)
+    return result
+
+
+def create_renditions(image_path: Path, stem: str, widths: List[int], formats: List[str]) -> List[Dict[str, Any]]:
+    """Encode an optimized image at each width in each format, next to it.
+
+    Widths are never upscaled; the image's own width is always included,
+    and its JPEG rendition is the image itself. Returns manifest entries.
+    """
+    try:
+        with Image.open(image_path) as img:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            targets = sorted({w for w in widths if w < img.width} | {img.width})
+
+            entries = []
+            for width in targets:
+                if width == img.width:
+                    resized = img
+                else:
+                    height = max(1, round(img.height * width / img.width))
+                    resized = img.resize((width, height), Image.Resampling.LANCZOS)
+
+                for fmt in formats:
+                    encoding = RENDITION_ENCODINGS[fmt]
+                    if fmt == "jpeg" and width == img.width:
+                        path = image_path
+                    else:
+                        path = image_path.with_name(f"{stem}_w{width}.{encoding['extension']}")
+                        partial = path.with_name(path.name + ".part")
+                        resized.save(partial, encoding["pil_format"], **encoding["options"])
+                        os.replace(partial, path)
+                    entries.append({
+                        "width": width,
+                        "height": resized.height,
+                        "format": fmt,
+                        "file": path.name,
+                        "size": path.stat().st_size
+                    })
+            return entries
+    except Exception as e:
+        raise RuntimeError(f"Error creating renditions: {str(e)}")
+
+
+class ImagePipeline:
+    """Runs PIL work in worker processes with a queue-depth limit.
+
+    Resizing and JPEG encoding hold the GIL for most of their runtime, so
+    a thread pool would still stall the event loop; worker processes do
+    not. At most ``workers`` images are processed at once; once
+    ``max_pending`` jobs are queued or running, new uploads are rejected
+    with 503 instead of piling up. If a worker dies, the broken pool is
+    replaced and the job retried once.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.pool_restarts = 0
+        self.job_seconds_total = 0.0
+        self.max_job_ms = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use; spawn avoids forking a process with live threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Only touched from the event loop thread, so no lock is needed
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Image processing busy, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    result = await loop.run_in_executor(executor, func, *args)
+                    break
+                except BrokenProcessPool:
+                    # A worker died (OOM kill, segfault); the pool never recovers
+                    if self._executor is executor:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._executor = None
+                        self.pool_restarts += 1
+                        print("[ImagePipeline] ⚠️  Worker process died, restarting the pool")
+                    if attempt:
+                        raise
+        except Exception as e:
+            self.failed += 1
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            self._pending -= 1
+
+        self.completed += 1
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.job_seconds_total += elapsed_ms / 1000
+        self.max_job_ms = max(self.max_job_ms, elapsed_ms)
+        return result
+
+    async def optimize(self, image_path: Path, thumbnail_path: Path) -> Tuple[str, int]:
+        """Optimize an uploaded image in place and write its thumbnail.
+
+        Returns the SHA-256 and size of the optimized file.
+        """
+        return await self._run(optimize_with_thumbnail, image_path, thumbnail_path)
+
+    async def renditions(self, image_path: Path, stem: str, widths: List[int], formats: List[str]) -> List[Dict[str, Any]]:
+        """Write width/format renditions next to an optimized image; return manifest entries"""
+        return await self._run(create_renditions, image_path, stem, widths, formats)
+
+    async def transform(self, image_path: Path, output_path: Path, size: Tuple[int, int], fmt: str) -> Tuple[int, int]:
+        """Write ``image_path`` fitted within ``size`` as ``fmt``; return its dimensions"""
+        return await self._run(create_thumbnail, image_path, output_path, size, fmt)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters"""
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "pool_restarts": self.pool_restarts,
+            "avg_job_ms": round(self.job_seconds_total * 1000 / self.completed, 3) if self.completed else 0.0,
+            "max_job_ms": round(self.max_job_ms, 3)
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global image pipeline instance
+image_pipeline = ImagePipeline(
+    workers=IMAGE_WORKERS,
+    max_pending=IMAGE_MAX_PENDING
+)
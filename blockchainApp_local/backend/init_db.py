@@ -294,7 +294,8 @@ async def init_database():
             "enrolled_at": datetime.utcnow(),
             "status": "active",
             "progress_percentage": 50.0,
-            "completed_modules": [0]  # Completed first module
+            "completed_modules": [0],  # Completed first module
+            "completed_mask": 1
         },
         {
             "student_id": str(student_user["_id"]),
@@ -302,7 +303,8 @@ async def init_database():
             "enrolled_at": datetime.utcnow(),
             "status": "active",
             "progress_percentage": 100.0,
-            "completed_modules": [0]  # Completed all modules
+            "completed_modules": [0],  # Completed all modules
+            "completed_mask": 1
         }
     ]
     
@@ -4,14 +4,24 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
+import asyncio
 from typing import Any
 import os
 from dotenv import load_dotenv
 
 from models import *
 from routes import auth, courses, donations, resources, media
-from config import MONGODB_URL, DATABASE_NAME, ALLOWED_ORIGINS
-from blockchain_events import start_listener
+from config import MONGODB_URL, MONGODB_SERVER_SELECTION_TIMEOUT_MS, DATABASE_NAME, ALLOWED_ORIGINS, CATALOG_CHANGE_STREAM
+from blockchain_events import chain_status, event_indexer, start_indexer, close_rpc_session
+from principal_cache import principal_cache
+from password_hashing import password_hasher
+from image_pipeline import image_pipeline
+from media_store import media_store
+from transform_cache import transform_cache
+from rate_limiting import RateLimitMiddleware, rate_limit_backend
+from catalog_cache import catalog_cache, watch_catalog_changes
+from purchase_verifier import purchase_verifier
+from migrations import apply_migrations
 from error_handlers import (
     validation_exception_handler,
     http_exception_handler,
@@ -24,14 +34,29 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    app.mongodb_client = AsyncIOMotorClient(MONGODB_URL)  # type: ignore
+    app.mongodb_client = AsyncIOMotorClient(MONGODB_URL, serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS)  # type: ignore
     app.mongodb = app.mongodb_client[DATABASE_NAME]  # type: ignore
     print(f"✅ Connected to MongoDB at {MONGODB_URL}")
     print(f"📊 Using database: {DATABASE_NAME}")
-    start_listener()  # Start blockchain event listener
+    await apply_migrations(app.mongodb)  # type: ignore
+    await rate_limit_backend.startup(app.mongodb)  # type: ignore
+    await transform_cache.startup()
+    indexer_task = start_indexer(app.mongodb)  # type: ignore
+    catalog_watcher = None
+    if CATALOG_CHANGE_STREAM:
+        catalog_watcher = asyncio.create_task(watch_catalog_changes(app.mongodb))  # type: ignore
     yield
     
     # Shutdown
+    if catalog_watcher:
+        catalog_watcher.cancel()
+    if indexer_task:
+        indexer_task.cancel()
+        # Let it hand back the indexer lease before the client closes
+        await asyncio.gather(indexer_task, return_exceptions=True)
+    await close_rpc_session()
+    password_hasher.shutdown()
+    image_pipeline.shutdown()
     app.mongodb_client.close()  # type: ignore
     print("🔌 Disconnected from MongoDB")
 
@@ -50,6 +75,9 @@ app.add_exception_handler(Exception, general_exception_handler)  # type: ignore
 # Add error logging middleware
 app.add_middleware(ErrorMiddleware)
 
+# Per-route rate limiting
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -80,9 +108,25 @@ async def health_check():
     return {
         "status": "healthy", 
         "database": "connected",
+        "blockchain": chain_status,
         "timestamp": "2024-01-01T00:00:00Z"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Get in-process cache and performance counters"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "image_pipeline": image_pipeline.stats(),
+        "media_store": media_store.stats(),
+        "transform_cache": transform_cache.stats(),
+        "rate_limiter": rate_limit_backend.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "event_indexer": event_indexer.stats(),
+        "purchase_verifier": purchase_verifier.stats()
+    }
+
 @app.get("/api")
 async def api_info():
     """Get API information and available endpoints"""
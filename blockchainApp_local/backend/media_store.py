@@ -0,0 +1,419 @@
+"""
+Content-addressed, reference-counted image store
+
+Optimized images live at ``<root>/ab/cd/<sha256>.jpg`` (thumbnail
+``<sha256>_thumb.jpg``), keyed by the SHA-256 of the optimized JPEG so
+uploads that normalize to the same image share one blob. The
+``media_objects`` collection holds one document per blob:
+
+    {_id: <sha256>, refcount, size, source_hashes: [<sha256 of raw uploads>], created_at,
+     renditions: [{width, height, format, file, size}], renditions_status}
+
+``source_hashes`` lets a byte-identical re-upload be matched right after
+streaming, skipping PIL work entirely. ``renditions`` is the manifest of
+width/format variants (``<sha256>_w<width>.<ext>``) generated in the
+background after an object is first stored, when RENDITIONS_EAGER is set.
+While an unreferenced object's files are deleted its document carries
+``removing: true``; stores of the same image wait for that to finish.
+
+Each reference is also recorded in ``media_refs`` as {sha256, owner_id},
+so a user can only release references they took.
+"""
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import MEDIA_OBJECTS_DIR, RENDITIONS_EAGER, RENDITION_WIDTHS, RENDITION_FORMATS
+from image_pipeline import RENDITION_ENCODINGS, image_pipeline, supported_rendition_formats
+from upload_stream import stream_to_temp
+
+# <sha256>.jpg, <sha256>_thumb.jpg or a rendition <sha256>_w<width>.<ext>
+OBJECT_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})(_thumb|_w[0-9]+)?\.(jpg|webp|avif)$")
+# A "pending" claim older than this is assumed lost (e.g. a restart) and retried
+RENDITION_CLAIM_TIMEOUT = timedelta(minutes=10)
+# A removal older than this is assumed lost (e.g. a crash) and taken over
+REMOVAL_TIMEOUT = timedelta(seconds=30)
+# Polling while another request removes an object that is being stored again
+REMOVAL_WAIT_SECONDS = 0.02
+REMOVAL_WAIT_ATTEMPTS = 50
+# Preference order when the client accepts several formats
+FORMAT_PREFERENCE = ["avif", "webp", "jpeg"]
+
+
+class StoredObject(NamedTuple):
+    sha256: str
+    size: int
+    deduplicated: bool
+
+
+def accepted_formats(accept: str) -> Set[str]:
+    """Rendition formats an Accept header allows; JPEG is always acceptable"""
+    accepted = {"jpeg"}
+    for part in accept.split(","):
+        media_type, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality <= 0:
+            continue
+        for fmt, encoding in RENDITION_ENCODINGS.items():
+            if media_type.strip().lower() == encoding["mime_type"]:
+                accepted.add(fmt)
+    return accepted
+
+
+def preferred_format(accept: str, formats: List[str]) -> str:
+    """Most preferred of ``formats`` that an Accept header allows"""
+    accepted = accepted_formats(accept)
+    return next((f for f in FORMAT_PREFERENCE if f in accepted and f in formats), "jpeg")
+
+
+def choose_rendition(entries: List[Dict[str, Any]], accept: str, width: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Best manifest entry for a client.
+
+    Takes the most preferred format the client accepts, then the smallest
+    rendition at least ``width`` wide (the largest one if none is, or if no
+    width was asked for).
+    """
+    accepted = accepted_formats(accept)
+    for fmt in FORMAT_PREFERENCE:
+        if fmt not in accepted:
+            continue
+        candidates = sorted((e for e in entries if e["format"] == fmt), key=lambda e: e["width"])
+        if not candidates:
+            continue
+        if width is not None:
+            for entry in candidates:
+                if entry["width"] >= width:
+                    return entry
+        return candidates[-1]
+    return None
+
+
+class MediaStore:
+    """Stores each distinct image once and counts the references to it.
+
+    ``store`` returns an existing blob (one more reference) when the raw
+    upload or its optimized result is already known; ``release`` drops one
+    of the owner's references and removes the blob once none are left.
+    """
+
+    def __init__(self, root: Path, rendition_widths: List[int], rendition_formats: List[str],
+                 eager_renditions: bool = True, manifest_cache_size: int = 1024):
+        self.root = root
+        self.eager_renditions = eager_renditions
+        self.rendition_widths = rendition_widths
+        self.rendition_formats = supported_rendition_formats(rendition_formats)
+        self.manifest_cache_size = manifest_cache_size
+        # Manifests of objects whose renditions are ready; they never change
+        self._manifests: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._background: Set[asyncio.Task] = set()
+        self.stored = 0
+        self.alias_hits = 0
+        self.content_hits = 0
+        self.released = 0
+        self.removed = 0
+        self.renditions_generated = 0
+        self.renditions_failed = 0
+        self.manifest_hits = 0
+        self.manifest_misses = 0
+
+    def object_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}.jpg"
+
+    def thumbnail_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}_thumb.jpg"
+
+    def resolve(self, name: str) -> Optional[Path]:
+        """Path for an object, thumbnail or rendition file name, None if malformed"""
+        match = OBJECT_NAME_PATTERN.match(name)
+        if not match:
+            return None
+        sha256 = match.group(1)
+        return self.object_path(sha256).with_name(name)
+
+    @staticmethod
+    def original_hash(name: str) -> Optional[str]:
+        """The hash if ``name`` is an original object (``<sha256>.jpg``)"""
+        match = OBJECT_NAME_PATTERN.match(name)
+        if match and match.group(2) is None and match.group(3) == "jpg":
+            return match.group(1)
+        return None
+
+    @staticmethod
+    def urls(sha256: str) -> Dict[str, str]:
+        return {
+            "url": f"/api/media/objects/{sha256}.jpg",
+            "thumbnail_url": f"/api/media/objects/{sha256}_thumb.jpg"
+        }
+
+    async def _acquire_alias(self, db, source_hash: str) -> Optional[dict]:
+        doc = await db.media_objects.find_one_and_update(
+            {"source_hashes": source_hash, "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        if self.object_path(doc["_id"]).exists() and self.thumbnail_path(doc["_id"]).exists():
+            return doc
+        # Blob lost on disk: give the reference back and re-process the upload
+        await db.media_objects.update_one({"_id": doc["_id"]}, {"$inc": {"refcount": -1}})
+        return None
+
+    async def _acquire(self, db, sha256: str, source_hash: str, size: int) -> bool:
+        """Add a reference, creating the document if needed; True if it existed.
+
+        Waits while the object is being removed, so the files of the new
+        reference are never deleted by the old removal.
+        """
+        for attempt in range(REMOVAL_WAIT_ATTEMPTS):
+            try:
+                before = await db.media_objects.find_one_and_update(
+                    {"_id": sha256, "removing": {"$ne": True}},
+                    {
+                        "$inc": {"refcount": 1},
+                        "$addToSet": {"source_hashes": source_hash},
+                        "$setOnInsert": {"size": size, "created_at": datetime.utcnow()}
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE
+                )
+                return before is not None
+            except DuplicateKeyError:
+                # Two uploads of the same image raced on the upsert (the retry
+                # updates), or the document is marked for removal
+                await db.media_objects.delete_one({
+                    "_id": sha256,
+                    "removing": True,
+                    "removing_started_at": {"$lt": datetime.utcnow() - REMOVAL_TIMEOUT}
+                })
+                if attempt:
+                    await asyncio.sleep(REMOVAL_WAIT_SECONDS)
+        raise HTTPException(
+            status_code=503,
+            detail="Image is being replaced, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+    async def _add_ref(self, db, sha256: str, owner_id: str) -> None:
+        try:
+            await db.media_refs.insert_one({"sha256": sha256, "owner_id": owner_id, "created_at": datetime.utcnow()})
+        except BaseException:
+            await self._drop_reference(db, sha256)
+            raise
+
+    async def store(self, db, chunks: AsyncIterator[bytes], max_size: int, owner_id: str) -> StoredObject:
+        """Stream an upload in and return the object it is stored as, referenced by ``owner_id``"""
+        # Created on first use rather than when the module is imported
+        self.root.mkdir(parents=True, exist_ok=True)
+        upload = await stream_to_temp(chunks, self.root, max_size)
+        thumbnail_tmp = upload.path.with_name(f"{upload.path.stem}_thumb.part")
+        try:
+            doc = await self._acquire_alias(db, upload.sha256)
+            if doc is not None:
+                await self._add_ref(db, doc["_id"], owner_id)
+                self.alias_hits += 1
+                if doc.get("renditions_status") != "ready":
+                    self.schedule_renditions(db, doc["_id"])
+                return StoredObject(doc["_id"], doc["size"], True)
+
+            sha256, size = await image_pipeline.optimize(upload.path, thumbnail_tmp)
+            # Reference first, files second: a removal of the same object has
+            # either finished by now or waits until this reference is dropped
+            existed = await self._acquire(db, sha256, upload.sha256, size)
+            try:
+                blob_path = self.object_path(sha256)
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                # Same content either way, so replacing an existing blob is harmless
+                os.replace(upload.path, blob_path)
+                os.replace(thumbnail_tmp, self.thumbnail_path(sha256))
+            except BaseException:
+                await self._drop_reference(db, sha256)
+                raise
+            await self._add_ref(db, sha256, owner_id)
+
+            if existed:
+                self.content_hits += 1
+            else:
+                self.stored += 1
+            self.schedule_renditions(db, sha256)
+            return StoredObject(sha256, size, existed)
+        finally:
+            upload.path.unlink(missing_ok=True)
+            thumbnail_tmp.unlink(missing_ok=True)
+
+    async def release(self, db, sha256: str, owner_id: Optional[str]) -> Optional[int]:
+        """Drop one of ``owner_id``'s references; return the remaining count.
+
+        None if the owner holds no reference to the object. ``owner_id``
+        None (admins) releases anyone's, or one taken before references
+        were recorded per owner.
+        """
+        ref_filter = {"sha256": sha256}
+        if owner_id is not None:
+            ref_filter["owner_id"] = owner_id
+        ref = await db.media_refs.find_one_and_delete(ref_filter, projection={"_id": 1})
+        if ref is None and owner_id is not None:
+            return None
+        return await self._drop_reference(db, sha256)
+
+    async def _drop_reference(self, db, sha256: str) -> Optional[int]:
+        doc = await db.media_objects.find_one_and_update(
+            {"_id": sha256, "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        self.released += 1
+        if doc["refcount"] == 0:
+            # Only the caller whose claim wins removes the files
+            claim = await db.media_objects.update_one(
+                {"_id": sha256, "refcount": 0, "removing": {"$ne": True}},
+                {"$set": {"removing": True, "removing_started_at": datetime.utcnow()}}
+            )
+            if claim.modified_count:
+                await self._remove(db, sha256)
+                self.removed += 1
+        return doc["refcount"]
+
+    async def _remove_orphaned(self, db, sha256: str) -> None:
+        """Remove files written for an object whose document is gone"""
+        for attempt in range(REMOVAL_WAIT_ATTEMPTS):
+            try:
+                # A tombstone makes stores of the same image wait, as a release does
+                await db.media_objects.insert_one(
+                    {"_id": sha256, "refcount": 0, "removing": True, "removing_started_at": datetime.utcnow()}
+                )
+            except DuplicateKeyError:
+                doc = await db.media_objects.find_one({"_id": sha256}, {"removing": 1})
+                if doc is not None and not doc.get("removing"):
+                    # Stored again; the new owner overwrites these files
+                    return
+                # Another removal in progress may have missed the files just written
+                await asyncio.sleep(REMOVAL_WAIT_SECONDS)
+                continue
+            await self._remove(db, sha256)
+            return
+
+    async def _remove(self, db, sha256: str) -> None:
+        """Delete the files of an object marked ``removing``, then its document"""
+        self._remove_files(sha256)
+        await db.media_objects.delete_one({"_id": sha256, "removing": True})
+
+    def _remove_files(self, sha256: str) -> None:
+        """Delete an object with its thumbnail and renditions"""
+        self._manifests.pop(sha256, None)
+        for path in self.object_path(sha256).parent.glob(f"{sha256}*"):
+            path.unlink(missing_ok=True)
+
+    def schedule_renditions(self, db, sha256: str) -> None:
+        """Generate an object's renditions in the background"""
+        if not self.eager_renditions or not self.rendition_widths or not self.rendition_formats:
+            return
+        task = asyncio.create_task(self.generate_renditions(db, sha256))
+        # Keep a reference until done so the task is not garbage collected
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def generate_renditions(self, db, sha256: str) -> Optional[List[Dict[str, Any]]]:
+        """Encode an object's renditions and record the manifest.
+
+        Claims the object first, so concurrent uploads of the same image
+        generate its renditions once. Returns the manifest, or None if
+        another task owns the work or it failed.
+        """
+        now = datetime.utcnow()
+        claim = await db.media_objects.update_one(
+            {
+                "_id": sha256,
+                "refcount": {"$gt": 0},
+                "$or": [
+                    {"renditions_status": {"$exists": False}},
+                    {"renditions_status": "failed"},
+                    {"renditions_status": "pending", "renditions_started_at": {"$lt": now - RENDITION_CLAIM_TIMEOUT}}
+                ]
+            },
+            {"$set": {"renditions_status": "pending", "renditions_started_at": now}}
+        )
+        if not claim.modified_count:
+            return None
+
+        try:
+            entries = await image_pipeline.renditions(
+                self.object_path(sha256), sha256, self.rendition_widths, self.rendition_formats
+            )
+        except Exception as e:
+            detail = getattr(e, "detail", str(e))
+            self.renditions_failed += 1
+            print(f"[MediaStore] ⚠️  Renditions for {sha256[:12]} failed: {detail}")
+            await db.media_objects.update_one(
+                {"_id": sha256},
+                {"$set": {"renditions_status": "failed", "renditions_error": detail}}
+            )
+            return None
+
+        result = await db.media_objects.update_one(
+            {"_id": sha256, "removing": {"$ne": True}},
+            {"$set": {"renditions": entries, "renditions_status": "ready"}, "$unset": {"renditions_error": ""}}
+        )
+        if not result.matched_count:
+            # Released while encoding: nothing references these files any more
+            await self._remove_orphaned(db, sha256)
+            return None
+        self.renditions_generated += 1
+        return entries
+
+    async def renditions(self, db, sha256: str) -> List[Dict[str, Any]]:
+        """An object's rendition manifest, empty until generated"""
+        entries = self._manifests.get(sha256)
+        if entries is not None:
+            self._manifests.move_to_end(sha256)
+            self.manifest_hits += 1
+            return entries
+
+        self.manifest_misses += 1
+        doc = await db.media_objects.find_one({"_id": sha256}, {"renditions": 1, "renditions_status": 1})
+        if not doc or doc.get("renditions_status") != "ready":
+            return []
+        entries = doc.get("renditions") or []
+        self._manifests[sha256] = entries
+        while len(self._manifests) > self.manifest_cache_size:
+            self._manifests.popitem(last=False)
+        return entries
+
+    def stats(self) -> Dict[str, Any]:
+        """Return store counters"""
+        return {
+            "stored": self.stored,
+            "alias_hits": self.alias_hits,
+            "content_hits": self.content_hits,
+            "released": self.released,
+            "removed": self.removed,
+            "eager_renditions": self.eager_renditions,
+            "rendition_formats": self.rendition_formats,
+            "renditions_generated": self.renditions_generated,
+            "renditions_failed": self.renditions_failed,
+            "renditions_in_progress": len(self._background),
+            "manifests_cached": len(self._manifests),
+            "manifest_hits": self.manifest_hits,
+            "manifest_misses": self.manifest_misses
+        }
+
+
+# Global media store instance
+media_store = MediaStore(Path(MEDIA_OBJECTS_DIR), RENDITION_WIDTHS, RENDITION_FORMATS, eager_renditions=RENDITIONS_EAGER)
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Versioned MongoDB index and data migrations
+
+Migrations run at application startup (main.lifespan) or from the CLI:
+
+    python migrations.py apply      # apply pending migrations
+    python migrations.py status     # list applied/pending versions
+    python migrations.py coverage   # explain hot queries, show index usage
+    python migrations.py reset 3    # release a data step stuck in "running"
+
+Index declarations are re-applied on every run (create_index is a no-op for
+existing indexes), except those a later version lists in ``supersedes``;
+data steps run once per version, recorded in the ``schema_migrations``
+collection. Applied migrations are never edited: a change is a new version.
+A running data step heartbeats; one whose owner stopped heartbeating (a
+crash mid-step) is taken over on the next startup, so data steps must be
+idempotent.
+"""
+import asyncio
+import os
+import socket
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, ServerSelectionTimeoutError
+
+from progress_bits import mask_from_modules
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+# A running data step refreshes heartbeat_at this often...
+DATA_STEP_HEARTBEAT_SECONDS = 30
+# ...and is considered abandoned once it has not for this long
+DATA_STEP_STALE_AFTER = timedelta(minutes=5)
+
+# "<collection>.<index name>" of unique indexes this process has seen built.
+# Routes that rely on DuplicateKeyError keep their pre-insert duplicate check
+# until the index is confirmed (e.g. legacy duplicates blocked the build).
+confirmed_unique_indexes: Set[str] = set()
+
+
+def unique_index_confirmed(collection_name: str, index_name: str) -> bool:
+    """Whether a unique index is known to exist and enforce uniqueness"""
+    return f"{collection_name}.{index_name}" in confirmed_unique_indexes
+
+
+@dataclass
+class Migration:
+    """A numbered set of indexes plus an optional one-off data step"""
+    version: int
+    description: str
+    indexes: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    run: Optional[Callable[[Any], Awaitable[None]]] = None
+    # collection -> names of indexes from earlier versions this one replaces
+    supersedes: Dict[str, List[str]] = field(default_factory=dict)
+
+
+async def backfill_completed_mask(db) -> None:
+    """Encode existing completed_modules lists as completed_mask bitmasks"""
+    batch = []
+    converted = 0
+    async for enrollment in db.enrollments.find({"completed_mask": {"$exists": False}}, {"completed_modules": 1}):
+        mask = mask_from_modules(enrollment.get("completed_modules") or [])
+        batch.append(UpdateOne({"_id": enrollment["_id"]}, {"$set": {"completed_mask": mask}}))
+        if len(batch) >= 1000:
+            converted += (await db.enrollments.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        converted += (await db.enrollments.bulk_write(batch, ordered=False)).modified_count
+    print(f"✅ Encoded completed_modules as completed_mask for {converted} enrollments")
+
+
+async def _drop_index_if_exists(collection, name: str) -> None:
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if e.code != 27:  # IndexNotFound
+            raise
+
+
+async def drop_transaction_hash_unique(db) -> None:
+    """Drop the v2 single-field unique index superseded by v4"""
+    await _drop_index_if_exists(db.donations, "transaction_hash_unique")
+
+
+async def drop_purchase_log_index_unique(db) -> None:
+    """Drop the v5 purchases key superseded by v7's contract-scoped one"""
+    await _drop_index_if_exists(db.purchases, "transaction_hash_log_index_unique")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="Catalog and keyset pagination indexes",
+        indexes={
+            "courses": [
+                # get_course_categories: $match is_published then $group by category
+                {"keys": [("is_published", ASCENDING), ("category", ASCENDING)], "name": "published_category"},
+                # get_courses keyset pagination on _id
+                {"keys": [("is_published", ASCENDING), ("_id", ASCENDING)], "name": "published_id"},
+            ],
+            # Keyset pagination: (filter field, sort field, _id) for each list filter
+            "donations": [
+                {"keys": [("created_at", DESCENDING), ("_id", DESCENDING)], "name": "created_id"},
+                {"keys": [("donor_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "donor_created_id"},
+                {"keys": [("target_school_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "school_created_id"},
+                {"keys": [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "status_created_id"},
+            ],
+            "schools": [
+                {"keys": [("verified", ASCENDING), ("_id", ASCENDING)], "name": "verified_id"},
+            ],
+            "resource_requests": [
+                {"keys": [("created_at", DESCENDING), ("_id", DESCENDING)], "name": "created_id"},
+                {"keys": [("school_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "school_created_id"},
+                {"keys": [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "status_created_id"},
+            ],
+        }
+    ),
+    Migration(
+        version=2,
+        description="Hot query indexes and unique constraints",
+        indexes={
+            "users": [
+                # Replace find-then-insert duplicate checks in register_user
+                {"keys": [("email", ASCENDING)], "name": "email_unique", "unique": True},
+                {"keys": [("username", ASCENDING)], "name": "username_unique", "unique": True},
+            ],
+            "enrollments": [
+                {"keys": [("student_id", ASCENDING), ("course_id", ASCENDING)], "name": "student_course_unique", "unique": True},
+            ],
+            "donations": [
+                # Replace the find-then-insert duplicate check in create_donation
+                {
+                    "keys": [("transaction_hash", ASCENDING)],
+                    "name": "transaction_hash_unique",
+                    "unique": True,
+                    "partialFilterExpression": {"transaction_hash": {"$type": "string"}}
+                },
+            ],
+            "purchases": [
+                {"keys": [("buyer", ASCENDING), ("courseId", ASCENDING)], "name": "buyer_course"},
+            ],
+        }
+    ),
+    Migration(
+        version=3,
+        description="Bitmask-encoded module progress on enrollments",
+        indexes={
+            "enrollments": [
+                # Completion stats: match a course, then $bitsAllSet on completed_mask
+                {"keys": [("course_id", ASCENDING)], "name": "course_id"},
+            ],
+        },
+        run=backfill_completed_mask
+    ),
+    Migration(
+        version=4,
+        description="Key chain-synced donations on (transaction_hash, log_index)",
+        indexes={
+            "donations": [
+                # API-created donations have no log_index and still collide on transaction_hash
+                {
+                    "keys": [("transaction_hash", ASCENDING), ("log_index", ASCENDING)],
+                    "name": "transaction_hash_log_index_unique",
+                    "unique": True,
+                    "partialFilterExpression": {"transaction_hash": {"$type": "string"}}
+                },
+            ],
+        },
+        run=drop_transaction_hash_unique,
+        supersedes={"donations": ["transaction_hash_unique"]}
+    ),
+    Migration(
+        version=5,
+        description="Collections for indexed school, allocation and purchase events",
+        indexes={
+            "chain_schools": [
+                {"keys": [("school_id", ASCENDING)], "name": "school_id_unique", "unique": True},
+                {"keys": [("wallet_address", ASCENDING)], "name": "wallet_address"},
+            ],
+            "allocations": [
+                {"keys": [("allocation_id", ASCENDING)], "name": "allocation_id_unique", "unique": True},
+                {"keys": [("school_id", ASCENDING)], "name": "school_id"},
+            ],
+            "withdrawals": [
+                {"keys": [("transaction_hash", ASCENDING), ("log_index", ASCENDING)], "name": "transaction_hash_log_index_unique", "unique": True},
+                {"keys": [("school_id", ASCENDING)], "name": "school_id"},
+            ],
+            "purchases": [
+                {"keys": [("transaction_hash", ASCENDING), ("log_index", ASCENDING)], "name": "transaction_hash_log_index_unique", "unique": True},
+            ],
+        }
+    ),
+    Migration(
+        version=6,
+        description="Content-addressed media store",
+        indexes={
+            "media_objects": [
+                # Re-upload short-circuit: raw upload SHA-256 -> stored object
+                {"keys": [("source_hashes", ASCENDING)], "name": "source_hashes"},
+            ],
+        }
+    ),
+    Migration(
+        version=7,
+        description="Key indexed purchases on (contract, transaction_hash, log_index)",
+        indexes={
+            "purchases": [
+                # Matches the contract_events.purchase_upsert filter
+                {
+                    "keys": [("contract", ASCENDING), ("transaction_hash", ASCENDING), ("log_index", ASCENDING)],
+                    "name": "contract_transaction_hash_log_index_unique",
+                    "unique": True
+                },
+            ],
+        },
+        run=drop_purchase_log_index_unique,
+        supersedes={"purchases": ["transaction_hash_log_index_unique"]}
+    ),
+    Migration(
+        version=8,
+        description="Contract-scoped purchase lookups",
+        indexes={
+            "purchases": [
+                # purchase_verifier.verify_many: one contract's purchases by a buyer
+                {"keys": [("contract", ASCENDING), ("buyer", ASCENDING), ("courseId", ASCENDING)], "name": "contract_buyer_course"},
+            ],
+        }
+    ),
+    Migration(
+        version=9,
+        description="Per-owner media references",
+        indexes={
+            "media_refs": [
+                # MediaStore.release: one of an owner's references to an object
+                {"keys": [("sha256", ASCENDING), ("owner_id", ASCENDING)], "name": "sha256_owner"},
+            ],
+        }
+    ),
+]
+
+# Hot API queries and the index each is expected to use (checked by `coverage`)
+QUERY_COVERAGE: List[Dict[str, Any]] = [
+    {"name": "login / register by email", "collection": "users", "filter": {"email": "user@example.com"}},
+    {"name": "register by username", "collection": "users", "filter": {"username": "user"}},
+    {"name": "enrollment lookup", "collection": "enrollments", "filter": {"student_id": "id", "course_id": "id"}},
+    {"name": "enrolled courses", "collection": "enrollments", "filter": {"student_id": "id"}},
+    {"name": "course completion stats", "collection": "enrollments", "filter": {"course_id": "id"}},
+    {"name": "donation by transaction hash", "collection": "donations", "filter": {"transaction_hash": "0x0"}},
+    {
+        "name": "donations by status, newest first",
+        "collection": "donations",
+        "filter": {"status": "confirmed"},
+        "sort": {"created_at": -1, "_id": -1}
+    },
+    {"name": "purchase check", "collection": "purchases", "filter": {"contract": "EdTechDonation", "buyer": "0x0", "courseId": 1}},
+    {"name": "chain school by wallet", "collection": "chain_schools", "filter": {"wallet_address": "0x0"}},
+    {"name": "school allocations", "collection": "allocations", "filter": {"school_id": 1}},
+    {"name": "school withdrawals", "collection": "withdrawals", "filter": {"school_id": 1}},
+    {
+        "name": "school resource requests, newest first",
+        "collection": "resource_requests",
+        "filter": {"school_id": "id"},
+        "sort": {"created_at": -1, "_id": -1}
+    },
+    {"name": "course categories", "collection": "courses", "filter": {"is_published": True}},
+    {"name": "media re-upload lookup", "collection": "media_objects", "filter": {"source_hashes": "0" * 64}},
+    {"name": "media reference release", "collection": "media_refs", "filter": {"sha256": "0" * 64, "owner_id": "id"}},
+]
+
+
+def superseded_indexes(migration: Migration) -> Set[str]:
+    """"<collection>.<index name>" of indexes replaced by versions after ``migration``"""
+    return {
+        f"{collection_name}.{name}"
+        for later in MIGRATIONS if later.version > migration.version
+        for collection_name, names in later.supersedes.items()
+        for name in names
+    }
+
+
+async def ensure_indexes(db, migration: Migration) -> List[str]:
+    """Create a migration's indexes (minus superseded ones); return error messages"""
+    errors = []
+    superseded = superseded_indexes(migration)
+    for collection_name, specs in migration.indexes.items():
+        for spec in specs:
+            if f"{collection_name}.{spec.get('name')}" in superseded:
+                continue
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            qualified_name = f"{collection_name}.{spec.get('name')}"
+            try:
+                await db[collection_name].create_index(spec["keys"], **options)
+            except ServerSelectionTimeoutError:
+                raise
+            except Exception as e:
+                errors.append(f"{qualified_name}: {e}")
+                if spec.get("unique"):
+                    confirmed_unique_indexes.discard(qualified_name)
+                    print(f"❌ Unique index {qualified_name} could not be built (existing duplicates?); "
+                          f"duplicate checks stay in the request path until it is")
+            else:
+                if spec.get("unique"):
+                    confirmed_unique_indexes.add(qualified_name)
+    return errors
+
+
+async def _claim_data_step(migrations_col, migration: Migration, owner: str) -> bool:
+    """Mark a data step as running; False if it is applied or running elsewhere.
+
+    A "running" claim without a recent heartbeat is taken over.
+    """
+    now = datetime.utcnow()
+    stale = now - DATA_STEP_STALE_AFTER
+    try:
+        await migrations_col.update_one(
+            {
+                "_id": migration.version,
+                "$or": [
+                    {"status": {"$nin": ["applied", "running"]}},
+                    {"status": "running", "heartbeat_at": {"$lt": stale}},
+                    # Claimed before heartbeats were recorded
+                    {"status": "running", "heartbeat_at": {"$exists": False}, "started_at": {"$lt": stale}}
+                ]
+            },
+            {"$set": {
+                "description": migration.description,
+                "status": "running",
+                "owner": owner,
+                "started_at": now,
+                "heartbeat_at": now
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _heartbeat(migrations_col, version: int, owner: str) -> None:
+    """Keep a claimed data step's heartbeat fresh until cancelled"""
+    while True:
+        await asyncio.sleep(DATA_STEP_HEARTBEAT_SECONDS)
+        try:
+            await migrations_col.update_one(
+                {"_id": version, "status": "running", "owner": owner},
+                {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            print(f"⚠️  Migration {version} heartbeat failed: {e}")
+
+
+async def reset_data_step(db, version: int) -> bool:
+    """Release a data step left "running" so the next apply runs it again"""
+    result = await db[MIGRATIONS_COLLECTION].update_one(
+        {"_id": version, "status": "running"},
+        {"$set": {"status": "pending"}, "$unset": {"owner": "", "heartbeat_at": ""}}
+    )
+    return result.modified_count > 0
+
+
+async def apply_migrations(db) -> bool:
+    """Apply all migrations idempotently; return True if everything succeeded"""
+    migrations_col = db[MIGRATIONS_COLLECTION]
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    ok = True
+
+    try:
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            errors = await ensure_indexes(db, migration)
+            for error in errors:
+                print(f"⚠️  Migration {migration.version} index error: {error}")
+
+            if migration.run is not None and not errors:
+                # Claim the data step so concurrent workers don't run it twice
+                if not await _claim_data_step(migrations_col, migration, owner):
+                    continue
+                heartbeat = asyncio.create_task(_heartbeat(migrations_col, migration.version, owner))
+                try:
+                    await migration.run(db)
+                except Exception as e:
+                    errors.append(f"data step failed: {e}")
+                    print(f"⚠️  Migration {migration.version} data step failed: {e}")
+                finally:
+                    heartbeat.cancel()
+
+            await migrations_col.update_one(
+                {"_id": migration.version},
+                {
+                    "$set": {
+                        "description": migration.description,
+                        "status": "failed" if errors else "applied",
+                        "errors": errors,
+                        "applied_at": datetime.utcnow()
+                    },
+                    "$unset": {"owner": "", "heartbeat_at": ""}
+                },
+                upsert=True
+            )
+            ok = ok and not errors
+    except ServerSelectionTimeoutError as e:
+        print(f"⚠️  Skipping migrations, MongoDB unreachable: {e}")
+        return False
+
+    if ok:
+        print(f"✅ Database migrations applied (version {max(m.version for m in MIGRATIONS)})")
+    return ok
+
+
+async def migration_status(db) -> List[Dict[str, Any]]:
+    """Return applied/pending state for every migration"""
+    records = {r["_id"]: r async for r in db[MIGRATIONS_COLLECTION].find()}
+    status = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        record = records.get(migration.version, {})
+        status.append({
+            "version": migration.version,
+            "description": migration.description,
+            "status": record.get("status", "pending"),
+            "applied_at": record.get("applied_at"),
+            "errors": record.get("errors", [])
+        })
+    return status
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of a query plan"""
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def _index_names(plan: Dict[str, Any]) -> List[str]:
+    """Collect the index names used by a query plan"""
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            names.extend(_index_names(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        names.extend(_index_names(child))
+    return names
+
+
+async def query_coverage(db) -> List[Dict[str, Any]]:
+    """Explain each hot query and report whether an index serves it"""
+    report = []
+    for query in QUERY_COVERAGE:
+        command: Dict[str, Any] = {"find": query["collection"], "filter": query["filter"]}
+        if "sort" in query:
+            command["sort"] = query["sort"]
+        try:
+            explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+            winning = explain["queryPlanner"]["winningPlan"]
+            stages = _plan_stages(winning)
+            index_names = _index_names(winning)
+            report.append({
+                "name": query["name"],
+                "collection": query["collection"],
+                "covered": "COLLSCAN" not in stages,
+                "indexes": index_names,
+                "stages": stages
+            })
+        except OperationFailure as e:
+            report.append({"name": query["name"], "collection": query["collection"], "covered": False, "error": str(e)})
+    return report
+
+
+async def main():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from config import MONGODB_URL, DATABASE_NAME
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "apply"
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+
+    try:
+        if command == "apply":
+            ok = await apply_migrations(db)
+            sys.exit(0 if ok else 1)
+        elif command == "status":
+            for entry in await migration_status(db):
+                print(f"  v{entry['version']}: {entry['status']:8} {entry['description']}")
+                for error in entry["errors"]:
+                    print(f"      ❌ {error}")
+        elif command == "coverage":
+            for entry in await query_coverage(db):
+                mark = "✅" if entry["covered"] else "❌"
+                detail = ", ".join(entry.get("indexes", [])) or entry.get("error", "COLLSCAN")
+                print(f"  {mark} {entry['collection']}: {entry['name']} ({detail})")
+        elif command == "reset" and len(sys.argv) > 2 and sys.argv[2].isdigit():
+            version = int(sys.argv[2])
+            if await reset_data_step(db, version):
+                print(f"✅ v{version} reset; its data step runs again on the next apply")
+            else:
+                print(f"v{version} is not running, nothing to reset")
+        else:
+            print(f"Unknown command: {command} (use apply, status, coverage or reset <version>)")
+            sys.exit(2)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -113,6 +113,11 @@ class Donation(BaseModel):
     
     model_config = ConfigDict(populate_by_name=True)
 
+class DonationPage(BaseModel):
+    """Cursor-paginated donations"""
+    items: List[Donation]
+    next_cursor: Optional[str] = None
+
 class DonationCreate(BaseModel):
     amount_eth: float
     purpose: str
@@ -141,6 +146,11 @@ class ResourceRequest(BaseModel):
     
     model_config = ConfigDict(populate_by_name=True)
 
+class ResourceRequestPage(BaseModel):
+    """Cursor-paginated resource requests"""
+    items: List[ResourceRequest]
+    next_cursor: Optional[str] = None
+
 class ResourceRequestCreate(BaseModel):
     resource_type: ResourceType
     description: str
@@ -155,6 +165,7 @@ class StudentProgress(BaseModel):
     student_id: str
     course_id: str
     completed_modules: List[int] = []
+    completed_mask: int = 0  # bit i set when module i is completed (see progress_bits)
     progress_percentage: float = 0.0
     started_at: datetime
     last_accessed: datetime
@@ -178,6 +189,11 @@ class School(BaseModel):
     
     model_config = ConfigDict(populate_by_name=True)
 
+class SchoolPage(BaseModel):
+    """Cursor-paginated schools"""
+    items: List[School]
+    next_cursor: Optional[str] = None
+
 class SchoolCreate(BaseModel):
     name: str
     address: str
@@ -0,0 +1,74 @@
+"""
+Opaque keyset (cursor) pagination helpers for MongoDB list endpoints
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_value: Any, doc_id: Any) -> str:
+    """Encode the (sort field, _id) of the last returned document"""
+    if isinstance(sort_value, datetime):
+        value = {"t": "dt", "v": sort_value.isoformat()}
+    elif isinstance(sort_value, ObjectId):
+        value = {"t": "oid", "v": str(sort_value)}
+    else:
+        value = {"t": "raw", "v": sort_value}
+    payload = json.dumps({"s": value, "id": str(doc_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Decode a cursor produced by ``encode_cursor``"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["s"]
+        if value["t"] == "dt":
+            sort_value = datetime.fromisoformat(value["v"])
+        elif value["t"] == "oid":
+            sort_value = ObjectId(value["v"])
+        else:
+            sort_value = value["v"]
+        return sort_value, ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_filter(filter_query: Dict[str, Any], sort_field: str, cursor: str, descending: bool = True) -> Dict[str, Any]:
+    """Restrict ``filter_query`` to documents after ``cursor``"""
+    sort_value, last_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    if sort_field == "_id":
+        after = {"_id": {op: last_id}}
+    else:
+        after = {"$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "_id": {op: last_id}}
+        ]}
+    if not filter_query:
+        return after
+    return {"$and": [filter_query, after]}
+
+
+def keyset_sort(sort_field: str, descending: bool = True) -> List[Tuple[str, int]]:
+    """Sort specification matching ``keyset_filter``"""
+    direction = -1 if descending else 1
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
+
+
+def next_cursor(page: List[Dict[str, Any]], limit: int, sort_field: str) -> Optional[str]:
+    """Cursor for the page after ``page`` (None when it was the last page).
+
+    Call before converting ``_id`` values to strings.
+    """
+    if len(page) < limit or not page:
+        return None
+    last = page[-1]
+    return encode_cursor(last.get(sort_field), last["_id"])
@@ -0,0 +1,65 @@
+"""
+Bitmask encoding of completed course modules
+
+Enrollments keep ``completed_mask``: a 64-bit integer (BSON Int64) with bit
+``i`` set once module ``i`` is completed. MongoDB can match it with
+$bitsAllSet / $bitsAnySet instead of scanning ``completed_modules`` lists.
+Only modules 0-62 fit in the mask (bit 63 is the sign bit); progress for
+higher module indexes is tracked by ``completed_modules`` alone.
+"""
+from typing import Any, Dict, Iterable, List
+
+from bson.int64 import Int64
+
+MAX_MASK_MODULES = 63
+
+
+def module_bit(module_id: int) -> Int64:
+    """Mask with only ``module_id``'s bit set"""
+    if not 0 <= module_id < MAX_MASK_MODULES:
+        raise ValueError(f"module {module_id} does not fit in the progress mask")
+    return Int64(1 << module_id)
+
+
+def set_module(mask: int, module_id: int) -> Int64:
+    """Return ``mask`` with ``module_id`` marked completed"""
+    return Int64(mask | module_bit(module_id))
+
+
+def is_completed(mask: int, module_id: int) -> bool:
+    """True if ``module_id`` is marked completed in ``mask``"""
+    return 0 <= module_id < MAX_MASK_MODULES and bool(mask >> module_id & 1)
+
+
+def popcount(mask: int) -> int:
+    """Number of completed modules in ``mask``"""
+    return int(mask).bit_count()
+
+
+def full_mask(total_modules: int) -> Int64:
+    """Mask with every module of a ``total_modules`` course completed"""
+    return Int64((1 << min(total_modules, MAX_MASK_MODULES)) - 1)
+
+
+def mask_from_modules(module_ids: Iterable[Any]) -> Int64:
+    """Encode a ``completed_modules`` list, ignoring ids the mask can't hold"""
+    mask = 0
+    for module_id in module_ids:
+        if isinstance(module_id, int) and 0 <= module_id < MAX_MASK_MODULES:
+            mask |= 1 << module_id
+    return Int64(mask)
+
+
+def modules_from_mask(mask: int) -> List[int]:
+    """Decode a mask back into a sorted list of module ids"""
+    return [i for i in range(MAX_MASK_MODULES) if mask >> i & 1]
+
+
+def completed_query(total_modules: int) -> Dict[str, Any]:
+    """Enrollment filter matching students who completed every module"""
+    if total_modules <= 0:
+        # An empty mask would match everyone; a course without modules can't be completed
+        return {"_id": {"$exists": False}}
+    if total_modules <= MAX_MASK_MODULES:
+        return {"completed_mask": {"$bitsAllSet": full_mask(total_modules)}}
+    return {"progress_percentage": {"$gte": 100}}
@@ -0,0 +1,254 @@
+"""
+Course purchase verification against indexed events and EdTechDonation.hasPurchased
+
+eth_abi and eth_utils are imported on first use, keeping them out of app
+import time (see blockchain_events).
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from blockchain_events import is_valid_config, rpc_batch
+from config import (
+    CONTRACT_ADDRESS,
+    MULTICALL3_ADDRESS,
+    PURCHASE_CACHE_MAX_ENTRIES,
+    PURCHASE_POSITIVE_TTL_SECONDS,
+    PURCHASE_NEGATIVE_TTL_SECONDS,
+    INDEXER_CONFIRMATIONS
+)
+
+ADDRESS_PATTERN = re.compile(r"^0x[0-9a-fA-F]{40}$")
+# Function selectors: hasPurchased(uint256,address), aggregate3((address,bool,bytes)[])
+HAS_PURCHASED_SELECTOR = bytes.fromhex("dc9da2f8")
+AGGREGATE3_SELECTOR = bytes.fromhex("82ad56cb")
+# Calls per aggregate3; keeps each eth_call well under provider gas caps
+MULTICALL_MAX_CALLS = 500
+# Name the indexer stores on purchases made through CONTRACT_ADDRESS
+CONTRACT_NAME = "EdTechDonation"
+# How long a fetched chain head is reused for confirmed-block reads
+HEAD_CACHE_SECONDS = 2.0
+
+
+def encode_has_purchased(course_id: int, user: str) -> bytes:
+    """Calldata for EdTechDonation.hasPurchased(courseId, user)"""
+    from eth_abi import encode
+    from eth_utils import to_checksum_address
+    return HAS_PURCHASED_SELECTOR + encode(["uint256", "address"], [course_id, to_checksum_address(user)])
+
+
+def encode_aggregate3(target: str, calls: List[bytes]) -> str:
+    """Calldata for Multicall3.aggregate3 with every call allowed to fail"""
+    from eth_abi import encode
+    from eth_utils import to_checksum_address
+    target = to_checksum_address(target)
+    args = encode(["(address,bool,bytes)[]"], [[(target, True, data) for data in calls]])
+    return "0x" + (AGGREGATE3_SELECTOR + args).hex()
+
+
+def decode_bool(data: bytes) -> Optional[bool]:
+    """ABI bool return value, None if the call returned nothing usable"""
+    if len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big") != 0
+
+
+class PurchaseVerifier:
+    """Answers "has this wallet bought this on-chain course?" for many courses at once.
+
+    Lookups go to the cache, then the indexed ``purchases`` collection, and
+    only the remaining courses go to the contract: one Multicall3
+    ``aggregate3`` eth_call for all of them, or one JSON-RPC batch of
+    individual ``hasPurchased`` calls where Multicall3 is not deployed.
+    Calls read the block ``confirmations`` below the head, the depth the
+    event indexer trusts, so a purchase in a block that is later reorged
+    away is never reported. Positive answers are cached for
+    ``positive_ttl_seconds``; negative ones expire after
+    ``negative_ttl_seconds`` so a new purchase shows up quickly.
+    """
+
+    def __init__(self, contract_address: Optional[str], multicall_address: Optional[str],
+                 max_entries: int = 100000, negative_ttl_seconds: int = 30,
+                 positive_ttl_seconds: int = 3600, confirmations: int = 0):
+        self.contract_address = contract_address if contract_address and ADDRESS_PATTERN.match(contract_address) else None
+        self.multicall_address = multicall_address if multicall_address and ADDRESS_PATTERN.match(multicall_address) else None
+        self.max_entries = max_entries
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.positive_ttl_seconds = positive_ttl_seconds
+        self.confirmations = max(0, confirmations)
+        # (wallet, course id) -> (expiry, purchased)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, bool]]" = OrderedDict()
+        # (monotonic time fetched, confirmed block tag)
+        self._confirmed_block: Optional[Tuple[float, str]] = None
+        self.multicall_available = self.multicall_address is not None
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.chain_lookups = 0
+        self.multicall_requests = 0
+        self.fallback_requests = 0
+        self.chain_errors = 0
+        self.last_error: Optional[str] = None
+
+    def get_cached(self, user: str, course_id: int) -> Optional[bool]:
+        """Cached answer or None"""
+        key = (user, course_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, purchased = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return purchased
+
+    def remember(self, user: str, course_id: int, purchased: bool) -> None:
+        """Cache an answer for ``positive_ttl_seconds`` or ``negative_ttl_seconds``"""
+        ttl = self.positive_ttl_seconds if purchased else self.negative_ttl_seconds
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        expires_at = time.monotonic() + ttl
+        self._entries[(user, course_id)] = (expires_at, purchased)
+        self._entries.move_to_end((user, course_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def confirmed_block(self) -> str:
+        """Block tag ``confirmations`` below the chain head"""
+        if self.confirmations == 0:
+            return "latest"
+        cached = self._confirmed_block
+        if cached is not None and time.monotonic() - cached[0] < HEAD_CACHE_SECONDS:
+            return cached[1]
+        (head,) = await rpc_batch([("eth_blockNumber", [])])
+        tag = hex(max(0, int(head, 16) - self.confirmations))
+        self._confirmed_block = (time.monotonic(), tag)
+        return tag
+
+    async def _multicall(self, user: str, course_ids: List[int], block: str) -> Dict[int, Optional[bool]]:
+        from eth_abi import decode
+        chunks = [course_ids[i:i + MULTICALL_MAX_CALLS] for i in range(0, len(course_ids), MULTICALL_MAX_CALLS)]
+        calls = [
+            ("eth_call", [{
+                "to": self.multicall_address,
+                "data": encode_aggregate3(self.contract_address, [encode_has_purchased(c, user) for c in chunk])
+            }, block])
+            for chunk in chunks
+        ]
+        self.multicall_requests += 1
+        responses = await rpc_batch(calls)
+
+        results: Dict[int, Optional[bool]] = {}
+        for chunk, response in zip(chunks, responses):
+            data = bytes.fromhex(response[2:])
+            if not data:
+                # No code at the Multicall3 address on this chain
+                self.multicall_available = False
+                raise RuntimeError(f"Multicall3 not deployed at {self.multicall_address}")
+            (entries,) = decode(["(bool,bytes)[]"], data)
+            for course_id, (success, return_data) in zip(chunk, entries):
+                results[course_id] = decode_bool(return_data) if success else None
+        return results
+
+    async def _individual(self, user: str, course_ids: List[int], block: str) -> Dict[int, Optional[bool]]:
+        self.fallback_requests += 1
+        responses = await rpc_batch([
+            ("eth_call", [{"to": self.contract_address, "data": "0x" + encode_has_purchased(c, user).hex()}, block])
+            for c in course_ids
+        ])
+        return {c: decode_bool(bytes.fromhex(r[2:])) for c, r in zip(course_ids, responses)}
+
+    async def check_chain(self, user: str, course_ids: List[int]) -> Dict[int, Optional[bool]]:
+        """Ask the contract; None for courses that could not be answered"""
+        if not course_ids or self.contract_address is None or not is_valid_config():
+            return {c: None for c in course_ids}
+        self.chain_lookups += len(course_ids)
+        try:
+            block = await self.confirmed_block()
+            if self.multicall_available:
+                try:
+                    return await self._multicall(user, course_ids, block)
+                except Exception as e:
+                    print(f"[PurchaseVerifier] ⚠️  Multicall failed, falling back to batched calls: {e}")
+            return await self._individual(user, course_ids, block)
+        except Exception as e:
+            self.chain_errors += 1
+            self.last_error = str(e)
+            print(f"[PurchaseVerifier] Error checking purchases on chain: {e}")
+            return {c: None for c in course_ids}
+
+    async def verify_many(self, db, user: str, course_ids: Iterable[int]) -> Dict[int, bool]:
+        """Map each course id to whether ``user`` has purchased it"""
+        user = user.lower()
+        results: Dict[int, bool] = {}
+        missing = []
+        for course_id in dict.fromkeys(course_ids):
+            cached = self.get_cached(user, course_id)
+            if cached is None:
+                missing.append(course_id)
+            else:
+                results[course_id] = cached
+        self.hits += len(results)
+        self.misses += len(missing)
+        if not missing:
+            return results
+
+        # HardwareCourses purchases share course ids but are different courses
+        cursor = db.purchases.find(
+            {"contract": CONTRACT_NAME, "buyer": user, "courseId": {"$in": missing}},
+            {"courseId": 1, "_id": 0}
+        )
+        indexed = {doc["courseId"] async for doc in cursor}
+        self.db_hits += len(indexed)
+        for course_id in indexed:
+            self.remember(user, course_id, True)
+            results[course_id] = True
+
+        on_chain = await self.check_chain(user, [c for c in missing if c not in indexed])
+        for course_id, purchased in on_chain.items():
+            if purchased is not None:
+                self.remember(user, course_id, purchased)
+            # Unanswered (RPC down, call reverted) is reported as not purchased, uncached
+            results[course_id] = bool(purchased)
+        return results
+
+    async def verify(self, db, user: str, course_id: int) -> bool:
+        """Whether ``user`` has purchased ``course_id``"""
+        return (await self.verify_many(db, user, [course_id]))[course_id]
+
+    def stats(self) -> Dict[str, object]:
+        """Return cache and lookup counters"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "positive_ttl_seconds": self.positive_ttl_seconds,
+            "negative_ttl_seconds": self.negative_ttl_seconds,
+            "confirmations": self.confirmations,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "db_hits": self.db_hits,
+            "chain_lookups": self.chain_lookups,
+            "multicall_available": self.multicall_available,
+            "multicall_requests": self.multicall_requests,
+            "fallback_requests": self.fallback_requests,
+            "chain_errors": self.chain_errors,
+            "last_error": self.last_error
+        }
+
+
+# Global purchase verifier instance
+purchase_verifier = PurchaseVerifier(
+    CONTRACT_ADDRESS,
+    MULTICALL3_ADDRESS,
+    max_entries=PURCHASE_CACHE_MAX_ENTRIES,
+    negative_ttl_seconds=PURCHASE_NEGATIVE_TTL_SECONDS,
+    positive_ttl_seconds=PURCHASE_POSITIVE_TTL_SECONDS,
+    confirmations=INDEXER_CONFIRMATIONS
+)
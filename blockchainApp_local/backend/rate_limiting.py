@@ -0,0 +1,413 @@
+"""
+Fixed-memory rate limiting engine, pluggable backends and ASGI middleware
+"""
+import abc
+import os
+import errno
+import mmap
+import asyncio
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+from config import (
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_SHM_PATH,
+    RATE_LIMIT_SHM_SLOTS
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: the shared-memory backend is unavailable
+    fcntl = None  # type: ignore
+
+
+class RateLimiter:
+    """Token-bucket rate limiter with O(1) checks and bounded memory.
+
+    Each key holds a single ``[tokens, last_refill, window]`` entry instead
+    of a list of timestamps. Keys are kept in LRU order so idle buckets are
+    swept from the front and the table never grows beyond ``max_keys``.
+    """
+
+    def __init__(self, max_keys: int = 100000, sweep_interval: float = 30.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def hit(self, key: str, max_requests: int = 10, window_seconds: int = 60) -> Tuple[bool, float]:
+        """Consume one token; return (allowed, seconds until next token)"""
+        now = time.monotonic()
+        rate = max_requests / window_seconds
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(max_requests), now, float(window_seconds)]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(max_requests), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                self.allowed += 1
+                return True, 0.0
+
+            self.limited += 1
+            return False, (1.0 - bucket[0]) / rate
+
+    def is_allowed(self, key: str, max_requests: int = 10, window_seconds: int = 60) -> bool:
+        """Check if request is allowed based on rate limiting"""
+        allowed, _ = self.hit(key, max_requests, window_seconds)
+        return allowed
+
+    def stats(self) -> Dict[str, int]:
+        """Return limiter counters"""
+        return {
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions
+        }
+
+    def _sweep(self, now: float) -> None:
+        """Drop buckets idle for a full window (lock must be held).
+
+        A bucket idle for its whole window has refilled, so dropping it is
+        indistinguishable from keeping it. Buckets are in LRU order, so the
+        sweep stops at the first one that is still active.
+        """
+        self._last_sweep = now
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket[1] < bucket[2]:
+                break
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+
+
+class RateLimitBackend(abc.ABC):
+    """Interface for rate limit storage.
+
+    ``hit`` consumes one request for ``key`` and returns
+    ``(allowed, retry_after_seconds)``. Backends that need the database
+    receive it through ``startup`` once the app has connected.
+    """
+
+    name = "base"
+
+    async def startup(self, db: Any = None) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def hit(self, key: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        """Consume one request for ``key``; return (allowed, retry_after_seconds)"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process token buckets (single worker deployments)"""
+
+    name = "memory"
+
+    def __init__(self, limiter: Optional[RateLimiter] = None):
+        self.limiter = limiter or RateLimiter(max_keys=RATE_LIMIT_MAX_KEYS)
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        return self.limiter.hit(key, max_requests, window_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.limiter.stats()}
+
+
+class SharedMemoryRateLimitBackend(RateLimitBackend):
+    """Token buckets in an mmap'd file shared by every worker on the host.
+
+    The file is a set-associative hash table: a key hash selects a group of
+    ``GROUP_SIZE`` slots and the key lives in one slot of that group. Each
+    group is guarded by an fcntl byte-range lock, so workers only contend
+    when they touch the same group. When a group is full the least recently
+    used slot is recycled, which keeps memory fixed at ``slots`` entries.
+    """
+
+    name = "shared_memory"
+
+    MAGIC = b"EDRL0001"
+    HEADER = struct.Struct("<8sQ")
+    SLOT = struct.Struct("<Qddd")  # key hash, tokens, last refill, window
+    GROUP_SIZE = 8
+    # Pause between attempts while another process holds a group lock
+    LOCK_RETRY_SECONDS = 0.0005
+
+    def __init__(self, path: str, slots: int = 65536):
+        if fcntl is None:
+            raise RuntimeError("Shared-memory rate limiting requires fcntl (POSIX)")
+
+        self.path = path
+        self.groups = max(1, slots // self.GROUP_SIZE)
+        self.slots = self.groups * self.GROUP_SIZE
+        self._group_bytes = self.SLOT.size * self.GROUP_SIZE
+        self._size = self.HEADER.size + self.slots * self.SLOT.size
+        self._thread_lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != self._size or os.pread(self._fd, 8, 0) != self.MAGIC:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.slots), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, self._size)
+
+    @staticmethod
+    def _hash_key(key: str) -> int:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        return digest or 1  # 0 marks an empty slot
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        # Never wait on the lock inside the event loop: try, and yield while it is held elsewhere
+        while True:
+            try:
+                return self._hit(key, max_requests, window_seconds, blocking=False)
+            except BlockingIOError:
+                await asyncio.sleep(self.LOCK_RETRY_SECONDS)
+
+    def _hit(self, key: str, max_requests: int, window_seconds: int, blocking: bool = True) -> Tuple[bool, float]:
+        key_hash = self._hash_key(key)
+        group_offset = self.HEADER.size + (key_hash % self.groups) * self._group_bytes
+        now = time.time()
+        rate = max_requests / window_seconds
+
+        if not self._thread_lock.acquire(blocking):
+            raise BlockingIOError("rate limit group busy")
+        try:
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB,
+                            self._group_bytes, group_offset)
+            except OSError as e:
+                if e.errno in (errno.EACCES, errno.EAGAIN):
+                    raise BlockingIOError("rate limit group busy") from e
+                raise
+            try:
+                target = None
+                victim = group_offset
+                victim_last = float("inf")
+                for slot in range(self.GROUP_SIZE):
+                    offset = group_offset + slot * self.SLOT.size
+                    slot_hash, tokens, last, window = self.SLOT.unpack_from(self._map, offset)
+                    if slot_hash == key_hash:
+                        target = offset
+                        tokens = min(float(max_requests), tokens + (now - last) * rate)
+                        break
+                    if slot_hash == 0 or now - last >= window:
+                        last = float("-inf")  # free or idle slots are reused first
+                    if last < victim_last:
+                        victim, victim_last = offset, last
+
+                if target is None:
+                    if victim_last != float("-inf"):
+                        self.evictions += 1
+                    target = victim
+                    tokens = float(max_requests)
+
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                self.SLOT.pack_into(self._map, target, key_hash, tokens, now, float(window_seconds))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._group_bytes, group_offset)
+        finally:
+            self._thread_lock.release()
+
+        if allowed:
+            self.allowed += 1
+            return True, 0.0
+        self.limited += 1
+        return False, (1.0 - tokens) / rate
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "slots": self.slots,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions
+        }
+
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """Sliding-window counters in MongoDB, shared by every node.
+
+    Each (key, window) pair is one counter document that expires through a
+    TTL index. The previous window's count is weighted by how much of it
+    still overlaps the sliding window, which approximates a true sliding
+    log with two small documents per key.
+    """
+
+    name = "mongo"
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+        self.collection = None
+        self.allowed = 0
+        self.limited = 0
+
+    async def startup(self, db: Any = None) -> None:
+        self.collection = db[self.collection_name]
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def hit(self, key: str, max_requests: int, window_seconds: int) -> Tuple[bool, float]:
+        if self.collection is None:
+            return True, 0.0
+
+        now = time.time()
+        window_index = int(now // window_seconds)
+        elapsed_fraction = (now % window_seconds) / window_seconds
+
+        current = await self.collection.find_one_and_update(
+            {"_id": f"{key}:{window_index}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {
+                    "expires_at": datetime.utcfromtimestamp((window_index + 2) * window_seconds)
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        previous = await self.collection.find_one({"_id": f"{key}:{window_index - 1}"}, {"count": 1})
+        previous_count = previous["count"] if previous else 0
+
+        estimated = current["count"] + previous_count * (1.0 - elapsed_fraction)
+        if estimated <= max_requests:
+            self.allowed += 1
+            return True, 0.0
+
+        self.limited += 1
+        return False, window_seconds * (1.0 - elapsed_fraction)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "allowed": self.allowed, "limited": self.limited}
+
+
+def create_rate_limit_backend(name: str) -> RateLimitBackend:
+    """Build the configured backend, falling back to in-process memory"""
+    if name == "shared_memory":
+        path = RATE_LIMIT_SHM_PATH or os.path.join(
+            "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+            "edtech_rate_limits"
+        )
+        try:
+            return SharedMemoryRateLimitBackend(path, slots=RATE_LIMIT_SHM_SLOTS)
+        except Exception as e:
+            print(f"[RateLimit] ⚠️  Shared-memory backend unavailable ({e}), using in-memory limits")
+    elif name == "mongo":
+        return MongoRateLimitBackend()
+    return MemoryRateLimitBackend(rate_limiter)
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Rate limit applied to requests whose path starts with ``path_prefix``"""
+    name: str
+    path_prefix: str
+    max_requests: int
+    window_seconds: int
+    methods: Optional[Tuple[str, ...]] = None
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return path.startswith(self.path_prefix)
+
+
+# Policies are matched in order; the first match wins
+DEFAULT_POLICIES = [
+    RateLimitPolicy("auth_login", "/api/auth/login", max_requests=10, window_seconds=60, methods=("POST",)),
+    RateLimitPolicy("auth_register", "/api/auth/register", max_requests=5, window_seconds=300, methods=("POST",)),
+    RateLimitPolicy("catalog_read", "/api/courses", max_requests=300, window_seconds=60, methods=("GET", "HEAD")),
+    RateLimitPolicy("media_read", "/api/media", max_requests=600, window_seconds=60, methods=("GET", "HEAD")),
+    RateLimitPolicy("media_upload", "/api/upload", max_requests=30, window_seconds=60),
+    RateLimitPolicy("api_default", "/api", max_requests=120, window_seconds=60),
+]
+
+
+class RateLimitMiddleware:
+    """Per-route, per-client rate limiting middleware"""
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None, policies: Optional[List[RateLimitPolicy]] = None):
+        self.app = app
+        self.backend = backend or rate_limit_backend
+        self.policies = policies if policies is not None else DEFAULT_POLICIES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        policy = next((p for p in self.policies if p.matches(method, path)), None)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_host = client[0] if client else "unknown"
+        allowed, retry_after = await self.backend.hit(
+            f"{policy.name}:{client_host}", policy.max_requests, policy.window_seconds
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse(
+            status_code=429,
+            content={
+                "error": "HTTP 429",
+                "message": "Too many requests, please slow down",
+                "timestamp": datetime.utcnow().isoformat()
+            },
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+        )
+        await response(scope, receive, send)
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter(max_keys=RATE_LIMIT_MAX_KEYS)
+
+# Backend used by the middleware (memory, shared_memory or mongo)
+rate_limit_backend = create_rate_limit_backend(RATE_LIMIT_BACKEND)
@@ -1,17 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import os
 from models import User, UserCreate, UserLogin
 from typing import Optional
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from principal_cache import principal_cache
+from migrations import unique_index_confirmed
+from password_hashing import password_hasher, pwd_context
 
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_THIS_TO_A_STRONG_RANDOM_SECRET_KEY_MINIMUM_32_CHARACTERS")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
@@ -23,6 +25,12 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await password_hasher.hash(password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -42,8 +50,14 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    token = credentials.credentials
+    
+    # Repeat requests from the same session skip JWT decoding and the users lookup
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
@@ -56,11 +70,12 @@ async def get_current_user(
     
     # Fetch user from database
     user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if user is None:
+    if user is None or not user.get("is_active", True):
         raise credentials_exception
     
     # Convert ObjectId to string for response
     user["_id"] = str(user["_id"])
+    principal_cache.set(token, user, token_exp=payload.get("exp"))
     return user
 
 @router.post("/register")
@@ -68,23 +83,20 @@ async def register_user(user: UserCreate, request: Request):
     """Register a new user"""
     db = request.app.mongodb  # type: ignore
     
-    # Check if user already exists
-    existing_user = await db.users.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=400,
-            detail="User with this email already exists"
-        )
-    
-    existing_username = await db.users.find_one({"username": user.username})
-    if existing_username:
-        raise HTTPException(
-            status_code=400,
-            detail="Username already taken"
-        )
+    # Without confirmed unique indexes (e.g. legacy duplicates blocked the
+    # build) DuplicateKeyError cannot be relied on, so check up front
+    if not unique_index_confirmed("users", "email_unique"):
+        if await db.users.find_one({"email": user.email}, {"_id": 1}):
+            raise HTTPException(
+                status_code=400,
+                detail="User with this email already exists"
+            )
+    if not unique_index_confirmed("users", "username_unique"):
+        if await db.users.find_one({"username": user.username}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Username already taken")
     
-    # Hash the password
-    hashed_password = get_password_hash(user.password)
+    # Hash the password off the event loop
+    hashed_password = await get_password_hash_async(user.password)
     
     # Create user document
     user_doc = {
@@ -98,8 +110,17 @@ async def register_user(user: UserCreate, request: Request):
         "is_active": True
     }
     
-    # Save to MongoDB
-    result = await db.users.insert_one(user_doc)
+    # Save to MongoDB; unique indexes on email and username reject duplicates
+    try:
+        result = await db.users.insert_one(user_doc)
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        if "username" in key_pattern:
+            raise HTTPException(status_code=400, detail="Username already taken")
+        raise HTTPException(
+            status_code=400,
+            detail="User with this email already exists"
+        )
     
     return {
         "message": "User registered successfully",
@@ -120,8 +141,8 @@ async def login_user(user_credentials: UserLogin, request: Request):
             detail="Invalid email or password"
         )
     
-    # Verify password
-    if not verify_password(user_credentials.password, user["hashed_password"]):
+    # Verify password off the event loop
+    if not await verify_password_async(user_credentials.password, user["hashed_password"]):
         raise HTTPException(
             status_code=401,
             detail="Invalid email or password"
@@ -160,6 +181,37 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     return current_user
 
 @router.post("/logout")
-async def logout_user(current_user: dict = Depends(get_current_user)):
+async def logout_user(
+    current_user: dict = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Logout user (client-side token removal)"""
+    principal_cache.invalidate_token(credentials.credentials)
     return {"message": "Logged out successfully"}
+
+@router.put("/users/{user_id}/deactivate")
+async def deactivate_user(
+    user_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Deactivate a user account (admin only)"""
+    db = request.app.mongodb  # type: ignore
+    
+    # Verify admin role
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can deactivate users")
+
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    result = await db.users.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"is_active": False}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Drop cached sessions so the change takes effect immediately
+    principal_cache.invalidate_user(user_id)
+    
+    return {"message": "User deactivated successfully"}
@@ -1,61 +1,120 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
+from typing import List, Optional, Dict, Any, Union
 from models import Course, CourseCreate
 from routes.auth import get_current_user
+from catalog_cache import catalog_cache
+from pagination import keyset_filter, keyset_sort, next_cursor
+from progress_bits import MAX_MASK_MODULES, completed_query, full_mask, module_bit
+from purchase_verifier import purchase_verifier
 from bson import ObjectId
+from bson.int64 import Int64
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from migrations import unique_index_confirmed
 from datetime import datetime
 
 router = APIRouter()
 
+# Upper bound on course ids per "owned" badge lookup
+MAX_OWNED_LOOKUP = 200
+
+# Catalog listings only need module titles, order and duration; the
+# multi-kilobyte module bodies are served by get_course_module on demand
+COURSE_SUMMARY_PROJECTION = {
+    "modules.content": 0,
+    "modules.description": 0,
+    "modules.content_url": 0,
+    "modules.video_url": 0,
+    "modules.image_urls": 0
+}
+
+def course_list_projection(view: str) -> Optional[Dict[str, int]]:
+    """Return the projection for a list endpoint's ``view`` parameter"""
+    if view == "summary":
+        return COURSE_SUMMARY_PROJECTION
+    if view == "full":
+        return None
+    raise HTTPException(status_code=400, detail="Invalid view (use 'summary' or 'full')")
+
+def json_response(body: bytes) -> Response:
+    """Wrap pre-serialized catalog JSON in a response"""
+    return Response(content=body, media_type="application/json")
+
 @router.get("/categories")
 async def get_course_categories(request: Request):
-    """Get all available course categories"""
+    """Get all available course categories with per-category aggregates"""
     db = request.app.mongodb
     
-    # Get distinct categories from courses
-    categories = await db.courses.distinct("category", {"is_published": True})
-    
-    # Get course count for each category
-    category_info = []
-    for category in categories:
-        count = await db.courses.count_documents({
-            "category": category, 
-            "is_published": True
-        })
-        category_info.append({
-            "name": category,
-            "count": count
-        })
-    
-    return category_info
+    # One aggregation (served by the is_published/category index) instead of
+    # distinct() plus a count_documents() per category
+    pipeline = [
+        {"$match": {"is_published": True}},
+        {"$group": {
+            "_id": "$category",
+            "count": {"$sum": 1},
+            "total_duration_minutes": {"$sum": {"$sum": "$modules.duration_minutes"}},
+            "total_modules": {"$sum": {"$size": {"$ifNull": ["$modules", []]}}},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "average_rating": {"$avg": "$rating"}
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "name": "$_id",
+            "count": 1,
+            "total_duration_minutes": 1,
+            "total_modules": 1,
+            "min_price": 1,
+            "max_price": 1,
+            "average_rating": {"$round": ["$average_rating", 2]}
+        }}
+    ]
+    
+    async def build():
+        return await db.courses.aggregate(pipeline).to_list(None)
+    
+    return json_response(await catalog_cache.get_or_build(("categories",), build))
 
 @router.get("/featured")
-async def get_featured_courses(request: Request):
+async def get_featured_courses(request: Request, view: str = "summary"):
     """Get featured courses for homepage"""
     db = request.app.mongodb
     
-    # Get featured courses
-    cursor = db.courses.find({
-        "is_published": True,
-        "is_featured": True
-    }).sort("rating", -1).limit(6)
+    projection = course_list_projection(view)
     
-    featured_courses = []
-    async for course in cursor:
-        course["_id"] = str(course["_id"])
-        featured_courses.append(course)
+    async def build():
+        # Get featured courses
+        cursor = db.courses.find({
+            "is_published": True,
+            "is_featured": True
+        }, projection).sort("rating", -1).limit(6)
+        
+        featured_courses = []
+        async for course in cursor:
+            course["_id"] = str(course["_id"])
+            featured_courses.append(course)
+        
+        return featured_courses
     
-    return featured_courses
+    return json_response(await catalog_cache.get_or_build(("featured", view), build))
 
-@router.get("/", response_model=List[Dict[str, Any]])
+@router.get("/", response_model=Union[Dict[str, Any], List[Dict[str, Any]]])
 async def get_courses(
     request: Request,
     category: Optional[str] = None,
     difficulty: Optional[str] = None,
     limit: int = 50,
-    skip: int = 0
+    cursor: Optional[str] = None,
+    skip: int = Query(0, deprecated=True),
+    view: str = "summary"
 ):
-    """Get all courses with optional filtering"""
+    """Get all courses with optional filtering (module bodies only with view=full).
+
+    Pass ``cursor`` (empty for the first page, then the returned
+    ``next_cursor``) to get a ``{"items", "next_cursor"}`` page keyed on
+    ``_id``. Without it the legacy ``skip`` offset list is returned.
+    """
     db = request.app.mongodb
     
     # Build filter
@@ -65,18 +124,41 @@ async def get_courses(
     if difficulty is not None:
         filter_query["difficulty"] = difficulty
     
-    # Get courses from database with modules
-    cursor = db.courses.find(filter_query).skip(skip).limit(limit)
-    courses = []
-    
-    async for course in cursor:
-        course["_id"] = str(course["_id"])
-        # Ensure modules are included
-        if "modules" not in course:
-            course["modules"] = []
-        courses.append(course)
+    projection = course_list_projection(view)
+    if cursor:
+        filter_query = keyset_filter(filter_query, "_id", cursor, descending=False)
+    
+    async def build():
+        # Get courses from database with module summaries
+        if cursor is not None:
+            courses_cursor = db.courses.find(filter_query, projection).sort(keyset_sort("_id", descending=False))
+        else:
+            courses_cursor = db.courses.find(filter_query, projection).skip(skip)
+        page = await courses_cursor.limit(limit).to_list(limit)
+        following = next_cursor(page, limit, "_id")
+        
+        courses = []
+        for course in page:
+            course["_id"] = str(course["_id"])
+            # Ensure modules are included
+            if "modules" not in course:
+                course["modules"] = []
+            courses.append(course)
+        
+        if cursor is not None:
+            return {"items": courses, "next_cursor": following}
+        return courses
     
-    return courses
+    cache_key = ("courses", category, difficulty, limit, cursor, skip, view)
+    return json_response(await catalog_cache.get_or_build(cache_key, build))
+
+def to_object_id(value: Any) -> Optional[ObjectId]:
+    """Normalize a string or ObjectId reference to an ObjectId"""
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
 
 @router.get("/enrolled")
 async def get_enrolled_courses(
@@ -87,36 +169,53 @@ async def get_enrolled_courses(
     db = request.app.mongodb
     
     # Get enrollments
-    cursor = db.enrollments.find({"student_id": current_user["_id"]})
-    enrollments = []
-    
-    async for enrollment in cursor:
-        # Get course details - handle both ObjectId and string formats
-        course_id = enrollment["course_id"]
-        try:
-            # Try to convert to ObjectId if it's not already
-            if isinstance(course_id, str):
-                course_id_obj = ObjectId(course_id)
-            else:
-                course_id_obj = course_id
-                
-            course = await db.courses.find_one({"_id": course_id_obj})
-            
-            if course:
-                course["_id"] = str(course["_id"])
-                enrollment["course"] = course
-                enrollment["_id"] = str(enrollment["_id"])
-                enrollments.append(enrollment)
-            else:
-                # Course not found, skip this enrollment (could be old/deleted course)
-                print(f"Warning: Course {course_id} not found for enrollment {enrollment['_id']}")
-                continue
-                
-        except Exception as e:
-            print(f"Error processing enrollment {enrollment.get('_id', 'unknown')}: {e}")
+    enrollments = await db.enrollments.find({"student_id": current_user["_id"]}).to_list(None)
+    
+    # Enrollments store course_id as either a string or an ObjectId
+    course_ids = {
+        oid for oid in (to_object_id(e.get("course_id")) for e in enrollments) if oid is not None
+    }
+    
+    # Fetch all enrolled courses in one query instead of one find_one per enrollment
+    courses_by_id = {}
+    if course_ids:
+        cursor = db.courses.find({"_id": {"$in": list(course_ids)}}, COURSE_SUMMARY_PROJECTION)
+        async for course in cursor:
+            course["_id"] = str(course["_id"])
+            courses_by_id[course["_id"]] = course
+    
+    enrolled_courses = []
+    for enrollment in enrollments:
+        course = courses_by_id.get(str(enrollment.get("course_id")))
+        if course is None:
+            # Course not found, skip this enrollment (could be old/deleted course)
             continue
+        enrollment["_id"] = str(enrollment["_id"])
+        enrollment["course_id"] = course["_id"]
+        enrollment["course"] = course
+        enrolled_courses.append(enrollment)
     
-    return enrollments
+    return enrolled_courses
+
+@router.get("/owned")
+async def get_owned_courses(
+    request: Request,
+    course_ids: str = Query(..., description="Comma-separated on-chain course IDs"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Purchase status of many on-chain courses at once (catalog "owned" badges)"""
+    db = request.app.mongodb
+    buyer = current_user.get("wallet_address")
+    if not buyer:
+        raise HTTPException(status_code=400, detail="User has no wallet address")
+    ids = [part.strip() for part in course_ids.split(",") if part.strip()]
+    if not ids or not all(part.isdigit() for part in ids):
+        raise HTTPException(status_code=400, detail="Invalid on-chain course ID")
+    if len(ids) > MAX_OWNED_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_OWNED_LOOKUP} course IDs per request")
+    
+    owned = await purchase_verifier.verify_many(db, buyer, [int(part) for part in ids])
+    return {"owned": {str(course_id): purchased for course_id, purchased in owned.items()}}
 
 @router.get("/{course_id}", response_model=Course)
 async def get_course(course_id: str, request: Request):
@@ -133,6 +232,29 @@ async def get_course(course_id: str, request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid course ID")
 
+@router.get("/{course_id}/modules/{order}")
+async def get_course_module(course_id: str, order: int, request: Request):
+    """Get the full content of a single course module"""
+    db = request.app.mongodb
+    
+    try:
+        course_oid = ObjectId(course_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid course ID")
+    
+    # Only the matching module is transferred from MongoDB
+    course = await db.courses.find_one(
+        {"_id": course_oid, "modules.order": order},
+        {"title": 1, "modules": {"$elemMatch": {"order": order}}}
+    )
+    if not course or not course.get("modules"):
+        raise HTTPException(status_code=404, detail="Module not found")
+    
+    module = course["modules"][0]
+    module["course_id"] = course_id
+    module["course_title"] = course.get("title")
+    return module
+
 @router.post("/", response_model=Course)
 async def create_course(
     course: CourseCreate,
@@ -170,6 +292,7 @@ async def create_course(
     
     # Save to database
     result = await db.courses.insert_one(course_doc)
+    catalog_cache.invalidate("create_course")
     
     # Return created course
     created_course = await db.courses.find_one({"_id": result.inserted_id})
@@ -213,6 +336,7 @@ async def update_course(
         {"_id": ObjectId(course_id)},
         {"$set": update_data}
     )
+    catalog_cache.invalidate("update_course")
     
     return {"message": "Course updated successfully"}
 
@@ -236,6 +360,7 @@ async def delete_course(
     
     # Delete course
     await db.courses.delete_one({"_id": ObjectId(course_id)})
+    catalog_cache.invalidate("delete_course")
     
     return {"message": "Course deleted successfully"}
 
@@ -257,15 +382,6 @@ async def enroll_in_course(
     if not course.get("is_published", False):
         raise HTTPException(status_code=400, detail="Course is not published")
     
-    # Check if already enrolled
-    existing_enrollment = await db.enrollments.find_one({
-        "student_id": current_user["_id"],
-        "course_id": course_id
-    })
-    
-    if existing_enrollment:
-        raise HTTPException(status_code=400, detail="Already enrolled in this course")
-    
     # Create enrollment record
     enrollment_doc = {
         "student_id": current_user["_id"],
@@ -273,15 +389,23 @@ async def enroll_in_course(
         "enrolled_at": datetime.utcnow(),
         "status": "active",
         "progress_percentage": 0.0,
-        "completed_modules": []
+        "completed_modules": [],
+        "completed_mask": Int64(0)
     }
     
-    await db.enrollments.insert_one(enrollment_doc)
+    # Until the unique index is confirmed, check for an existing enrollment first
+    if not unique_index_confirmed("enrollments", "student_course_unique"):
+        if await db.enrollments.find_one({"student_id": current_user["_id"], "course_id": course_id}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Already enrolled in this course")
+    
+    # The unique (student_id, course_id) index rejects duplicate enrollments
+    try:
+        await db.enrollments.insert_one(enrollment_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already enrolled in this course")
     
     return {"message": "Enrolled successfully"}
 
-@router.get("/{course_id}/purchased")
-
 @router.get("/{course_id}/progress")
 async def get_course_progress(
     course_id: str,
@@ -300,121 +424,144 @@ async def get_course_progress(
     if not enrollment:
         raise HTTPException(status_code=404, detail="Not enrolled in this course")
     
+    course_oid = to_object_id(course_id)
+    total_modules = await catalog_cache.module_count(db, course_oid) if course_oid else None
+    if total_modules is not None and total_modules <= MAX_MASK_MODULES and "completed_mask" in enrollment:
+        mask = enrollment["completed_mask"]
+        certificate_eligible = total_modules > 0 and mask & full_mask(total_modules) == full_mask(total_modules)
+    else:
+        certificate_eligible = enrollment.get("progress_percentage", 0.0) >= 100
+    
     return {
         "progress_percentage": enrollment.get("progress_percentage", 0.0),
         "completed_modules": enrollment.get("completed_modules", []),
-        "enrolled_at": enrollment["enrolled_at"]
+        "enrolled_at": enrollment["enrolled_at"],
+        "certificate_eligible": certificate_eligible
     }
 
-@router.post("/{course_id}/modules/{module_id}/complete")
-async def complete_module(
+@router.get("/{course_id}/completion-stats")
+async def get_course_completion_stats(
     course_id: str,
-    module_id: int,
     request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Mark a module as completed"""
+    """Per-module completion counts for a course (instructor dashboard)"""
     db = request.app.mongodb
     
-    # Get enrollment
-    enrollment = await db.enrollments.find_one({
-        "student_id": current_user["_id"],
-        "course_id": course_id
-    })
-    
-    if not enrollment:
-        raise HTTPException(status_code=404, detail="Not enrolled in this course")
+    course_oid = to_object_id(course_id)
+    if course_oid is None:
+        raise HTTPException(status_code=400, detail="Invalid course ID")
     
-    # Get course to check module count
-    course = await db.courses.find_one({"_id": ObjectId(course_id)})
+    course = await db.courses.find_one({"_id": course_oid}, {"instructor_id": 1})
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
+    if current_user["role"] != "admin" and str(course.get("instructor_id")) != current_user["_id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to view course statistics")
     
-    total_modules = len(course.get("modules", []))
-    if module_id >= total_modules:
-        raise HTTPException(status_code=400, detail="Invalid module ID")
+    total_modules = await catalog_cache.module_count(db, course_oid)
+    if total_modules is None:
+        # Deleted since the lookup above
+        raise HTTPException(status_code=404, detail="Course not found")
+    tracked_modules = min(total_modules, MAX_MASK_MODULES)
     
-    # Update completed modules
-    completed_modules = enrollment.get("completed_modules", [])
-    if module_id not in completed_modules:
-        completed_modules.append(module_id)
-    
-    # Calculate progress percentage
-    progress_percentage = (len(completed_modules) / total_modules) * 100 if total_modules > 0 else 0
-    
-    # Update enrollment
-    await db.enrollments.update_one(
-        {"_id": enrollment["_id"]},
-        {
-            "$set": {
-                "completed_modules": completed_modules,
-                "progress_percentage": progress_percentage
-            }
-        }
-    )
+    # Every count is a bitwise match on completed_mask, evaluated in one aggregation
+    facets = {
+        "enrolled": [{"$count": "n"}],
+        "completed": [{"$match": completed_query(total_modules)}, {"$count": "n"}]
+    }
+    for module_id in range(tracked_modules):
+        facets[f"m{module_id}"] = [
+            {"$match": {"completed_mask": {"$bitsAllSet": module_bit(module_id)}}},
+            {"$count": "n"}
+        ]
+    
+    result = await db.enrollments.aggregate([
+        {"$match": {"course_id": {"$in": [course_id, course_oid]}}},
+        {"$facet": facets}
+    ]).to_list(1)
+    counts = {key: (value[0]["n"] if value else 0) for key, value in (result[0] if result else {}).items()}
     
-    return {"message": "Module completed", "progress_percentage": progress_percentage}
+    return {
+        "course_id": course_id,
+        "total_modules": total_modules,
+        "enrolled": counts.get("enrolled", 0),
+        "completed": counts.get("completed", 0),
+        "module_completions": [
+            {"module_id": module_id, "completed": counts.get(f"m{module_id}", 0)}
+            for module_id in range(tracked_modules)
+        ]
+    }
 
-@router.get("/enrolled")
-async def get_enrolled_courses(
+@router.post("/{course_id}/modules/{module_id}/complete")
+async def complete_module(
+    course_id: str,
+    module_id: int,
     request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get courses the current user is enrolled in"""
+    """Mark a module as completed.
+
+    A single atomic update: the module is added set-style to
+    completed_modules and progress_percentage is computed from the stored
+    array on the server, so concurrent completions can't overwrite each other.
+    The module's bit in completed_mask is set in the same update.
+    """
     db = request.app.mongodb
     
-    print(f"[ENROLLED COURSES] User ID: {current_user.get('_id', 'unknown')}")
-    print(f"[ENROLLED COURSES] User ID type: {type(current_user.get('_id', 'unknown'))}")
+    course_oid = to_object_id(course_id)
+    if course_oid is None:
+        raise HTTPException(status_code=400, detail="Invalid course ID")
     
-    # Get enrollments
-    cursor = db.enrollments.find({"student_id": current_user["_id"]})
-    enrollments = []
-    
-    enrollment_count = 0
-    async for enrollment in cursor:
-        enrollment_count += 1
-        print(f"[ENROLLED COURSES] Processing enrollment #{enrollment_count}: {enrollment.get('_id', 'unknown')}")
-        print(f"[ENROLLED COURSES] Course ID: {enrollment.get('course_id', 'missing')} (type: {type(enrollment.get('course_id', 'missing'))})")
-        
-        # Get course details - handle both ObjectId and string formats
-        course_id = enrollment["course_id"]
-        try:
-            # Try to convert to ObjectId if it's not already
-            if isinstance(course_id, str):
-                course_id_obj = ObjectId(course_id)
-            else:
-                course_id_obj = course_id
-            
-            print(f"[ENROLLED COURSES] Looking for course with ObjectId: {course_id_obj}")
-                
-            course = await db.courses.find_one({"_id": course_id_obj})
-            
-            if course:
-                print(f"[ENROLLED COURSES] Course found: {course.get('title', 'untitled')}")
-                course["_id"] = str(course["_id"])
-                enrollment["course"] = course
-                enrollment["_id"] = str(enrollment["_id"])
-                enrollments.append(enrollment)
-            else:
-                # Course not found, skip this enrollment (could be old/deleted course)
-                print(f"[ENROLLED COURSES] Warning: Course {course_id} not found for enrollment {enrollment['_id']}")
-                continue
-                
-        except Exception as e:
-            print(f"[ENROLLED COURSES] Error processing enrollment {enrollment.get('_id', 'unknown')}: {e}")
-            print(f"[ENROLLED COURSES] Exception type: {type(e)}")
-            import traceback
-            traceback.print_exc()
-            continue
+    # Module count comes from the catalog cache instead of the full course document
+    total_modules = await catalog_cache.module_count(db, course_oid)
+    if total_modules is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    if module_id < 0 or module_id >= total_modules:
+        raise HTTPException(status_code=400, detail="Invalid module ID")
+    
+    completed = {"$ifNull": ["$completed_modules", []]}
+    pipeline = []
+    if module_id < MAX_MASK_MODULES:
+        # Set the module's bit; evaluated against the list before it changes
+        mask = {"$ifNull": ["$completed_mask", Int64(0)]}
+        pipeline.append({"$set": {"completed_mask": {
+            "$cond": [{"$in": [module_id, completed]}, mask, {"$add": [mask, module_bit(module_id)]}]
+        }}})
+    enrollment = await db.enrollments.find_one_and_update(
+        {"student_id": current_user["_id"], "course_id": course_id},
+        pipeline + [
+            # $addToSet semantics inside an update pipeline (append only if absent)
+            {"$set": {"completed_modules": {
+                "$cond": [
+                    {"$in": [module_id, completed]},
+                    completed,
+                    {"$concatArrays": [completed, [module_id]]}
+                ]
+            }}},
+            {"$set": {"progress_percentage": {
+                "$multiply": [
+                    {"$divide": [{"$min": [{"$size": "$completed_modules"}, total_modules]}, total_modules]},
+                    100
+                ]
+            }}}
+        ],
+        projection={"progress_percentage": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not enrollment:
+        raise HTTPException(status_code=404, detail="Not enrolled in this course")
     
-    print(f"[ENROLLED COURSES] Found {len(enrollments)} valid enrollments out of {enrollment_count} total")
-    return enrollments
+    return {"message": "Module completed", "progress_percentage": enrollment["progress_percentage"]}
 
 @router.get("/{course_id}/purchased")
 async def has_purchased_course(course_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Check the user's wallet against indexed purchases, then the contract"""
     db = request.app.mongodb
     buyer = current_user.get("wallet_address")
     if not buyer:
         raise HTTPException(status_code=400, detail="User has no wallet address")
-    purchase = await db.purchases.find_one({"buyer": buyer.lower(), "courseId": int(course_id)})
-    return {"purchased": bool(purchase)}
+    if not course_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid on-chain course ID")
+    return {"purchased": await purchase_verifier.verify(db, buyer, int(course_id))}
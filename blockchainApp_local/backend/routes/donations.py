@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List, Optional
-from models import Donation, DonationCreate, DonationStatus
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from typing import List, Optional, Union
+from models import Donation, DonationCreate, DonationStatus, DonationPage
 from routes.auth import get_current_user
+from pagination import keyset_filter, keyset_sort, next_cursor
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta
 import re
-from web3 import Web3
 
 router = APIRouter()
 
@@ -21,15 +22,21 @@ def validate_donation_amount(amount_eth: float) -> bool:
         return False
     return 0.000001 <= amount_eth <= 1000.0  # Minimum 0.000001 ETH (1 Gwei)
 
-@router.get("/", response_model=List[Donation])
+@router.get("/", response_model=Union[DonationPage, List[Donation]])
 async def get_donations(
     request: Request,
     status: Optional[DonationStatus] = None,
     limit: int = 20,
-    skip: int = 0,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, deprecated=True),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get donations (filtered by user role)"""
+    """Get donations (filtered by user role), newest first.
+
+    Pass ``cursor`` (empty for the first page, then the returned
+    ``next_cursor``) to get a ``{"items", "next_cursor"}`` page. Without it
+    the legacy ``skip`` offset list is returned.
+    """
     db = request.app.mongodb
     
     # Build filter based on user role
@@ -48,11 +55,21 @@ async def get_donations(
     if status:
         filter_query["status"] = status
     
+    if cursor is not None:
+        # Keyset pagination on (created_at, _id)
+        if cursor:
+            filter_query = keyset_filter(filter_query, "created_at", cursor)
+        page = await db.donations.find(filter_query).sort(keyset_sort("created_at")).limit(limit).to_list(limit)
+        following = next_cursor(page, limit, "created_at")
+        for donation in page:
+            donation["_id"] = str(donation["_id"])
+        return {"items": page, "next_cursor": following}
+    
     # Get donations from database
-    cursor = db.donations.find(filter_query).sort("created_at", -1).skip(skip).limit(limit)
+    donations_cursor = db.donations.find(filter_query).sort("created_at", -1).skip(skip).limit(limit)
     donations = []
     
-    async for donation in cursor:
+    async for donation in donations_cursor:
         donation["_id"] = str(donation["_id"])
         donations.append(donation)
     
@@ -102,11 +119,6 @@ async def create_donation(
     if not validate_transaction_hash(donation.transaction_hash):
         raise HTTPException(status_code=400, detail="Invalid transaction hash format")
     
-    # Check if transaction hash already exists
-    existing_donation = await db.donations.find_one({"transaction_hash": donation.transaction_hash})
-    if existing_donation:
-        raise HTTPException(status_code=400, detail="Transaction hash already recorded")
-    
     # Get current ETH price (simplified - in production use real API)
     eth_to_usd_rate = 2000.0  # Should be fetched from price API
     
@@ -123,8 +135,16 @@ async def create_donation(
         "confirmed_at": None
     }
     
-    # Save to database
-    result = await db.donations.insert_one(donation_doc)
+    # Events synced from the chain are keyed on (transaction_hash, log_index),
+    # so the unique index alone doesn't catch a hash the indexer already stored
+    if await db.donations.find_one({"transaction_hash": donation.transaction_hash}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Transaction hash already recorded")
+    
+    # Save to database; the unique index rejects concurrent duplicates
+    try:
+        result = await db.donations.insert_one(donation_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Transaction hash already recorded")
     
     # Return created donation
     created_donation = await db.donations.find_one({"_id": result.inserted_id})
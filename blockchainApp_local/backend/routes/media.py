@@ -1,14 +1,19 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request, Query
 from fastapi.responses import FileResponse
-from typing import List, Optional
-import os
-import uuid
-import shutil
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, List, Optional
+import asyncio
 from PIL import Image
-import io
-import hashlib
 from pathlib import Path
+from bson import ObjectId
+from pymongo import ReturnDocument
 from routes.auth import get_current_user
+from principal_cache import principal_cache
+from image_pipeline import MAX_IMAGE_DIMENSION, RENDITION_ENCODINGS
+from upload_stream import iter_upload_file
+from media_store import StoredObject, choose_rendition, media_store, preferred_format
+from transform_cache import transform_cache
+from config import RENDITION_WIDTHS
 
 router = APIRouter()
 
@@ -16,8 +21,6 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads")
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-THUMBNAIL_SIZE = (300, 200)
-MAX_IMAGE_DIMENSION = 2048
 
 # Create upload directory if it doesn't exist
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -39,36 +42,64 @@ def validate_image(file: UploadFile) -> None:
             detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
         )
 
-def create_thumbnail(image_path: Path, thumbnail_path: Path) -> None:
-    """Create a thumbnail from the original image"""
-    try:
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary (for PNG with transparency)
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # Create thumbnail
-            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            img.save(thumbnail_path, "JPEG", quality=85, optimize=True)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating thumbnail: {str(e)}")
+def remove_files(*paths: Path) -> None:
+    """Delete whatever an upload left behind"""
+    for path in paths:
+        if path.exists():
+            path.unlink()
 
-def optimize_image(image_path: Path) -> None:
-    """Optimize image size and quality"""
+async def store_image(request: Request, chunks: AsyncIterator[bytes], owner_id: str) -> StoredObject:
+    """Stream an upload into the content-addressed media store.
+
+    The upload is written to disk chunk by chunk, so memory use does not
+    grow with the file size. Known content gets another reference to the
+    existing blob without being optimized again.
+    """
     try:
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            
-            # Resize if too large
-            if img.width > MAX_IMAGE_DIMENSION or img.height > MAX_IMAGE_DIMENSION:
-                img.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            img.save(image_path, "JPEG", quality=85, optimize=True)
+        return await media_store.store(request.app.mongodb, chunks, MAX_FILE_SIZE, owner_id)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error optimizing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+def object_response(stored: StoredObject) -> dict:
+    """Upload response for a stored object; hash and size are of the optimized file"""
+    return {
+        "success": True,
+        "filename": f"{stored.sha256}.jpg",
+        **media_store.urls(stored.sha256),
+        "file_hash": stored.sha256,
+        "file_size": stored.size,
+        "deduplicated": stored.deduplicated
+    }
+
+def snap_dimension(value: Optional[int]) -> Optional[int]:
+    """Round a requested size up to the next RENDITION_WIDTHS step.
+
+    None (no limit) above the largest step. Keeps the number of variants
+    per image small, so arbitrary sizes share cache entries and cannot be
+    used to queue unbounded transforms.
+    """
+    return min((rw for rw in RENDITION_WIDTHS if value is not None and rw >= value), default=None)
+
+async def release_media_url(db, url: str, owner_id: str) -> Optional[int]:
+    """Give up the image behind a media URL.
+
+    Store objects lose one of ``owner_id``'s references (the blob goes
+    with the last one); legacy per-upload files are deleted. Returns the
+    remaining reference count for store objects.
+    """
+    if url.startswith("/api/media/objects/"):
+        name = url.rsplit("/", 1)[-1]
+        if media_store.resolve(name) is None:
+            return None
+        return await media_store.release(db, name.split(".")[0], owner_id)
+    if url.startswith("/api/media/profiles/"):
+        filename = url.rsplit("/", 1)[-1]
+        if filename.startswith("."):
+            return None
+        remove_files(UPLOAD_DIR / "profiles" / filename, UPLOAD_DIR / "thumbnails" / f"thumb_{filename}")
+    return None
 
 @router.post("/upload/course-thumbnail")
 async def upload_course_thumbnail(
@@ -79,44 +110,34 @@ async def upload_course_thumbnail(
     """Upload course thumbnail image"""
     validate_image(file)
     
-    # Generate unique filename
-    file_extension = file.filename.split(".")[-1] if file.filename else "jpg"
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = UPLOAD_DIR / "courses" / unique_filename
-    thumbnail_path = UPLOAD_DIR / "thumbnails" / f"thumb_{unique_filename}"
+    return object_response(await store_image(request, iter_upload_file(file), current_user["_id"]))
+
+@router.post("/upload/course-thumbnail/stream")
+async def upload_course_thumbnail_stream(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload course thumbnail image sent as the raw request body.
+
+    Multipart uploads are spooled in full by the form parser before the
+    handler runs; here the body is consumed as it arrives, so an oversized
+    upload is cut off after MAX_FILE_SIZE bytes.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_IMAGE_TYPES)}"
+        )
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+        )
     
-    try:
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Optimize original image
-        optimize_image(file_path)
-        
-        # Create thumbnail
-        create_thumbnail(file_path, thumbnail_path)
-        
-        # Generate file hash for integrity
-        with open(file_path, "rb") as f:
-            file_hash = hashlib.sha256(f.read()).hexdigest()
-        
-        return {
-            "success": True,
-            "filename": unique_filename,
-            "url": f"/api/media/courses/{unique_filename}",
-            "thumbnail_url": f"/api/media/thumbnails/thumb_{unique_filename}",
-            "file_hash": file_hash,
-            "file_size": os.path.getsize(file_path)
-        }
-        
-    except Exception as e:
-        # Cleanup on error
-        if file_path.exists():
-            file_path.unlink()
-        if thumbnail_path.exists():
-            thumbnail_path.unlink()
-        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    return object_response(await store_image(request, request.stream(), current_user["_id"]))
 
 @router.post("/upload/profile-avatar")
 async def upload_profile_avatar(
@@ -127,98 +148,70 @@ async def upload_profile_avatar(
     """Upload user profile avatar"""
     validate_image(file)
     
-    # Generate filename based on user ID
-    file_extension = file.filename.split(".")[-1] if file.filename else "jpg"
-    unique_filename = f"avatar_{current_user['_id']}.{file_extension}"
-    file_path = UPLOAD_DIR / "profiles" / unique_filename
-    thumbnail_path = UPLOAD_DIR / "thumbnails" / f"thumb_{unique_filename}"
+    db = request.app.mongodb
+    stored = await store_image(request, iter_upload_file(file), current_user["_id"])
+    urls = media_store.urls(stored.sha256)
     
     try:
-        # Remove existing avatar if it exists
-        if file_path.exists():
-            file_path.unlink()
-        if thumbnail_path.exists():
-            thumbnail_path.unlink()
-        
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # Optimize original image
-        optimize_image(file_path)
-        
-        # Create thumbnail
-        create_thumbnail(file_path, thumbnail_path)
-        
-        # Update user profile in database
-        if request:
-            db = request.app.mongodb
-            await db.users.update_one(
-                {"_id": current_user["_id"]},
-                {"$set": {"avatar_url": f"/api/media/profiles/{unique_filename}"}}
-            )
-        
-        return {
-            "success": True,
-            "filename": unique_filename,
-            "url": f"/api/media/profiles/{unique_filename}",
-            "thumbnail_url": f"/api/media/thumbnails/thumb_{unique_filename}"
-        }
-        
+        previous = await db.users.find_one_and_update(
+            {"_id": ObjectId(current_user["_id"])},
+            {"$set": {"avatar_url": urls["url"]}},
+            projection={"avatar_url": 1},
+            return_document=ReturnDocument.BEFORE
+        )
     except Exception as e:
-        # Cleanup on error
-        if file_path.exists():
-            file_path.unlink()
-        if thumbnail_path.exists():
-            thumbnail_path.unlink()
+        await media_store.release(db, stored.sha256, current_user["_id"])
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    principal_cache.invalidate_user(current_user["_id"])
+    
+    # Drop the reference held by the previous avatar
+    previous_url = (previous or {}).get("avatar_url") or ""
+    if previous_url != urls["url"]:
+        await release_media_url(db, previous_url, current_user["_id"])
+    
+    return {
+        "success": True,
+        "filename": f"{stored.sha256}.jpg",
+        **urls
+    }
 
 @router.post("/upload/multiple")
 async def upload_multiple_images(
+    request: Request,
     files: List[UploadFile] = File(...),
     current_user: dict = Depends(get_current_user),
     folder: str = "courses"
 ):
-    """Upload multiple images at once"""
+    """Upload multiple images at once
+
+    ``folder`` is accepted for compatibility; all uploads share the
+    content-addressed store.
+    """
     if len(files) > 10:
         raise HTTPException(status_code=400, detail="Maximum 10 files allowed")
     
-    results = []
-    for file in files:
+    async def process(file: UploadFile) -> dict:
         try:
             validate_image(file)
+            stored = await store_image(request, iter_upload_file(file), current_user["_id"])
             
-            # Generate unique filename
-            file_extension = file.filename.split(".")[-1] if file.filename else "jpg"
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            file_path = UPLOAD_DIR / folder / unique_filename
-            thumbnail_path = UPLOAD_DIR / "thumbnails" / f"thumb_{unique_filename}"
-            
-            # Save uploaded file
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # Optimize and create thumbnail
-            optimize_image(file_path)
-            create_thumbnail(file_path, thumbnail_path)
-            
-            results.append({
+            return {
                 "filename": file.filename,
-                "unique_filename": unique_filename,
-                "url": f"/api/media/{folder}/{unique_filename}",
-                "thumbnail_url": f"/api/media/thumbnails/thumb_{unique_filename}",
+                "unique_filename": f"{stored.sha256}.jpg",
+                **media_store.urls(stored.sha256),
+                "deduplicated": stored.deduplicated,
                 "success": True
-            })
+            }
             
         except Exception as e:
-            results.append({
+            return {
                 "filename": file.filename,
-                "error": str(e),
+                "error": e.detail if isinstance(e, HTTPException) else str(e),
                 "success": False
-            })
+            }
     
+    # Files are processed concurrently; the pipeline bounds how many run at once
+    results = await asyncio.gather(*(process(file) for file in files))
     return {"results": results}
 
 # Serve uploaded files
@@ -238,6 +231,110 @@ async def serve_profile_image(filename: str):
         raise HTTPException(status_code=404, detail="Image not found")
     return FileResponse(file_path)
 
+@router.get("/media/objects/{filename}")
+async def serve_object(
+    request: Request,
+    filename: str,
+    w: Optional[int] = Query(None, ge=1, le=MAX_IMAGE_DIMENSION)
+):
+    """Serve content-addressed images, their thumbnails and renditions
+
+    For an original (``<sha256>.jpg``) the response is the best rendition
+    for the client: AVIF, WebP or JPEG by the Accept header, and the
+    smallest width of at least ``w`` pixels. Without eager renditions the
+    variant is produced on first request through the transform cache, at
+    the next RENDITION_WIDTHS width; with them, the original is served
+    (cacheable only briefly) until they have been generated.
+    """
+    file_path = media_store.resolve(filename)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # The name is the content hash, so the response never changes
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+    media_type = None
+    background = None
+    sha256 = media_store.original_hash(filename)
+    if sha256 is not None:
+        headers["Vary"] = "Accept"
+        if not media_store.eager_renditions:
+            # No manifest is ever written, so skip the lookup
+            fmt = preferred_format(request.headers.get("accept", ""), media_store.rendition_formats)
+            width = snap_dimension(w)
+            if (fmt != "jpeg" or width is not None) and file_path.exists():
+                file_path = await transform_cache.get(file_path, sha256, width, None, fmt)
+                media_type = RENDITION_ENCODINGS[fmt]["mime_type"]
+                background = BackgroundTask(transform_cache.release, file_path)
+        else:
+            entries = await media_store.renditions(request.app.mongodb, sha256)
+            chosen = choose_rendition(entries, request.headers.get("accept", ""), w)
+            if chosen is not None:
+                file_path = file_path.with_name(chosen["file"])
+                media_type = RENDITION_ENCODINGS[chosen["format"]]["mime_type"]
+            else:
+                headers["Cache-Control"] = "public, max-age=60"
+    
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(file_path, media_type=media_type, headers=headers, background=background)
+
+@router.get("/media/transform/{folder}/{filename}")
+async def transform_image(
+    request: Request,
+    folder: str,
+    filename: str,
+    w: Optional[int] = Query(None, ge=1, le=MAX_IMAGE_DIMENSION),
+    h: Optional[int] = Query(None, ge=1, le=MAX_IMAGE_DIMENSION),
+    format: str = Query("auto")
+):
+    """Serve an image resized and re-encoded on first request
+
+    The image is fitted within ``w`` x ``h`` (either may be omitted; never
+    upscaled), each rounded up to the next RENDITION_WIDTHS step, and
+    encoded as ``format``, where ``auto`` picks AVIF, WebP or JPEG by the
+    Accept header. Results are kept in a size-bounded disk cache, and
+    concurrent requests for the same variant share one transform.
+    """
+    if w is None and h is None:
+        raise HTTPException(status_code=400, detail="w or h is required")
+    w, h = snap_dimension(w), snap_dimension(h)
+    
+    if folder == "objects":
+        file_path = media_store.resolve(filename)
+        source_id = filename
+    elif folder in ["courses", "profiles", "thumbnails"] and not filename.startswith("."):
+        file_path = UPLOAD_DIR / folder / filename
+        source_id = None
+    else:
+        raise HTTPException(status_code=400, detail="Invalid folder")
+    if file_path is None or not file_path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    if source_id is None:
+        # Legacy files can be overwritten in place, so their version is part of the key
+        stat = file_path.stat()
+        source_id = f"{folder}/{filename}:{stat.st_mtime_ns}:{stat.st_size}"
+    
+    headers = {}
+    if format == "auto":
+        fmt = preferred_format(request.headers.get("accept", ""), transform_cache.formats)
+        headers["Vary"] = "Accept"
+    elif format in transform_cache.formats:
+        fmt = format
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Allowed formats: auto, {', '.join(transform_cache.formats)}"
+        )
+    headers["Cache-Control"] = "public, max-age=31536000, immutable" if folder == "objects" else "public, max-age=3600"
+    
+    cached_path = await transform_cache.get(file_path, source_id, w, h, fmt)
+    return FileResponse(
+        cached_path,
+        media_type=RENDITION_ENCODINGS[fmt]["mime_type"],
+        headers=headers,
+        background=BackgroundTask(transform_cache.release, cached_path)
+    )
+
 @router.get("/media/thumbnails/{filename}")
 async def serve_thumbnail(filename: str):
     """Serve thumbnail images"""
@@ -248,11 +345,33 @@ async def serve_thumbnail(filename: str):
 
 @router.delete("/media/{folder}/{filename}")
 async def delete_image(
+    request: Request,
     folder: str,
     filename: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Delete uploaded image"""
+    """Delete uploaded image
+
+    For content-addressed objects this drops one of the caller's
+    references (any reference for admins); the files are removed with
+    the last one.
+    """
+    if folder == "objects":
+        file_path = media_store.resolve(filename)
+        if file_path is None or filename.endswith("_thumb.jpg"):
+            raise HTTPException(status_code=400, detail="Invalid object name")
+        sha256 = filename.split(".")[0]
+        owner_id = None if current_user["role"] == "admin" else current_user["_id"]
+        remaining = await media_store.release(request.app.mongodb, sha256, owner_id)
+        if remaining is None:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return {
+            "success": True,
+            "remaining_references": remaining,
+            "deleted_files": [str(file_path), str(media_store.thumbnail_path(sha256))] if remaining == 0 else [],
+            "message": "Image deleted successfully" if remaining == 0 else "Image reference released"
+        }
+    
     if folder not in ["courses", "profiles"]:
         raise HTTPException(status_code=400, detail="Invalid folder")
     
@@ -279,12 +398,26 @@ async def delete_image(
     }
 
 @router.get("/info/{folder}/{filename}")
-async def get_image_info(folder: str, filename: str):
+async def get_image_info(request: Request, folder: str, filename: str):
     """Get information about uploaded image"""
-    if folder not in ["courses", "profiles"]:
+    renditions = None
+    if folder == "objects":
+        file_path = media_store.resolve(filename)
+        if file_path is None:
+            raise HTTPException(status_code=400, detail="Invalid object name")
+        sha256 = filename[:64]
+        thumbnail_url = media_store.urls(sha256)["thumbnail_url"]
+        if media_store.original_hash(filename):
+            renditions = [
+                {**entry, "url": f"/api/media/objects/{entry['file']}"}
+                for entry in await media_store.renditions(request.app.mongodb, sha256)
+            ]
+    elif folder in ["courses", "profiles"]:
+        file_path = UPLOAD_DIR / folder / filename
+        thumbnail_url = f"/api/media/thumbnails/thumb_{filename}"
+    else:
         raise HTTPException(status_code=400, detail="Invalid folder")
     
-    file_path = UPLOAD_DIR / folder / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Image not found")
     
@@ -308,5 +441,6 @@ async def get_image_info(folder: str, filename: str):
         "height": height,
         "format": format_name,
         "url": f"/api/media/{folder}/{filename}",
-        "thumbnail_url": f"/api/media/thumbnails/thumb_{filename}"
+        "thumbnail_url": thumbnail_url,
+        **({"renditions": renditions} if renditions is not None else {})
     }
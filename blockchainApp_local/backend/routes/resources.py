@@ -1,20 +1,28 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List, Optional
-from models import ResourceRequest, ResourceRequestCreate, School, SchoolCreate, ResourceType
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from typing import List, Optional, Union
+from models import (
+    ResourceRequest, ResourceRequestCreate, ResourceRequestPage,
+    School, SchoolCreate, SchoolPage, ResourceType
+)
 from routes.auth import get_current_user
+from pagination import keyset_filter, keyset_sort, next_cursor
 from bson import ObjectId
 from datetime import datetime
 
 router = APIRouter()
 
-@router.get("/schools", response_model=List[School])
+@router.get("/schools", response_model=Union[SchoolPage, List[School]])
 async def get_schools(
     request: Request,
     verified: Optional[bool] = None,
     limit: int = 20,
-    skip: int = 0
+    cursor: Optional[str] = None,
+    skip: int = Query(0, deprecated=True)
 ):
-    """Get all schools with optional filtering"""
+    """Get all schools with optional filtering.
+
+    Pass ``cursor`` (empty for the first page) for keyset pagination.
+    """
     db = request.app.mongodb
     
     # Build filter
@@ -22,11 +30,21 @@ async def get_schools(
     if verified is not None:
         filter_query["verified"] = verified
     
+    if cursor is not None:
+        # Keyset pagination on _id
+        if cursor:
+            filter_query = keyset_filter(filter_query, "_id", cursor, descending=False)
+        page = await db.schools.find(filter_query).sort(keyset_sort("_id", descending=False)).limit(limit).to_list(limit)
+        following = next_cursor(page, limit, "_id")
+        for school in page:
+            school["_id"] = str(school["_id"])
+        return {"items": page, "next_cursor": following}
+    
     # Get schools from database
-    cursor = db.schools.find(filter_query).skip(skip).limit(limit)
+    schools_cursor = db.schools.find(filter_query).skip(skip).limit(limit)
     schools = []
     
-    async for school in cursor:
+    async for school in schools_cursor:
         school["_id"] = str(school["_id"])
         schools.append(school)
     
@@ -47,6 +65,43 @@ async def get_school(school_id: str, request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid school ID")
 
+async def _sum_wei(collection, school_id: int) -> int:
+    """Sum the wei ``amount`` of a school's indexed allocations or withdrawals"""
+    result = await collection.aggregate([
+        {"$match": {"school_id": school_id}},
+        {"$group": {"_id": None, "total": {"$sum": {"$toDecimal": "$amount"}}}}
+    ]).to_list(1)
+    return int(result[0]["total"].to_decimal()) if result else 0
+
+@router.get("/schools/{school_id}/balance")
+async def get_school_balance(school_id: str, request: Request):
+    """On-chain balance of a school, read from indexed contract events"""
+    db = request.app.mongodb
+    
+    if not ObjectId.is_valid(school_id):
+        raise HTTPException(status_code=400, detail="Invalid school ID")
+    school = await db.schools.find_one({"_id": ObjectId(school_id)}, {"wallet_address": 1})
+    if not school:
+        raise HTTPException(status_code=404, detail="School not found")
+    
+    chain_school = await db.chain_schools.find_one({"wallet_address": school["wallet_address"].lower()})
+    if not chain_school:
+        raise HTTPException(status_code=404, detail="School is not registered on-chain")
+    
+    # Same arithmetic as EdTechDonation.getSchoolBalance: totalReceived - totalWithdrawn
+    allocated = await _sum_wei(db.allocations, chain_school["school_id"])
+    withdrawn = await _sum_wei(db.withdrawals, chain_school["school_id"])
+    
+    return {
+        "school_id": school_id,
+        "chain_school_id": chain_school["school_id"],
+        "verified": chain_school.get("verified", False),
+        "total_received_wei": str(allocated),
+        "total_withdrawn_wei": str(withdrawn),
+        "balance_wei": str(allocated - withdrawn),
+        "balance_eth": (allocated - withdrawn) / 10**18
+    }
+
 @router.post("/schools", response_model=School)
 async def create_school(
     school: SchoolCreate,
@@ -113,16 +168,20 @@ async def verify_school(
     
     return {"message": "School verified successfully"}
 
-@router.get("/requests", response_model=List[ResourceRequest])
+@router.get("/requests", response_model=Union[ResourceRequestPage, List[ResourceRequest]])
 async def get_resource_requests(
     request: Request,
     status: Optional[str] = None,
     school_id: Optional[str] = None,
     limit: int = 20,
-    skip: int = 0,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, deprecated=True),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get resource requests with optional filtering"""
+    """Get resource requests with optional filtering, newest first.
+
+    Pass ``cursor`` (empty for the first page) for keyset pagination.
+    """
     db = request.app.mongodb
     
     # Build filter based on user role
@@ -140,11 +199,21 @@ async def get_resource_requests(
     if school_id:
         filter_query["school_id"] = school_id
     
+    if cursor is not None:
+        # Keyset pagination on (created_at, _id)
+        if cursor:
+            filter_query = keyset_filter(filter_query, "created_at", cursor)
+        page = await db.resource_requests.find(filter_query).sort(keyset_sort("created_at")).limit(limit).to_list(limit)
+        following = next_cursor(page, limit, "created_at")
+        for req in page:
+            req["_id"] = str(req["_id"])
+        return {"items": page, "next_cursor": following}
+    
     # Get requests from database
-    cursor = db.resource_requests.find(filter_query).sort("created_at", -1).skip(skip).limit(limit)
+    requests_cursor = db.resource_requests.find(filter_query).sort("created_at", -1).skip(skip).limit(limit)
     requests = []
     
-    async for req in cursor:
+    async for req in requests_cursor:
         req["_id"] = str(req["_id"])
         requests.append(req)
     
@@ -6,6 +6,9 @@ import hashlib
 from web3 import Web3
 from typing import Optional
 
+# The rate limiter lives in rate_limiting; re-exported for existing imports
+from rate_limiting import RateLimiter, rate_limiter
+
 def validate_ethereum_address(address: str) -> bool:
     """Validate Ethereum address format"""
     if not address or not isinstance(address, str):
@@ -47,33 +50,3 @@ def generate_secure_token() -> str:
     """Generate a secure random token"""
     import secrets
     return secrets.token_urlsafe(32)
-
-class RateLimiter:
-    """Simple in-memory rate limiter"""
-    def __init__(self):
-        self.requests = {}
-    
-    def is_allowed(self, key: str, max_requests: int = 10, window_seconds: int = 60) -> bool:
-        """Check if request is allowed based on rate limiting"""
-        import time
-        
-        current_time = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        # Remove old requests outside the window
-        self.requests[key] = [
-            req_time for req_time in self.requests[key] 
-            if current_time - req_time < window_seconds
-        ]
-        
-        # Check if under limit
-        if len(self.requests[key]) < max_requests:
-            self.requests[key].append(current_time)
-            return True
-        
-        return False
-
-# Global rate limiter instance
-rate_limiter = RateLimiter()
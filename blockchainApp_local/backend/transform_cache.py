@@ -0,0 +1,201 @@
+"""
+On-demand image transforms with a size-bounded on-disk LRU cache
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import MEDIA_TRANSFORM_CACHE_DIR, MEDIA_TRANSFORM_CACHE_MAX_MB
+from image_pipeline import MAX_IMAGE_DIMENSION, RENDITION_ENCODINGS, image_pipeline, supported_rendition_formats
+
+# A pin not released by then (the response never finished) no longer blocks eviction
+PIN_TIMEOUT_SECONDS = 300
+
+
+class TransformCache:
+    """Resized/re-encoded images, produced on first request and kept on disk.
+
+    Entries are named by a hash of (source id, width, height, format); the
+    source id must change whenever the source content does. Concurrent
+    requests for a variant that is not cached yet share one transform in
+    the image pipeline. Once the cache holds more than ``max_bytes``, the
+    least recently used files are deleted. The index lives in memory and is
+    rebuilt from the directory at startup, ordered by modification time,
+    which every hit refreshes; with several server processes each enforces
+    the bound on its own view.
+
+    ``get`` pins the entry it returns so eviction leaves the file in place
+    while it is served; call ``release`` with the path once the response
+    has been sent.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.formats = supported_rendition_formats(RENDITION_ENCODINGS)
+        # Relative file name -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Relative file name -> [pin count, monotonic time of the latest pin]
+        self._pins: Dict[str, List[float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.errors = 0
+        # The directory is scanned at startup, or on the first get without one
+        self._loaded = False
+
+    async def startup(self) -> None:
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+    def _load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.name.endswith(".part"):
+                # Left behind by a transform interrupted by a restart
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            files.append((stat.st_mtime, path.relative_to(self.root).as_posix(), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        self._loaded = True
+        self._evict()
+
+    @staticmethod
+    def key(source_id: str, width: Optional[int], height: Optional[int], fmt: str) -> str:
+        digest = hashlib.sha256(f"{source_id}|{width}|{height}|{fmt}".encode()).hexdigest()
+        return f"{digest[:2]}/{digest}.{RENDITION_ENCODINGS[fmt]['extension']}"
+
+    def _pinned(self, key: str) -> bool:
+        pin = self._pins.get(key)
+        if pin is None:
+            return False
+        if time.monotonic() - pin[1] >= PIN_TIMEOUT_SECONDS:
+            del self._pins[key]
+            return False
+        return True
+
+    def _pin(self, key: str) -> None:
+        pin = self._pins.setdefault(key, [0, 0.0])
+        pin[0] += 1
+        pin[1] = time.monotonic()
+
+    def _unpin(self, key: str) -> None:
+        pin = self._pins.get(key)
+        if pin is not None:
+            pin[0] -= 1
+            if pin[0] <= 0:
+                del self._pins[key]
+
+    def _evict(self) -> None:
+        # Pinned files are being served, so they stay until released
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if self._pinned(key):
+                continue
+            size = self._entries.pop(key)
+            (self.root / key).unlink(missing_ok=True)
+            self._bytes -= size
+            self.evictions += 1
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    async def _produce(self, key: str, source: Path, width: Optional[int], height: Optional[int], fmt: str) -> Path:
+        path = self.root / key
+        partial = path.with_name(f"{path.name}.{os.getpid()}.part")
+        path.parent.mkdir(exist_ok=True)
+        try:
+            size = (width or MAX_IMAGE_DIMENSION, height or MAX_IMAGE_DIMENSION)
+            await image_pipeline.transform(source, partial, size, fmt)
+            os.replace(partial, path)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            self.errors += 1
+            raise
+        finally:
+            del self._inflight[key]
+
+        self._forget(key)
+        self._entries[key] = path.stat().st_size
+        self._bytes += self._entries[key]
+        self._evict()
+        return path
+
+    async def get(self, source: Path, source_id: str, width: Optional[int], height: Optional[int], fmt: str) -> Path:
+        """Path of ``source`` fitted within ``width`` x ``height`` as ``fmt``, producing it if needed
+
+        The entry stays pinned until ``release`` is called with the path.
+        """
+        if not self._loaded:
+            self._load()
+        key = self.key(source_id, width, height, fmt)
+        # Pinned before waiting, so a produce finishing meanwhile cannot evict it
+        self._pin(key)
+        try:
+            return await self._lookup(key, source, width, height, fmt)
+        except BaseException:
+            self._unpin(key)
+            raise
+
+    def release(self, path: Path) -> None:
+        """Unpin a path returned by ``get`` once it has been served"""
+        self._unpin(path.relative_to(self.root).as_posix())
+
+    async def _lookup(self, key: str, source: Path, width: Optional[int], height: Optional[int], fmt: str) -> Path:
+        if key in self._entries:
+            path = self.root / key
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Removed behind our back (another process evicted it)
+                self._forget(key)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return path
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            # A task of its own, so a disconnecting client does not cancel it for the others
+            task = asyncio.create_task(self._produce(key, source, width, height, fmt))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "errors": self.errors,
+            "in_progress": len(self._inflight),
+            "pinned": len(self._pins)
+        }
+
+
+# Global transform cache instance
+transform_cache = TransformCache(Path(MEDIA_TRANSFORM_CACHE_DIR), MEDIA_TRANSFORM_CACHE_MAX_MB * 1024 * 1024)
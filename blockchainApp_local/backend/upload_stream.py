@@ -0,0 +1,58 @@
+"""
+Chunked upload streaming with incremental SHA-256
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple
+
+from fastapi import HTTPException, UploadFile
+
+from config import UPLOAD_CHUNK_SIZE
+
+
+class StreamedUpload(NamedTuple):
+    path: Path
+    sha256: str
+    size: int
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a multipart upload in ``chunk_size`` pieces"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def stream_to_temp(chunks: AsyncIterator[bytes], directory: Path, max_size: int) -> StreamedUpload:
+    """Write ``chunks`` to a new temp file in ``directory``, hashing them in the same pass.
+
+    Only one chunk is held in memory at a time. The upload is rejected with
+    413 as soon as more than ``max_size`` bytes have arrived, and the
+    partial file is removed on any failure. Callers move the file into
+    place (``os.replace``) or delete it.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, name = tempfile.mkstemp(dir=directory, prefix="upload_", suffix=".part")
+    path = Path(name)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size: {max_size // (1024*1024)}MB"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return StreamedUpload(path, digest.hexdigest(), size)
@@ -60,9 +60,15 @@ export const coursesAPI = {
   // Get all courses
   getCourses: (params = {}) => api.get('/courses', { params }),
   
+  // Get categories with course count, duration, price range and rating
+  getCategories: () => api.get('/courses/categories'),
+  
   // Get course by ID
   getCourse: (id) => api.get(`/courses/${id}`),
   
+  // Get a single module's content (course lists only carry module summaries)
+  getCourseModule: (id, order) => api.get(`/courses/${id}/modules/${order}`),
+  
   // Create course (instructors/admins)
   createCourse: (courseData) => api.post('/courses', courseData),
   